@@ -1,12 +1,21 @@
 from datetime import datetime
+import os
+import re
 import json
-from typing import Any, Dict, List, Optional, TypedDict
+import hashlib
+from typing import Annotated, Any, Dict, List, Optional, TypedDict
 from langgraph.graph import StateGraph, END, START
+from langgraph.types import Send
 from langchain_core.output_parsers import JsonOutputParser
 from utils.llm_client import llm_client
+from utils.tools import append_reducer
+from utils.trm import TRM_ITEM_KEYS, TRM_SOURCE_FIELDS, trm_ref
 from gen_test_case_agent.prompts import TestCaseCreatePrompt
 from gen_test_case_agent import schemas
 
+# 每个分片最多包含的 flow/api/rule/exception 条目数
+TRM_SLICE_SIZE = int(os.environ.get("TRM_SLICE_SIZE", 6))
+
 
 class TestCase(TypedDict):
     """
@@ -20,19 +29,71 @@ class TestCase(TypedDict):
     inputs: Dict[str, str]
     expected_results: str
     priority: str
+    trm_refs: List[str]
 
 
 class TestCaseState(TypedDict):
     """状态定义"""
     feature_id: str
     trm_result: Dict[str, Any]
+    # fan-out 后每个分片的结果
+    slice_results: Annotated[List[Any], append_reducer]
     test_case_result: Optional[List[TestCase]]
 
 
-def create(state: TestCaseState):
-    """ create test case"""
-    print("creating")
-    trm_text = json.dumps(state["trm_result"])
+class TrmSliceState(TypedDict):
+    """单个 TRM 分片（Send 的输入）"""
+    feature_id: str
+    slice_index: int
+    trm_slice: Dict[str, Any]
+    trm_refs: List[str]
+
+
+def _prompt_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in item.items() if k not in TRM_SOURCE_FIELDS}
+
+
+def slice_trm(trm: Dict[str, Any], slice_size: int = None) -> List[Dict[str, Any]]:
+    """
+        按 feature 切分 TRM，每个 feature 的 flow/api/rule/exception 再按 slice_size 分组，
+        每个分片只包含所属 feature 及该组条目
+    """
+    slice_size = slice_size or TRM_SLICE_SIZE
+    features = {}
+    for feature in trm.get("features") or []:
+        features.setdefault(feature.get("id"), []).append(feature)
+    items = {}
+    for key in TRM_ITEM_KEYS:
+        for item in trm.get(key) or []:
+            items.setdefault(item.get("feature_id"), []).append((key, item))
+    slices = []
+    for feature_id in list(features) + [f for f in items if f not in features]:
+        feature_items = items.get(feature_id) or []
+        groups = [feature_items[i:i + slice_size]
+                  for i in range(0, len(feature_items), slice_size)] or [[]]
+        for group in groups:
+            trm_slice = {"features": [_prompt_item(f) for f in features.get(feature_id, [])]}
+            for key in TRM_ITEM_KEYS:
+                trm_slice[key] = [_prompt_item(item) for k, item in group if k == key]
+            slices.append({"feature_id": feature_id, "trm_slice": trm_slice,
+                           "trm_refs": [trm_ref(k, item) for k, item in group]})
+    return slices
+
+
+def fan_out_slices(state: TestCaseState):
+    """每个 TRM 分片 Send 一次生成用例"""
+    slices = slice_trm(state["trm_result"] or {})
+    print(f"TRM 切分为 {len(slices)} 个分片")
+    if not slices:
+        return "merge_task"
+    return [Send("create_task", {"slice_index": index, **item})
+            for index, item in enumerate(slices)]
+
+
+def create(state: TrmSliceState):
+    """ create test case（单个 TRM 分片）"""
+    print(f"creating slice {state['slice_index']}")
+    trm_text = json.dumps(state["trm_slice"], ensure_ascii=False)
     parser = JsonOutputParser(pydantic_object=schemas.TestSchema)
     resp = llm_client.run_prompt(system_prompt=TestCaseCreatePrompt.system_prompt,
                                  user_prompt=TestCaseCreatePrompt.user_prompt,
@@ -41,7 +102,71 @@ def create(state: TestCaseState):
     result = resp
     if isinstance(resp, str):
         result = json.loads(resp)
-    return {"test_case_result": result}
+    return {"slice_results": [_slice_result(state, result)]}
+
+
+async def acreate(state: TrmSliceState):
+    """ create test case（单个 TRM 分片，异步）"""
+    print(f"creating slice {state['slice_index']}")
+    trm_text = json.dumps(state["trm_slice"], ensure_ascii=False)
+    parser = JsonOutputParser(pydantic_object=schemas.TestSchema)
+    resp = await llm_client.arun_prompt(system_prompt=TestCaseCreatePrompt.system_prompt,
+                                        user_prompt=TestCaseCreatePrompt.user_prompt,
+                                        input={"trm_json": trm_text},
+                                        parser=parser)
+    result = resp
+    if isinstance(resp, str):
+        result = json.loads(resp)
+    return {"slice_results": [_slice_result(state, result)]}
+
+
+def _slice_result(state: TrmSliceState, cases) -> Dict[str, Any]:
+    if isinstance(cases, dict):
+        cases = [cases]
+    return {"slice_index": state["slice_index"], "feature_id": state["feature_id"],
+            "trm_refs": state["trm_refs"], "cases": cases or []}
+
+
+def _case_refs(case: Dict[str, Any], slice_refs: List[str]) -> List[str]:
+    """LLM 返回的用例 trm_refs 中属于该分片的条目，没有时为空"""
+    return sorted({ref for ref in case.get("trm_refs") or [] if ref in slice_refs})
+
+
+def case_id(feature_id: str, trm_refs: List[str], title: str, trm_feature: str = None) -> str:
+    """
+        按用例覆盖的 TRM 条目和规范化后的标题计算 case_id：TC-<feature_id>-<哈希8位>
+        trm_refs 为空时按用例所属的 TRM feature（trm_feature）和标题计算
+        与分片划分、LLM 返回顺序无关，TRM 其他条目增删时不变
+    """
+    normalized = re.sub(r"[\s\W_]+", "", title or "").lower()
+    key = sorted(trm_refs) if trm_refs else {"feature": trm_feature}
+    digest = hashlib.sha1(json.dumps([key, normalized], ensure_ascii=False).encode("utf-8"))
+    return f"TC-{feature_id}-{digest.hexdigest()[:8]}"
+
+
+def merge(state: TestCaseState):
+    """
+        合并各分片生成的用例，按用例自身的 TRM 条目和标题分配稳定的 case_id，
+        并记录用例覆盖的 TRM 条目
+    """
+    results = sorted(state.get("slice_results") or [], key=lambda r: r["slice_index"])
+    test_cases = []
+    seen = {}
+    for result in results:
+        feature_id = result["feature_id"] or state["feature_id"]
+        for case in result["cases"]:
+            case = dict(case)
+            case["feature_id"] = feature_id
+            case["trm_refs"] = _case_refs(case, result["trm_refs"])
+            if not case["trm_refs"]:
+                print(f"⚠️ 用例「{case.get('title')}」没有返回所属分片的 trm_refs，按所属 feature 和标题计算 case_id")
+            base_id = case_id(state["feature_id"], case["trm_refs"], case.get("title"), feature_id)
+            # 条目和标题都相同的用例追加序号
+            seen[base_id] = seen.get(base_id, 0) + 1
+            case["case_id"] = base_id if seen[base_id] == 1 else f"{base_id}-{seen[base_id]}"
+            test_cases.append(case)
+    print(f"共生成 {len(test_cases)} 条测试用例")
+    return {"test_case_result": test_cases}
 
 
 def save(state: TestCaseState):
@@ -54,19 +179,25 @@ def save(state: TestCaseState):
         json.dump(state["test_case_result"], f, indent=4, ensure_ascii=False)
 
 
-def create_graph():
-    """创建并运行简单的并行图"""
+def create_graph(is_async: bool = False):
+    """
+        创建并运行简单的并行图：TRM 按 feature / 条目分组后并行生成用例
+        is_async=True 时使用异步节点, 需通过 ainvoke 调用
+    """
     print("开始创建图")
     # 创建图
     workflow = StateGraph(TestCaseState)
 
     # 添加节点
-    workflow.add_node("create_task", create)
+    workflow.add_node("create_task", acreate if is_async else create)
+    workflow.add_node("merge_task", merge)
     workflow.add_node("save_task", save)
 
-    # 任务
-    workflow.add_edge(START, "create_task")
-    workflow.add_edge("create_task", "save_task")
+    # 任务：按 TRM 分片并行生成，再合并
+    workflow.add_conditional_edges(
+        START, fan_out_slices, ["create_task", "merge_task"])
+    workflow.add_edge("create_task", "merge_task")
+    workflow.add_edge("merge_task", "save_task")
     workflow.add_edge("save_task", END)
 
     # 编译图
@@ -77,3 +208,21 @@ def create_graph():
     print(graph.get_graph().draw_mermaid())
 
     return graph
+
+
+def run_graph(trm_result: Dict[str, Any], feature_id: str = "123"):
+    """同步生成测试用例"""
+    if isinstance(trm_result, str):
+        trm_result = json.loads(trm_result)
+    graph = create_graph()
+    final_state = graph.invoke({"trm_result": trm_result, "feature_id": feature_id})
+    return final_state["test_case_result"]
+
+
+async def arun_graph(trm_result: Dict[str, Any], feature_id: str = "123"):
+    """异步生成测试用例（基于 ainvoke）"""
+    if isinstance(trm_result, str):
+        trm_result = json.loads(trm_result)
+    graph = create_graph(is_async=True)
+    final_state = await graph.ainvoke({"trm_result": trm_result, "feature_id": feature_id})
+    return final_state["test_case_result"]
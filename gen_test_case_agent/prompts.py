@@ -53,8 +53,7 @@ class TestCaseCreatePrompt:
         ===============================
         每一条测试用例必须包含以下字段：
 
-        - case_id：格式为 TC-feature_id-3位数字序号，如 TC-F1-001
-        - feature_id：所属功能点 ID
+        - feature_id：所属功能点 ID（TRM 中 Feature 的 id）
         - feature: 所属功能点的名称
         - title：测试用例标题
         - type：用例类型
@@ -64,6 +63,9 @@ class TestCaseCreatePrompt:
         - inputs：输入数据（结构化）
         - expected_results：预期结果
         - priority：优先级（P0 / P1 / P2）
+        - trm_refs：该用例覆盖的 TRM 条目引用列表，只能取以下值：
+            Flow 的 flow_id、Rule 的 rule_id、Exception 的 exception_id，
+            API 为 "METHOD url"（如 "POST /api/login"）
 
         ===============================
         【输出格式要求】
@@ -72,7 +74,6 @@ class TestCaseCreatePrompt:
         格式如下：
 
         {{
-        "case_id": "TC-F1-001",
         "feature_id": "F1",
         "feature":"用户登陆",
         "title":"测试登陆",
@@ -81,7 +82,8 @@ class TestCaseCreatePrompt:
         "steps":["打开登陆页面","输入用户名","xxxx"]
         "inputs": {{"phone": "13800138000","password": "pass1234"}},
         "expected_results":"系统验证成功并返回token",
-        "priority":"P0"
+        "priority":"P0",
+        "trm_refs":["FLOW_d2fa6737","POST /api/login"]
         }}
 
         如果 TRM 中存在多个 Feature，则输出一个 JSON 数组。
@@ -29,3 +29,4 @@ class TestSchema(BaseModel):
     inputs: dict = Field(description="输入数据")
     expected_results: str = Field(description="预期结果")
     priority: Priority = Field(description="优先级")
+    trm_refs: List[str] = Field(default=[], description="用例覆盖的 TRM 条目引用")
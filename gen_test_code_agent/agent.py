@@ -1,7 +1,11 @@
+import os
+import re
 import json
+from difflib import SequenceMatcher
+from urllib.parse import urlparse
 from datetime import datetime
 from operator import add
-from typing import TypedDict, List, Dict, Any, Annotated
+from typing import TypedDict, List, Dict, Any, Annotated, Tuple
 
 from langgraph.graph import StateGraph, START
 from langgraph.types import Send
@@ -10,15 +14,24 @@ from langchain_core.output_parsers import JsonOutputParser
 from utils.llm_client import llm_client
 from gen_test_code_agent.prompts import (
     UITestCaseStructuredPrompt,
-    UITestCaseToCodePrompt
+    UITestCaseToCodePrompt,
+    UIStepToCodePrompt
 )
 from gen_test_code_agent import schemas
-from gen_test_code_agent.get_selector_from_html import run as extract_selectors
+from gen_test_code_agent.code_renderer import build_plan, render_plan, unresolved_items, syntax_error
+from gen_test_code_agent.selector_compactor import compact_selectors, to_table, token_report
+from gen_test_code_agent.selector_index import relevant_elements
+from gen_test_code_agent.get_selector_from_html import run_pages as extract_selectors, \
+    arun_pages as aextract_selectors
+from gen_test_code_agent.browser_pool import close_browser_pool
 
 
 class GenTestCodeState(TypedDict):
     # ===== 全局输入（只读）=====
+    # 默认页面，用例匹配不到页面时使用
     url: str
+    # {页面名称: url}，与 UITestCaseSchema.page 匹配
+    page_urls: Dict[str, str]
     test_case_result: List[Dict[str, Any]]
 
     # ===== fan-out 后，每个 item =====
@@ -26,10 +39,17 @@ class GenTestCodeState(TypedDict):
 
     # test_code:  Annotated[List[str], add]
     # ===== 共享资源（只执行一次）=====
-    page_selector: str
+    # {url: 元素列表}
+    page_selectors: Dict[str, List[Dict[str, Any]]]
 
     # ===== fan-in 结果 =====
     test_code_refs: Annotated[List[str], add]
+    # 每个用例 selector 压缩前后的 token 估算
+    selector_reports: Annotated[List[Dict[str, Any]], add]
+
+
+# template: 结构化步骤按模板渲染，只有无法确定的步骤才调用 LLM；llm: 整个用例交给 LLM 生成
+CODE_RENDER_MODE = os.environ.get("CODE_RENDER_MODE", "template")
 
 
 def create_test_code(structured_case, url, selectors=None):
@@ -49,10 +69,111 @@ def create_test_code(structured_case, url, selectors=None):
     return code
 
 
-def save_code(case_id, code):
+async def acreate_test_code(structured_case, url, selectors=None):
+    print("🧪 生成测试代码")
+
+    resp = await llm_client.arun_prompt(
+        system_prompt=UITestCaseToCodePrompt.system_prompt,
+        user_prompt=UITestCaseToCodePrompt.user_prompt,
+        input={
+            "case": structured_case,
+            "url": url,
+            "selector": selectors
+        }
+    )
+
+    code = resp.content
+    return code
+
+
+def _step_input(items, url, selectors):
+    steps = [{"index": index, **item} for index, item in enumerate(items)]
+    return {"steps": json.dumps(steps, ensure_ascii=False), "url": url, "selector": selectors}
+
+
+def _fills(items, resp) -> List[str]:
+    """按序号整理 LLM 返回的代码片段，缺失的步骤为空字符串"""
+    if isinstance(resp, str):
+        resp = json.loads(resp)
+    if isinstance(resp, dict):
+        resp = [resp]
+    by_index = {r.get("index"): r.get("code", "") for r in resp or []}
+    return [by_index.get(index, "") for index in range(len(items))]
+
+
+def _checked(code: str):
+    """渲染结果无法编译时返回 None，由调用方走完整的 LLM 生成"""
+    error = syntax_error(code)
+    if error:
+        print(f"⚠️ 模板生成的测试代码无法编译（{error}），改用 LLM 生成")
+        return None
+    return code
+
+
+def render_test_code(structured_case, url, elements=None, selectors=None):
+    """
+        模板渲染测试代码，无法确定的步骤合并为一次 LLM 调用补全
+        elements 为页面元素（用于匹配步骤），selectors 为给 LLM 的压缩 selector 表
+        用例无法结构化或 CODE_RENDER_MODE=llm 时返回 None，由调用方走完整的 LLM 生成
+    """
+    if CODE_RENDER_MODE != "template" or not isinstance(structured_case, dict):
+        return None
+    plan = build_plan(structured_case, url, elements)
+    if plan is None:
+        return None
+    items = unresolved_items(plan)
+    print(f"🧪 模板生成测试代码，需 LLM 补全的步骤: {len(items)}")
+    fills = []
+    if items:
+        resp = llm_client.run_prompt(
+            system_prompt=UIStepToCodePrompt.system_prompt,
+            user_prompt=UIStepToCodePrompt.user_prompt,
+            input=_step_input(items, url, selectors),
+            parser=JsonOutputParser(pydantic_object=schemas.StepCodeSchema)
+        )
+        fills = _fills(items, resp)
+    return _checked(render_plan(structured_case, plan, fills))
+
+
+async def arender_test_code(structured_case, url, elements=None, selectors=None):
+    """模板渲染测试代码（异步）"""
+    if CODE_RENDER_MODE != "template" or not isinstance(structured_case, dict):
+        return None
+    plan = build_plan(structured_case, url, elements)
+    if plan is None:
+        return None
+    items = unresolved_items(plan)
+    print(f"🧪 模板生成测试代码，需 LLM 补全的步骤: {len(items)}")
+    fills = []
+    if items:
+        resp = await llm_client.arun_prompt(
+            system_prompt=UIStepToCodePrompt.system_prompt,
+            user_prompt=UIStepToCodePrompt.user_prompt,
+            input=_step_input(items, url, selectors),
+            parser=JsonOutputParser(pydantic_object=schemas.StepCodeSchema)
+        )
+        fills = _fills(items, resp)
+    return _checked(render_plan(structured_case, plan, fills))
+
+
+def _case_meta(test_case, structured_case, url) -> Dict[str, Any]:
+    """用例元数据，和测试代码一起保存，供执行阶段使用（登录态、按页面统计、按 TRM 选择用例）"""
+    structured = structured_case if isinstance(structured_case, dict) else {}
+    return {
+        "case_id": test_case.get("case_id"),
+        "feature_id": test_case.get("feature_id"),
+        "page": structured.get("page") or test_case.get("page") or "",
+        "url": url,
+        "preconditions": structured.get("preconditions") or test_case.get("preconditions") or [],
+        "trm_refs": test_case.get("trm_refs") or [],
+    }
+
+
+def save_code(case_id, code, meta=None):
+    """保存测试代码，meta 保存为同名的 .meta.json"""
     create_date = datetime.now().strftime("%Y%m%d%H%M%S")
     file_name = f"test_{case_id}_{create_date}.py"
-    full_path = f"./test_codes/{file_name}"
+    full_path = f"./output/codes/{file_name}"
 
     print(f"💾 保存测试代码: {file_name}")
 
@@ -65,15 +186,86 @@ def save_code(case_id, code):
     with open(full_path, "w", encoding="utf-8") as f:
         f.write(code)
 
+    if meta is not None:
+        with open(os.path.splitext(full_path)[0] + ".meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    return full_path
+
+
+def _page_url_list(state: GenTestCodeState) -> List[str]:
+    return [state["url"]] + list((state.get("page_urls") or {}).values())
+
 
 def get_selector_task(state: GenTestCodeState):
     print("🔍 提取页面 selector（仅一次）")
-    selectors = extract_selectors(url=state["url"])
+    page_selectors = extract_selectors(_page_url_list(state))
+    return {
+        "page_selectors": page_selectors
+    }
+
+
+async def aget_selector_task(state: GenTestCodeState):
+    print("🔍 提取页面 selector（仅一次）")
+    # 从共享浏览器池租用 context 并发提取，一次运行内不重复启动浏览器
+    page_selectors = await aextract_selectors(_page_url_list(state))
     return {
-        "page_selector": json.dumps(selectors)
+        "page_selectors": page_selectors
     }
 
 
+def _norm_page(name: str) -> str:
+    return re.sub(r"[\s_\-/]+|页面?$", "", (name or "").lower())
+
+
+def match_page_url(page: str, page_urls: Dict[str, str], default_url: str) -> str:
+    """
+        用例页面名称匹配到 url：名称相等 > 包含关系 > 相似度 >= 0.6，都不满足时使用默认 url
+        页面名称忽略大小写、空白及结尾的“页/页面”，也可以直接写 url 路径
+    """
+    target = _norm_page(page)
+    if not target:
+        return default_url
+    best, best_score = default_url, 0.0
+    for name, url in (page_urls or {}).items():
+        key = _norm_page(name)
+        if not key:
+            continue
+        if key == target or target == _norm_page(urlparse(url).path):
+            return url
+        if key in target or target in key:
+            score = 0.9
+        else:
+            score = SequenceMatcher(None, key, target).ratio()
+        if score >= 0.6 and score > best_score:
+            best, best_score = url, score
+    return best
+
+
+def _case_page(case_info, structured_case) -> Tuple[str, List[Dict[str, Any]]]:
+    """按结构化用例的 page（缺失时用原始用例的 page）选出该页面的 url 和 selector"""
+    page = structured_case.get("page") if isinstance(structured_case, dict) else None
+    page = page or case_info["test_case"].get("page") or ""
+    url = match_page_url(page, case_info.get("page_urls"), case_info["url"])
+    selectors = (case_info.get("page_selectors") or {}).get(url) or []
+    print(f"📄 用例页面: {page or '-'} -> {url}（{len(selectors)} 个元素）")
+    return url, selectors
+
+
+def _compact(case_id, elements, structured_case=None) -> Tuple[str, Dict[str, Any]]:
+    """
+        压缩 selector：只保留与用例步骤相关的 top-k 元素，每个元素只保留一个最稳定的定位器，
+        输出表格及 token 对比
+    """
+    relevant = relevant_elements(structured_case, elements)
+    table = to_table(compact_selectors(relevant))
+    report = {"case_id": case_id, "elements": len(elements), "relevant": len(relevant),
+              **token_report(elements, table)}
+    print(f"📉 selector 压缩 {case_id}: {len(elements)} -> {len(relevant)} 个元素，"
+          f"{report['raw_tokens']} -> {report['compact_tokens']} tokens（减少 {report['saved_ratio']:.0%}）")
+    return table, report
+
+
 def fan_out_task(state: GenTestCodeState):
     """fan-out 是一个条件边函数，而不是一个节点"""
     print("🔀 fan-out 测试用例")
@@ -82,7 +274,8 @@ def fan_out_task(state: GenTestCodeState):
             "structure_task",
             {"test_case": test_case,
              "url": state["url"],
-             "page_selector": state["page_selector"]}
+             "page_urls": state.get("page_urls") or {},
+             "page_selectors": state["page_selectors"]}
         )
         for test_case in state["test_case_result"]
     ]
@@ -103,36 +296,62 @@ def structuring_test_case_node(case_info):
         parser=parser
     )
 
-    if not isinstance(resp, str):
-        resp = json.dumps(resp, ensure_ascii=False)
-    code = create_test_code(resp, case_info["url"], case_info["page_selector"])
+    url, elements = _case_page(case_info, resp)
+    meta = _case_meta(case_info["test_case"], resp, url)
+    selectors, report = _compact(case_id, elements, resp)
+    code = render_test_code(resp, url, elements, selectors)
+    if code is None:
+        if not isinstance(resp, str):
+            resp = json.dumps(resp, ensure_ascii=False)
+        code = create_test_code(resp, url, selectors)
+    full_path = save_code(case_id, code, meta)
 
-    create_date = datetime.now().strftime("%Y%m%d%H%M%S")
-    file_name = f"test_{case_id}_{create_date}.py"
-    full_path = f"./output/codes/{file_name}"
+    return {
+        "test_code_refs": [full_path],
+        "selector_reports": [report]
+    }
 
-    print(f"💾 保存测试代码: {file_name}")
 
-    code = (
-        code.replace("```python", "")
-            .replace("```", "")
-            .strip()
+async def astructuring_test_case_node(case_info):
+    case_id = case_info['test_case'].get('case_id')
+    print(f"🧩 结构化测试用例: {case_id}")
+
+    parser = JsonOutputParser(
+        pydantic_object=schemas.UITestCaseSchema
     )
 
-    with open(full_path, "w", encoding="utf-8") as f:
-        f.write(code)
+    resp = await llm_client.arun_prompt(
+        system_prompt=UITestCaseStructuredPrompt.sys_prompt,
+        user_prompt=UITestCaseStructuredPrompt.user_prompt,
+        input={"case": case_info["test_case"]},
+        parser=parser
+    )
+
+    url, elements = _case_page(case_info, resp)
+    meta = _case_meta(case_info["test_case"], resp, url)
+    selectors, report = _compact(case_id, elements, resp)
+    code = await arender_test_code(resp, url, elements, selectors)
+    if code is None:
+        if not isinstance(resp, str):
+            resp = json.dumps(resp, ensure_ascii=False)
+        code = await acreate_test_code(resp, url, selectors)
+    full_path = save_code(case_id, code, meta)
 
     return {
-        "test_code_refs": [full_path]
+        "test_code_refs": [full_path],
+        "selector_reports": [report]
     }
 
 
-def create_graph():
+def create_graph(is_async: bool = False):
+    """is_async=True 时使用异步节点, 需通过 ainvoke 调用"""
     workflow = StateGraph(GenTestCodeState)
 
-    workflow.add_node("get_selector_task", get_selector_task)
+    workflow.add_node("get_selector_task",
+                      aget_selector_task if is_async else get_selector_task)
    # workflow.add_node("fan_out_task", fan_out_task)
-    workflow.add_node("structure_task", structuring_test_case_node)
+    workflow.add_node("structure_task",
+                      astructuring_test_case_node if is_async else structuring_test_case_node)
     # workflow.add_node("create_code_task", create_test_code_node)
     # workflow.add_node("save_task", save_node)
 
@@ -154,18 +373,52 @@ def create_graph():
     return workflow.compile()
 
 
-def run_graph(test_cases: List[Dict[str, Any]], url: str):
+def _print_selector_reports(final_state):
+    reports = final_state.get("selector_reports") or []
+    raw = sum(r["raw_tokens"] for r in reports)
+    compact = sum(r["compact_tokens"] for r in reports)
+    if raw:
+        print(f"📉 selector token: {raw} -> {compact}（{len(reports)} 个用例，减少 {1 - compact / raw:.0%}）")
+
+
+def run_graph(test_cases: List[Dict[str, Any]], url: str, page_urls: Dict[str, str] = None):
     graph = create_graph()
 
     final_state = graph.invoke({
         "url": url,
+        "page_urls": page_urls or {},
         "test_case_result": test_cases,
         "test_code_refs": [],
-        "page_selector": "",
+        "selector_reports": [],
+        "page_selectors": {},
     })
 
     print("✅ 生成完成")
     for path in final_state["test_code_refs"]:
         print("  -", path)
+    _print_selector_reports(final_state)
+
+    return final_state
+
+
+async def arun_graph(test_cases: List[Dict[str, Any]], url: str, page_urls: Dict[str, str] = None):
+    graph = create_graph(is_async=True)
+
+    try:
+        final_state = await graph.ainvoke({
+            "url": url,
+            "page_urls": page_urls or {},
+            "test_case_result": test_cases,
+            "test_code_refs": [],
+            "selector_reports": [],
+            "page_selectors": {},
+        })
+    finally:
+        await close_browser_pool()
+
+    print("✅ 生成完成")
+    for path in final_state["test_code_refs"]:
+        print("  -", path)
+    _print_selector_reports(final_state)
 
     return final_state
@@ -0,0 +1,217 @@
+import os
+import atexit
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import async_playwright, Browser, BrowserContext
+
+# 浏览器数量 N、每个浏览器的 context 数量 M、每个 context 打开 K 个页面后重建
+BROWSER_POOL_BROWSERS = int(os.environ.get("BROWSER_POOL_BROWSERS", 1))
+BROWSER_POOL_CONTEXTS = int(os.environ.get("BROWSER_POOL_CONTEXTS", 4))
+BROWSER_POOL_RECYCLE_PAGES = int(os.environ.get("BROWSER_POOL_RECYCLE_PAGES", 20))
+
+DEFAULT_CONTEXT_OPTIONS = {"viewport": {"width": 1280, "height": 800}}
+
+
+class _Slot:
+    """池中的一个 context 位置，context 按需创建、到期重建"""
+
+    def __init__(self, browser_index: int):
+        self.browser_index = browser_index
+        self.context: Optional[BrowserContext] = None
+        self.generation = 0
+        self.pages = 0
+
+
+class BrowserPool:
+    """
+        长期存活的 Playwright 浏览器池（async API），N 个浏览器 × M 个 context
+        - lease() 租用一个 context，用完归还，空闲 context 不足时排队等待
+        - 租用时做健康检查：浏览器断开则重新启动，其上的 context 全部重建
+        - context 打开 recycle_pages 个页面后关闭重建，避免内存和状态累积
+    """
+
+    def __init__(self, browsers: int = None, contexts_per_browser: int = None,
+                 recycle_pages: int = None, headless: bool = True,
+                 context_options: Dict[str, Any] = None):
+        self.browsers = browsers or BROWSER_POOL_BROWSERS
+        self.contexts_per_browser = contexts_per_browser or BROWSER_POOL_CONTEXTS
+        self.recycle_pages = recycle_pages or BROWSER_POOL_RECYCLE_PAGES
+        self.headless = headless
+        self.context_options = context_options or DEFAULT_CONTEXT_OPTIONS
+        self._playwright = None
+        self._browsers: List[Optional[Browser]] = [None] * self.browsers
+        self._generations = [0] * self.browsers
+        self._slots: List[_Slot] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._lock = asyncio.Lock()
+        self._started = False
+        self.stats = {"leases": 0, "browsers_launched": 0, "browsers_relaunched": 0,
+                      "contexts_created": 0, "contexts_recycled": 0}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def start(self):
+        """启动 playwright 及全部浏览器（重复调用无副作用）"""
+        async with self._lock:
+            if self._started:
+                return
+            self._playwright = await async_playwright().start()
+            self._browsers = list(await asyncio.gather(
+                *[self._launch() for _ in range(self.browsers)]))
+            self._idle = asyncio.Queue()
+            for index in range(self.browsers):
+                for _ in range(self.contexts_per_browser):
+                    slot = _Slot(index)
+                    self._slots.append(slot)
+                    self._idle.put_nowait(slot)
+            self._started = True
+            print(f"🌐 浏览器池已启动: {self.browsers} 个浏览器 × {self.contexts_per_browser} 个 context")
+
+    async def _launch(self) -> Browser:
+        self.stats["browsers_launched"] += 1
+        return await self._playwright.chromium.launch(headless=self.headless)
+
+    async def _healthy_browser(self, index: int) -> Browser:
+        """健康检查，浏览器已断开时重新启动"""
+        browser = self._browsers[index]
+        if browser is not None and browser.is_connected():
+            return browser
+        async with self._lock:
+            browser = self._browsers[index]
+            if browser is None or not browser.is_connected():
+                print(f"⚠️ 浏览器 {index} 已断开，重新启动")
+                browser = await self._launch()
+                self._browsers[index] = browser
+                self._generations[index] += 1
+                self.stats["browsers_relaunched"] += 1
+        return browser
+
+    async def _close_context(self, slot: _Slot):
+        context, slot.context, slot.pages = slot.context, None, 0
+        if context is None:
+            return
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+    async def _acquire(self, slot: _Slot) -> BrowserContext:
+        browser = await self._healthy_browser(slot.browser_index)
+        generation = self._generations[slot.browser_index]
+        if slot.context is not None and (slot.generation != generation
+                                         or slot.pages >= self.recycle_pages):
+            await self._close_context(slot)
+            self.stats["contexts_recycled"] += 1
+        if slot.context is None:
+            slot.context = await browser.new_context(**self.context_options)
+            slot.generation = generation
+            self.stats["contexts_created"] += 1
+        return slot.context
+
+    async def _release(self, slot: _Slot, healthy: bool):
+        slot.pages += 1
+        if not healthy:
+            await self._close_context(slot)
+            return
+        for page in list(slot.context.pages):
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+    @asynccontextmanager
+    async def lease(self):
+        """租用一个 BrowserContext，退出时归还；出错的 context 会被丢弃重建"""
+        await self.start()
+        slot = await self._idle.get()
+        self.stats["leases"] += 1
+        healthy = True
+        try:
+            context = await self._acquire(slot)
+            yield context
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            try:
+                await self._release(slot, healthy)
+            finally:
+                self._idle.put_nowait(slot)
+
+    async def close(self):
+        """关闭全部 context、浏览器和 playwright"""
+        async with self._lock:
+            if not self._started:
+                return
+            for slot in self._slots:
+                await self._close_context(slot)
+            for browser in self._browsers:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+            await self._playwright.stop()
+            self._slots, self._idle, self._started = [], None, False
+            print(f"🌐 浏览器池已关闭: {self.stats}")
+
+
+# 每个 event loop 一个共享浏览器池
+_shared_pools: Dict[asyncio.AbstractEventLoop, BrowserPool] = {}
+# 同步入口使用的后台 event loop（守护线程），其上的浏览器池在多次同步调用间复用
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """当前 event loop 共享的浏览器池（首次租用时启动），一次运行内的多个页面复用浏览器"""
+    loop = asyncio.get_running_loop()
+    if loop not in _shared_pools:
+        _shared_pools[loop] = BrowserPool()
+    return _shared_pools[loop]
+
+
+async def close_browser_pool():
+    """关闭当前 event loop 的共享浏览器池，在一次运行结束时调用"""
+    pool = _shared_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    with _sync_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="browser-pool-loop", daemon=True).start()
+        return _sync_loop
+
+
+def run_sync(coro):
+    """
+        同步入口：在后台 event loop 上执行协程并等待结果
+        多次同步调用共用该 loop 上的浏览器池；调用方已有 event loop（如 notebook）时同样可用
+    """
+    loop = _background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync 不能在浏览器池的后台 event loop 中调用")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+@atexit.register
+def close_sync_browser_pool():
+    """关闭同步入口使用的浏览器池（进程退出时自动调用）"""
+    if _sync_loop is not None and _sync_loop in _shared_pools:
+        run_sync(close_browser_pool())
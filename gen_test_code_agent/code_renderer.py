@@ -0,0 +1,162 @@
+import re
+import textwrap
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+
+from gen_test_code_agent.selector_compactor import best_locator
+from gen_test_code_agent.selector_index import get_index, MIN_COVERAGE
+
+# 各动作可操作的元素类型（ElementInfo.element_type）
+_ACTION_TYPES = {
+    "input": {"text", "password", "email", "tel", "number", "search", "url", "textarea", "input",
+              "role-textbox", "date", "datetime-local", "month", "time", "week"},
+    "click": {"button", "submit", "link", "checkbox", "radio", "reset", "image", "role-button",
+              "role-link", "role-checkbox", "role-tab", "role-menuitem"},
+    "select": {"select", "select-one", "select-multiple", "role-combobox", "role-listbox"},
+    "upload": {"file"},
+}
+_URL_IN_TEXT_RE = re.compile(r"(https?://\S+|/[A-Za-z0-9_\-./]+)")
+_QUOTED_RE = re.compile(r"[\"'“‘「『【]([^\"'”’」』】]+)[\"'”’」』】]")
+
+
+def resolve_element(target: str, elements: List[Dict[str, Any]], action: str = None) -> Optional[Dict[str, Any]]:
+    """
+        根据步骤的语义化 target 查找元素：在页面索引中只搜索与动作匹配的元素类型，
+        取命中率最高且有定位器的元素；select/upload 匹配不到但该类型元素唯一时直接使用
+    """
+    allowed = _ACTION_TYPES.get(action)
+    for _, el in get_index(elements).search(target, kinds=allowed, min_coverage=MIN_COVERAGE):
+        if best_locator(el):
+            return el
+    if action in ("select", "upload"):
+        candidates = [el for el in elements if (el.get("element_type") or "").lower() in allowed]
+        if len(candidates) == 1 and best_locator(candidates[0]):
+            return candidates[0]
+    return None
+
+
+def _step_lines(step: Dict[str, Any], url: str, elements: List[Dict[str, Any]]) -> Optional[List[str]]:
+    """单个步骤转为代码行，无法确定时返回 None"""
+    action = step.get("action")
+    target = step.get("target") or ""
+    value = step.get("value") or ""
+    if action == "goto":
+        match = _URL_IN_TEXT_RE.search(f"{value} {target}")
+        return [f"page.goto({urljoin(url, match.group(1)) if match else url!r})"]
+    if action == "wait":
+        el = resolve_element(target, elements) if target else None
+        if el:
+            return [f"page.locator({best_locator(el)!r}).first.wait_for()"]
+        if str(value).isdigit():
+            return [f"page.wait_for_timeout({int(value)})"]
+        return ['page.wait_for_load_state("networkidle")']
+    el = resolve_element(target, elements, action)
+    if el is None:
+        return None
+    locator = f"page.locator({best_locator(el)!r}).first"
+    if action == "input":
+        return [f"{locator}.fill({value!r})"]
+    if action == "click":
+        return [f"{locator}.click()"]
+    if action == "select":
+        return [f"{locator}.select_option({value!r})"]
+    if action == "upload":
+        return [f"{locator}.set_input_files({value!r})"]
+    return None
+
+
+def _assertion_lines(assertion: Dict[str, Any], url: str, elements: List[Dict[str, Any]]) -> Optional[List[str]]:
+    """断言转为代码行：页面断言匹配 URL，元素/业务断言优先匹配引号中的提示文本，其次匹配页面元素"""
+    expected = assertion.get("expected") or ""
+    if assertion.get("type") == "page":
+        match = _URL_IN_TEXT_RE.search(expected)
+        if match:
+            path = match.group(1)
+            return [f"expect(page).to_have_url(re.compile({re.escape(path)!r}))"]
+        return None
+    quoted = _QUOTED_RE.search(expected)
+    if quoted:
+        return [f"expect(page.get_by_text({quoted.group(1)!r}).first).to_be_visible()"]
+    el = resolve_element(expected, elements)
+    if el:
+        return [f"expect(page.locator({best_locator(el)!r}).first).to_be_visible()"]
+    return None
+
+
+def build_plan(structured_case: Dict[str, Any], url: str, elements: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """
+        将结构化用例转为代码块列表，每块为 {"item": 步骤或断言, "lines": 代码行}，
+        lines 为 None 表示规则无法确定，需要 LLM 补全。用例没有步骤时返回 None
+    """
+    steps = structured_case.get("steps") or []
+    if not steps:
+        return None
+    elements = elements or []
+    plan = []
+    if steps[0].get("action") != "goto":
+        plan.append({"item": {"action": "goto", "target": url}, "lines": [f"page.goto({url!r})"]})
+    for step in steps:
+        plan.append({"item": step, "lines": _step_lines(step, url, elements)})
+    assertions = structured_case.get("assertions") or []
+    if isinstance(assertions, dict):
+        assertions = [assertions]
+    for assertion in assertions:
+        plan.append({"item": {"assertion": assertion},
+                     "lines": _assertion_lines(assertion, url, elements)})
+    return plan
+
+
+def unresolved_items(plan: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [block["item"] for block in plan if block["lines"] is None]
+
+
+def syntax_error(code: str) -> Optional[str]:
+    """代码无法编译时返回错误信息，否则返回 None"""
+    try:
+        compile(code, "<generated>", "exec")
+    except SyntaxError as e:
+        return f"{e.msg} (line {e.lineno})"
+    return None
+
+
+def _clean_snippet(code: str) -> List[str]:
+    """去掉代码块标记和片段自身的缩进；片段无法编译时返回空列表（渲染为 skip）"""
+    code = textwrap.dedent(code.replace("```python", "").replace("```", "").strip("\n"))
+    lines = [line.rstrip() for line in code.splitlines() if line.strip()]
+    # 片段位于测试函数体内，按函数体编译检查
+    error = syntax_error("def _snippet():\n" + textwrap.indent("\n".join(lines) or "pass", "    "))
+    if error:
+        print(f"⚠️ LLM 补全的代码片段无法编译，跳过: {error}")
+        return []
+    return lines
+
+
+def render_plan(structured_case: Dict[str, Any], plan: List[Dict[str, Any]], fills: List[str] = None) -> str:
+    """按 pytest-playwright 风格渲染测试代码，fills 依次填充未确定的代码块"""
+    fills = list(fills or [])
+    case_id = structured_case.get("case_id") or "case"
+    func_name = "test_" + re.sub(r"\W+", "_", case_id).strip("_").lower()
+    body = []
+    for block in plan:
+        item = block["item"]
+        comment = item.get("assertion", {}).get("expected") if "assertion" in item else \
+            f"{item.get('action')} {item.get('target', '')}".strip()
+        comment = " ".join(str(comment).split())
+        body.append(f"# {comment}")
+        lines = block["lines"]
+        if lines is None:
+            lines = _clean_snippet(fills.pop(0)) if fills else []
+            lines = lines or [f"pytest.skip({('无法生成步骤代码: ' + comment)!r})"]
+        body.extend(lines)
+    title = (structured_case.get("title") or "").replace('"""', "'''")
+    code = [
+        "import re",
+        "import pytest",
+        "from playwright.sync_api import Page, expect",
+        "",
+        "",
+        f"def {func_name}(page: Page):",
+        f'    """{title}"""',
+    ]
+    code.extend(f"    {line}" for line in body)
+    return "\n".join(code) + "\n"
@@ -1,14 +1,128 @@
 #!/usr/bin/env python3
 # element_extractor.py
 
+import os
 import json
-from typing import List, Any, Optional
+import time
+import asyncio
+from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
 from urllib.parse import urlparse
 from pathlib import Path
 import datetime
 
-from playwright.sync_api import sync_playwright, TimeoutError
+from playwright.async_api import TimeoutError
+
+from gen_test_code_agent.browser_pool import BrowserPool, get_browser_pool, run_sync
+from gen_test_code_agent import selector_cache
+from gen_test_code_agent.html_extractor import parse_elements, load_html
+
+# 页面就绪判定：可选的业务就绪选择器、DOM 静默时长、总等待上限
+PAGE_READY_SELECTOR = os.environ.get("PAGE_READY_SELECTOR") or None
+PAGE_QUIET_MS = int(os.environ.get("PAGE_QUIET_MS", 300))
+PAGE_MAX_WAIT_MS = int(os.environ.get("PAGE_MAX_WAIT_MS", 8000))
+
+# 元素收集后端：browser 在 Chromium 中执行 JavaScript；html 直接解析 HTML 文件/地址，不启动浏览器
+SELECTOR_BACKEND = os.environ.get("SELECTOR_BACKEND", "browser")
+
+# DOM 在 quietMs 内没有结构变化（或达到 maxMs）即视为稳定，返回实际等待毫秒数
+# 只观察节点增删和文本变化，样式类动画不影响判定
+_QUIESCENCE_JS = """
+    ([quietMs, maxMs]) => new Promise(resolve => {
+        const start = performance.now();
+        let last = start;
+        const observer = new MutationObserver(() => { last = performance.now(); });
+        observer.observe(document.documentElement || document,
+                         {childList: true, subtree: true, characterData: true});
+        const tick = () => {
+            const now = performance.now();
+            if (now - last >= quietMs || now - start >= maxMs) {
+                observer.disconnect();
+                resolve(Math.round(now - start));
+            } else {
+                setTimeout(tick, Math.min(50, quietMs));
+            }
+        };
+        setTimeout(tick, Math.min(50, quietMs));
+    })
+"""
+
+# 按视口高度逐屏滚动，每屏等待 DOM 稳定；页面高度增长即为懒加载，继续滚动直到到底或超时
+_SCROLL_JS = """
+    async ([quietMs, maxMs]) => {
+        const start = performance.now();
+        const quiet = (budget) => new Promise(resolve => {
+            const begin = performance.now();
+            let last = begin;
+            const observer = new MutationObserver(() => { last = performance.now(); });
+            observer.observe(document.documentElement || document,
+                             {childList: true, subtree: true, characterData: true});
+            const tick = () => {
+                const now = performance.now();
+                if (now - last >= quietMs || now - begin >= budget) {
+                    observer.disconnect();
+                    resolve();
+                } else {
+                    setTimeout(tick, Math.min(50, quietMs));
+                }
+            };
+            setTimeout(tick, Math.min(50, quietMs));
+        });
+        const root = document.scrollingElement || document.documentElement;
+        let height = root.scrollHeight;
+        let y = 0;
+        let lazyLoads = 0;
+        while (height > window.innerHeight && performance.now() - start < maxMs) {
+            y += window.innerHeight;
+            window.scrollTo(0, y);
+            await quiet(Math.max(0, maxMs - (performance.now() - start)));
+            const newHeight = root.scrollHeight;
+            if (newHeight > height) {
+                lazyLoads += 1;
+                height = newHeight;
+            } else if (y + window.innerHeight >= height) {
+                break;
+            }
+        }
+        window.scrollTo(0, 0);
+        return {waited: Math.round(performance.now() - start), lazyLoads};
+    }
+"""
+
+# 前端构建标识：响应头或 meta 标签，命中时无需等待页面就绪
+_BUILD_HASH_HEADERS = ("x-build-hash", "x-build-id", "x-app-version", "x-version")
+_BUILD_HASH_JS = """
+    () => {
+        const names = ['build-hash', 'build-id', 'build-version', 'app-version', 'version'];
+        for (const name of names) {
+            const meta = document.querySelector(`meta[name="${name}"]`);
+            if (meta && meta.content) return meta.content;
+        }
+        return null;
+    }
+"""
+
+# DOM 结构指纹：只拼接可交互元素的标签和定位相关属性再做哈希，比完整收集元素信息便宜得多
+_FINGERPRINT_JS = """
+    () => {
+        const els = document.querySelectorAll(
+            'input, textarea, button, select, a, [role], [id], [data-testid], [data-qa], [data-cy], [data-test]');
+        let h1 = 0x811c9dc5, h2 = 0x01000193;
+        const feed = (s) => {
+            for (let i = 0; i < s.length; i++) {
+                const c = s.charCodeAt(i);
+                h1 = Math.imul(h1 ^ c, 0x01000193) >>> 0;
+                h2 = Math.imul(h2 ^ c, 0x5bd1e995) >>> 0;
+            }
+        };
+        els.forEach(el => {
+            feed([el.tagName, el.id, el.getAttribute('name'), el.getAttribute('type'),
+                  el.getAttribute('role'), el.getAttribute('data-testid'), el.getAttribute('placeholder'),
+                  el.getAttribute('aria-label'), (el.textContent || '').trim().substring(0, 50)].join('|') + '\\n');
+        });
+        return els.length.toString(16) + '-' + h1.toString(16).padStart(8, '0') + h2.toString(16).padStart(8, '0');
+    }
+"""
 
 
 @dataclass
@@ -34,44 +148,47 @@ class ElementInfo:
 
 
 class ElementExtractor:
-    """元素提取器"""
+    """元素提取器（从浏览器池租用 context，视口大小由池的 context 配置决定）"""
 
-    def __init__(self):
-        self.playwright = None
-        self.browser = None
+    def __init__(self, pool: BrowserPool = None):
+        self.pool = pool
+        self.context = None
         self.page = None
-
-    def __enter__(self):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=True)
+        self.response = None
+        self.ready_ms = 0
+        self._lease = None
+
+    async def __aenter__(self):
+        self.pool = self.pool or get_browser_pool()
+        self._lease = self.pool.lease()
+        self.context = await self._lease.__aenter__()
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
-
-    def navigate_to_url(self, url: str, wait_for_load: str = "networkidle", timeout: int = 30000):
-        """导航到指定URL"""
-        self.page = self.browser.new_page()
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.page:
+            try:
+                await self.page.close()
+            except Exception:
+                pass
+        await self._lease.__aexit__(exc_type, exc_val, exc_tb)
 
-        # 设置视口大小
-        self.page.set_viewport_size({"width": 1280, "height": 800})
+    async def navigate_to_url(self, url: str, wait_for_load: str = "domcontentloaded", timeout: int = 30000,
+                              ready_selector: str = None, wait_ready: bool = True):
+        """导航到指定URL，DOM 加载后按页面实际情况等待就绪（wait_ready=False 时由调用方决定是否等待）"""
+        self.page = await self.context.new_page()
 
         try:
             # 导航到页面
-            response = self.page.goto(
+            response = await self.page.goto(
                 url, wait_until=wait_for_load, timeout=timeout)
 
+            self.response = response
             if response and response.status >= 400:
                 print(f"警告: 页面返回状态码 {response.status}")
 
-            # 等待页面完全加载
-            self.page.wait_for_load_state(wait_for_load)
-
-            # 滚动页面以加载懒加载元素
-            self._scroll_page()
+            # 等待页面就绪，并滚动页面以加载懒加载元素
+            if wait_ready:
+                await self.wait_until_ready(ready_selector)
 
             return True
         except TimeoutError:
@@ -81,31 +198,71 @@ class ElementExtractor:
             print(f"导航到页面时出错: {e}")
             return False
 
-    def _scroll_page(self):
-        """滚动页面以加载所有元素"""
+    async def wait_until_ready(self, ready_selector: str = None, quiet_ms: int = None,
+                               max_wait_ms: int = None) -> int:
+        """
+            自适应等待页面就绪，代替固定 sleep，所有阶段共用 max_wait_ms 的上限：
+            1. 业务就绪选择器出现（可选）
+            2. DOM 结构静默 quiet_ms
+            3. 逐屏滚动，检测懒加载直到页面高度不再增长
+            返回实际等待的毫秒数
+        """
+        ready_selector = ready_selector or PAGE_READY_SELECTOR
+        quiet_ms = quiet_ms or PAGE_QUIET_MS
+        max_wait_ms = max_wait_ms or PAGE_MAX_WAIT_MS
+        start = time.monotonic()
+
+        def remaining():
+            return max(1, max_wait_ms - int((time.monotonic() - start) * 1000))
+
+        lazy_loads = 0
+        try:
+            if ready_selector:
+                try:
+                    await self.page.wait_for_selector(ready_selector, state="attached", timeout=remaining())
+                except TimeoutError:
+                    print(f"警告: 就绪选择器 {ready_selector} 未在 {max_wait_ms} ms 内出现")
+            await self.page.evaluate(_QUIESCENCE_JS, [quiet_ms, remaining()])
+            scroll = await self.page.evaluate(_SCROLL_JS, [quiet_ms, remaining()])
+            lazy_loads = scroll.get("lazyLoads", 0)
+        except Exception as e:
+            print(f"等待页面就绪时出错: {e}")
+        self.ready_ms = int((time.monotonic() - start) * 1000)
+        print(f"页面就绪等待 {self.ready_ms} ms（懒加载 {lazy_loads} 次，上限 {max_wait_ms} ms）")
+        return self.ready_ms
+
+    async def build_hash(self) -> Optional[str]:
+        """读取前端构建标识（响应头优先，其次 meta 标签），没有时返回 None"""
+        headers = self.response.headers if self.response else {}
+        for name in _BUILD_HASH_HEADERS:
+            if headers.get(name):
+                return headers[name]
+        try:
+            return await self.page.evaluate(_BUILD_HASH_JS)
+        except Exception:
+            return None
+
+    async def dom_fingerprint(self) -> Optional[str]:
+        """计算页面可交互元素的结构指纹"""
         try:
-            # 模拟滚动到底部
-            self.page.evaluate("""
-                window.scrollTo(0, document.body.scrollHeight);
-            """)
-            self.page.wait_for_timeout(1000)  # 等待内容加载
-
-            # 滚动回顶部
-            self.page.evaluate("""
-                window.scrollTo(0, 0);
-            """)
-        except:
-            pass
-
-    def get_all_elements(self) -> List[ElementInfo]:
-        """获取所有相关元素信息（排除div、label、form和文本元素）"""
+            return await self.page.evaluate(_FINGERPRINT_JS)
+        except Exception:
+            return None
+
+    async def get_all_elements(self, backend: str = "browser") -> List[ElementInfo]:
+        """
+            获取所有相关元素信息（排除div、label、form和文本元素）
+            backend="html" 时取页面当前 HTML 在 python 中解析，规则与 JavaScript 一致
+        """
         if not self.page:
             raise ValueError("页面未加载，请先调用 navigate_to_url()")
 
         print("正在收集页面元素信息...")
+        if backend == "html":
+            return to_element_infos(parse_elements(await self.page.content(), self.page.url))
 
         # 执行JavaScript收集元素信息（排除div、label、form和文本元素）
-        elements_data = self.page.evaluate("""
+        elements_data = await self.page.evaluate("""
             () => {
                 // 定义需要收集的元素类型（只收集交互性元素，排除文本元素）
                 const targetSelectors = [
@@ -182,31 +339,10 @@ class ElementExtractor:
             }
         """)
 
-        # 转换为ElementInfo对象
-        elements = []
-        for data in elements_data:
-            element_info = ElementInfo(
-                tag_name=data['tagName'],
-                element_type=self._categorize_element(
-                    data['tagName'], data['type'], data['role']),
-                id=data['id'],
-                name=data['name'],
-                class_list=data['classList'],
-                placeholder=data['placeholder'],
-                value=data['value'],
-                text=data['text'],
-                href=data['href'],
-                type=data['type'],
-                role=data['role'],
-                aria_label=data['ariaLabel'],
-                data_testid=data['dataTestid']
-            )
-            elements.append(element_info)
-
-        print(f"共收集到 {len(elements)} 个元素（已排除div、label、form和文本元素）")
-        return elements
-
-    def _categorize_element(self, tag_name: str, element_type: Optional[str], role: Optional[str]) -> str:
+        return to_element_infos(elements_data)
+
+    @staticmethod
+    def _categorize_element(tag_name: str, element_type: Optional[str], role: Optional[str]) -> str:
         """对元素进行分类"""
         if tag_name == 'input':
             return element_type if element_type else 'input'
@@ -224,6 +360,39 @@ class ElementExtractor:
             return tag_name
 
 
+def to_element_infos(elements_data: List[Dict[str, Any]]) -> List[ElementInfo]:
+    """page.evaluate 返回的元素数据转换为 ElementInfo（浏览器与离线解析共用）"""
+    # 转换为ElementInfo对象
+    elements = []
+    for data in elements_data:
+        element_info = ElementInfo(
+            tag_name=data['tagName'],
+            element_type=ElementExtractor._categorize_element(
+                data['tagName'], data['type'], data['role']),
+            id=data['id'],
+            name=data['name'],
+            class_list=data['classList'],
+            placeholder=data['placeholder'],
+            value=data['value'],
+            text=data['text'],
+            href=data['href'],
+            type=data['type'],
+            role=data['role'],
+            aria_label=data['ariaLabel'],
+            data_testid=data['dataTestid']
+        )
+        elements.append(element_info)
+
+    print(f"共收集到 {len(elements)} 个元素（已排除div、label、form和文本元素）")
+    return elements
+
+
+def extract_offline(source: str) -> List[ElementInfo]:
+    """离线提取：解析保存的 HTML 文件（路径或 file://）或静态服务器地址，不启动浏览器"""
+    html, base_url = load_html(source)
+    return to_element_infos(parse_elements(html, base_url))
+
+
 def save_to_json(data: Any, filename: str):
     """保存数据到JSON文件"""
     with open(filename, 'w', encoding='utf-8') as f:
@@ -232,10 +401,17 @@ def save_to_json(data: Any, filename: str):
 
 
 def run(url, write_to_json=False):
-    """主函数 - 只有url一个参数"""
+    """主函数 - 只有url一个参数（同步入口，复用后台 event loop 上长期存活的浏览器池）"""
+    return run_sync(arun(url, write_to_json))
+
 
-    # 使用默认值
-    wait_time = 3  # 减少等待时间
+async def arun(url, write_to_json=False, pool: BrowserPool = None, ready_selector: str = None):
+    """
+        异步提取页面元素，默认从当前 event loop 共享的浏览器池租用 context
+        ready_selector 为业务就绪标志（如 "#app .loaded"），未指定时读取 PAGE_READY_SELECTOR
+        构建标识或 DOM 指纹与缓存快照一致时直接返回缓存的元素，不做完整收集
+        SELECTOR_BACKEND=html 时 url 可以是 HTML 文件路径，直接离线解析
+    """
     json_file = ""
     all_data = []
     if write_to_json:
@@ -254,17 +430,37 @@ def run(url, write_to_json=False):
 
     print(f"开始分析: {url}")
 
+    if SELECTOR_BACKEND == "html":
+        try:
+            elements = await asyncio.to_thread(extract_offline, url)
+        except Exception as e:
+            print(f"离线解析出错: {e}")
+            return []
+        all_data = [asdict(e) for e in elements]
+        if write_to_json:
+            save_to_json(all_data, json_file)
+        return all_data
+
     try:
         # 使用ElementExtractor
-        with ElementExtractor() as extractor:
+        async with ElementExtractor(pool) as extractor:
             # 导航到页面
-            if extractor.navigate_to_url(url):
-                # 等待额外时间确保动态内容加载
-                extractor.page.wait_for_timeout(wait_time * 1000)
-
-                # 获取所有元素（已排除div、label、form和文本元素）
-                elements = extractor.get_all_elements()
-                all_data = [asdict(e) for e in elements]
+            if await extractor.navigate_to_url(url, ready_selector=ready_selector, wait_ready=False):
+                # 构建标识命中时连就绪等待也可以省掉
+                build_hash = await extractor.build_hash()
+                cached = selector_cache.lookup(url, build_hash=build_hash)
+                fingerprint = None
+                if cached is None:
+                    await extractor.wait_until_ready(ready_selector)
+                    fingerprint = await extractor.dom_fingerprint()
+                    cached = selector_cache.lookup(url, fingerprint=fingerprint)
+                if cached is not None:
+                    all_data = cached
+                else:
+                    # 获取所有元素（已排除div、label、form和文本元素）
+                    elements = await extractor.get_all_elements()
+                    all_data = [asdict(e) for e in elements]
+                    selector_cache.store(url, all_data, fingerprint, build_hash)
                 if write_to_json:
                     save_to_json(all_data, json_file)
                     print(f"\n数据已保存到: {json_file}")
@@ -276,5 +472,20 @@ def run(url, write_to_json=False):
         traceback.print_exc()
 
 
+async def arun_pages(urls: List[str], pool: BrowserPool = None, ready_selector: str = None) -> Dict[str, List[Any]]:
+    """
+        并发提取多个页面的元素，每个页面租用独立的 context
+        返回 {url: 元素列表}，提取失败的页面为空列表
+    """
+    urls = list(dict.fromkeys(u for u in urls if u))
+    results = await asyncio.gather(*[arun(u, pool=pool, ready_selector=ready_selector) for u in urls])
+    return {u: r or [] for u, r in zip(urls, results)}
+
+
+def run_pages(urls: List[str]) -> Dict[str, List[Any]]:
+    """多页面提取的同步入口，复用后台 event loop 上长期存活的浏览器池"""
+    return run_sync(arun_pages(urls))
+
+
 if __name__ == "__main__":
     run("http://localhost:5173/login?pass=123", True)
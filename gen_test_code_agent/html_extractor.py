@@ -0,0 +1,228 @@
+import os
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+from urllib.request import urlopen
+
+# 与 get_selector_from_html 中注入的 JavaScript 保持一致：按选择器顺序收集，再补充有 id 或 class 的元素
+TARGET_TAGS = ("input", "textarea", "button", "select", "a")
+TARGET_ROLES = ("button", "link", "textbox")
+TARGET_DATA_ATTRS = ("data-testid", "data-qa", "data-cy", "data-test")
+EXCLUDED_TAGS = {"div", "label", "form", "span", "p",
+                 "h1", "h2", "h3", "h4", "h5", "h6",
+                 "ul", "li", "ol", "table", "tr", "td", "th",
+                 "br", "hr", "b", "i", "em", "strong", "small",
+                 "mark", "del", "ins", "sub", "sup", "pre", "code"}
+
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+              "param", "source", "track", "wbr"}
+# 开始标签隐式关闭的同级元素（简化的 HTML 解析规则）
+_IMPLICIT_CLOSE = {"li": {"li"}, "option": {"option"}, "optgroup": {"option", "optgroup"},
+                   "tr": {"tr", "td", "th"}, "td": {"td", "th"}, "th": {"td", "th"},
+                   "dt": {"dt", "dd"}, "dd": {"dt", "dd"}}
+# 元素 .type 属性的取值规则（与浏览器 DOM 一致）
+_INPUT_TYPES = {"hidden", "text", "search", "tel", "url", "email", "password", "date", "month",
+                "week", "time", "datetime-local", "number", "range", "color", "checkbox", "radio",
+                "file", "submit", "image", "reset", "button"}
+_BUTTON_TYPES = {"submit", "reset", "button"}
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["_Node"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    def text_content(self) -> str:
+        """对应 el.textContent：按文档顺序拼接所有后代文本"""
+        out = []
+        for child in self.children:
+            out.append(child if isinstance(child, str) else child.text_content())
+        return "".join(out)
+
+    def descendants(self, tag: str) -> List["_Node"]:
+        found = []
+        for child in self.children:
+            if isinstance(child, _Node):
+                if child.tag == tag:
+                    found.append(child)
+                found.extend(child.descendants(tag))
+        return found
+
+
+class _TreeBuilder(HTMLParser):
+    """流式解析 HTML，构建只包含元素和文本的轻量树，同时按文档顺序记录元素"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("#document", {}, None)
+        self.current = self.root
+        self.elements: List[_Node] = []
+        self.base_href = None
+
+    def _close(self, tags, stop=("ul", "ol", "table", "select", "dl")):
+        node = self.current
+        while node is not self.root and node.tag not in stop:
+            if node.tag in tags:
+                self.current = node.parent
+                return
+            node = node.parent
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _IMPLICIT_CLOSE:
+            self._close(_IMPLICIT_CLOSE[tag])
+        node = _Node(tag, {k: ("" if v is None else v) for k, v in attrs}, self.current)
+        self.current.children.append(node)
+        self.elements.append(node)
+        if tag == "base" and self.base_href is None and "href" in node.attrs:
+            self.base_href = node.attrs["href"]
+        if tag not in _VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS and self.current.tag == tag:
+            self.current = self.current.parent
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root:
+            if node.tag == tag:
+                self.current = node.parent
+                return
+            node = node.parent
+
+    def handle_data(self, data):
+        # 与浏览器一致：textarea / pre 开始标签后紧跟的第一个换行被忽略
+        if self.current.tag in ("textarea", "pre", "listing") and not self.current.children \
+                and data.startswith("\n"):
+            data = data[1:]
+        if data:
+            self.current.children.append(data)
+
+
+def _matches_target(node: _Node, selector_index: int) -> bool:
+    if selector_index < len(TARGET_TAGS):
+        return node.tag == TARGET_TAGS[selector_index]
+    selector_index -= len(TARGET_TAGS)
+    if selector_index < len(TARGET_ROLES):
+        return node.attrs.get("role") == TARGET_ROLES[selector_index]
+    return TARGET_DATA_ATTRS[selector_index - len(TARGET_ROLES)] in node.attrs
+
+
+def _select_value(node: _Node) -> str:
+    options = node.descendants("option")
+    selected = [o for o in options if "selected" in o.attrs]
+    if "multiple" in node.attrs:
+        option = selected[0] if selected else None
+    else:
+        enabled = [o for o in options if "disabled" not in o.attrs]
+        option = selected[-1] if selected else (enabled[0] if enabled else None)
+    if option is None:
+        return ""
+    if "value" in option.attrs:
+        return option.attrs["value"]
+    return " ".join(option.text_content().split())
+
+
+def _dom_value(node: _Node) -> Optional[str]:
+    """对应 el.value，不支持 value 属性的元素返回 None"""
+    attrs = node.attrs
+    if node.tag == "input":
+        if "value" in attrs:
+            return attrs["value"]
+        return "on" if _dom_type(node) in ("checkbox", "radio") else ""
+    if node.tag == "textarea":
+        return node.text_content()
+    if node.tag == "select":
+        return _select_value(node)
+    if node.tag in ("button", "option", "data", "param"):
+        return attrs.get("value", "")
+    return None
+
+
+def _dom_type(node: _Node) -> Optional[str]:
+    """对应 el.type，不支持 type 属性的元素返回 None"""
+    declared = (node.attrs.get("type") or "").lower()
+    if node.tag == "input":
+        return declared if declared in _INPUT_TYPES else "text"
+    if node.tag == "button":
+        return declared if declared in _BUTTON_TYPES else "submit"
+    if node.tag == "select":
+        return "select-multiple" if "multiple" in node.attrs else "select-one"
+    if node.tag == "textarea":
+        return "textarea"
+    return None
+
+
+def _to_data(node: _Node, base_url: str) -> Dict[str, Any]:
+    """按注入 JavaScript 的字段语义生成元素数据（字段名与 page.evaluate 返回值一致）"""
+    attrs = node.attrs
+    text_content = node.text_content()
+    class_name = attrs.get("class") or ""
+    href = None
+    if node.tag in ("a", "area") and "href" in attrs:
+        href = urljoin(base_url, attrs["href"].strip()) if base_url else attrs["href"]
+    return {
+        "tagName": node.tag,
+        "id": attrs.get("id") or None,
+        "name": attrs.get("name"),
+        "className": class_name,
+        "classList": re.split(r"\s+", class_name.strip()) if class_name else [],
+        "placeholder": attrs.get("placeholder"),
+        "value": _dom_value(node) or text_content or None,
+        "text": text_content.strip()[:100] if text_content else None,
+        "href": href or attrs.get("href"),
+        "type": _dom_type(node) or attrs.get("type"),
+        "role": attrs.get("role"),
+        "ariaLabel": attrs.get("aria-label"),
+        "dataTestid": next((attrs[a] for a in TARGET_DATA_ATTRS if attrs.get(a)), None),
+    }
+
+
+def parse_elements(html: str, base_url: str = "") -> List[Dict[str, Any]]:
+    """
+        解析 HTML 字符串，返回与注入 JavaScript 相同顺序、相同字段的元素数据
+        base_url 用于把链接的 href 解析成绝对地址（与浏览器中 el.href 一致）
+    """
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    if builder.base_href is not None:
+        base_url = urljoin(base_url, builder.base_href)
+
+    collected = []
+    seen = set()
+    selector_count = len(TARGET_TAGS) + len(TARGET_ROLES) + len(TARGET_DATA_ATTRS)
+    for selector_index in range(selector_count):
+        for node in builder.elements:
+            if node.tag in EXCLUDED_TAGS or id(node) in seen:
+                continue
+            if _matches_target(node, selector_index):
+                seen.add(id(node))
+                collected.append(node)
+    # 补充：有 id 或 class 的元素
+    for node in builder.elements:
+        if node.tag in EXCLUDED_TAGS or id(node) in seen:
+            continue
+        if "id" in node.attrs or "class" in node.attrs:
+            seen.add(id(node))
+            collected.append(node)
+    return [_to_data(node, base_url) for node in collected]
+
+
+def load_html(source: str) -> Tuple[str, str]:
+    """读取 HTML 文件路径、file:// 或 http(s) 地址，返回 (html, base_url)"""
+    parsed = urlparse(source)
+    if parsed.scheme in ("http", "https"):
+        with urlopen(source, timeout=30) as resp:
+            charset = resp.headers.get_content_charset() or "utf-8"
+            return resp.read().decode(charset, errors="replace"), resp.geturl()
+    path = parsed.path if parsed.scheme == "file" else source
+    path = os.path.abspath(path)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read(), "file://" + path
@@ -30,6 +30,7 @@ class UITestCaseToCodePrompt:
         - 添加断言 assert
         - 用例名称 test_<case_id>
         - 包含等待，例如：locator.wait_for()
+        - 页面元素以表格给出（locator | kind | label），locator 可直接用于 page.locator()，单元格中的 \\| 表示字符 |
         - 输出完整的 Python 代码，不要解释
         """
     
@@ -44,3 +45,29 @@ class UITestCaseToCodePrompt:
         以下是访问的URL:
         {url}
         """
+
+
+class UIStepToCodePrompt:
+    system_prompt = """你是一名 Python + Playwright 自动化脚本生成专家。
+        测试代码的大部分步骤已由模板生成，你只需要为下面列出的步骤或断言生成代码片段。
+        JSON格式如下:
+        {format_instructions}
+
+        要求：
+        - 输出 JSON 数组，每个步骤一个元素，index 与输入中的序号一致
+        - code 只包含函数体中的语句，不要 import、函数定义和缩进
+        - 可用的变量只有 page（sync API 的 Page）和 expect
+        - 优先使用提供的页面元素选择器（locator | kind | label 表格，locator 可直接用于 page.locator()，单元格中的 \\| 表示字符 |），断言使用 expect
+        - 输出必须是合法 JSON，不要任何解释说明
+        """
+
+    user_prompt = """
+        以下是需要生成代码的步骤：
+        {steps}
+
+        以下是页面元素的选择器：
+        {selector}
+
+        以下是访问的URL:
+        {url}
+        """
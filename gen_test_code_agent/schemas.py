@@ -38,4 +38,8 @@ class UITestCaseSchema(BaseModel):
     preconditions: List[str] = Field(description="前置条件")
     steps: List[Step] = Field(description="测试步骤")
     assertions:  Assertion= Field(description="输出的结果判断的断言")
-    priority: Priority = Field(description="优先级")
\ No newline at end of file
+    priority: Priority = Field(description="优先级")
+
+class StepCodeSchema(BaseModel):
+    index: int = Field(description="步骤序号")
+    code: str = Field(description="该步骤的 Playwright 代码片段")
\ No newline at end of file
@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from gen_test_code_agent.selector_compactor import best_locator
+
+# SELECTOR_CACHE=0 时关闭缓存，每次都完整提取
+SELECTOR_CACHE_ENABLED = os.environ.get("SELECTOR_CACHE", "1") != "0"
+SELECTOR_CACHE_DIR = os.environ.get("SELECTOR_CACHE_DIR", "./output/selector_cache")
+# 每个 url 保留的历史快照数
+SELECTOR_CACHE_HISTORY = int(os.environ.get("SELECTOR_CACHE_HISTORY", 10))
+
+# 比较同一元素在两个快照间是否变化的字段
+_DIFF_FIELDS = ("element_type", "type", "role", "text", "placeholder", "aria_label", "href")
+
+
+def _cache_file(url: str) -> str:
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SELECTOR_CACHE_DIR, f"{name}.json")
+
+
+def load_history(url: str) -> Dict[str, Any]:
+    """读取 url 的快照历史：{"url", "snapshots": [旧 -> 新]}"""
+    path = _cache_file(url)
+    if not os.path.exists(path):
+        return {"url": url, "snapshots": []}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"url": url, "snapshots": []}
+
+
+def lookup(url: str, build_hash: str = None, fingerprint: str = None) -> Optional[List[Dict[str, Any]]]:
+    """
+        按构建 hash 或 DOM 指纹查找快照，命中返回元素列表，否则返回 None
+        从新到旧查找，前端回滚到旧版本时也能命中
+    """
+    if not SELECTOR_CACHE_ENABLED or not (build_hash or fingerprint):
+        return None
+    for snapshot in reversed(load_history(url)["snapshots"]):
+        if (build_hash and snapshot.get("build_hash") == build_hash) or \
+                (fingerprint and snapshot.get("fingerprint") == fingerprint):
+            print(f"♻️ selector 缓存命中: {url}（{snapshot['created_at']}）")
+            return snapshot["elements"]
+    return None
+
+
+def store(url: str, elements: List[Dict[str, Any]], fingerprint: str = None,
+          build_hash: str = None) -> Optional[Dict[str, List[Any]]]:
+    """保存新快照并返回与上一个快照的差异（没有上一个快照时返回 None）"""
+    if not SELECTOR_CACHE_ENABLED:
+        return None
+    history = load_history(url)
+    snapshots = history["snapshots"]
+    diff = diff_elements(snapshots[-1]["elements"], elements) if snapshots else None
+    snapshots.append({"created_at": datetime.now().strftime("%Y%m%d%H%M%S"),
+                      "fingerprint": fingerprint, "build_hash": build_hash,
+                      "elements": elements})
+    history["snapshots"] = snapshots[-SELECTOR_CACHE_HISTORY:]
+    os.makedirs(SELECTOR_CACHE_DIR, exist_ok=True)
+    path = _cache_file(url)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    if diff:
+        print(f"📝 selector 变化: {url} 新增 {len(diff['added'])}，"
+              f"删除 {len(diff['removed'])}，修改 {len(diff['changed'])}")
+    return diff
+
+
+def _element_key(el: Dict[str, Any]) -> str:
+    return best_locator(el) or f"{el.get('tag_name')}.{'.'.join(el.get('class_list') or [])}"
+
+
+def diff_elements(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+        比较两个快照的元素，按定位器对齐
+        返回 {"added": [定位器], "removed": [定位器], "changed": [{"locator", "field", "old", "new"}]}
+    """
+    old_map, new_map = {}, {}
+    for el in old or []:
+        old_map.setdefault(_element_key(el), el)
+    for el in new or []:
+        new_map.setdefault(_element_key(el), el)
+    changed = []
+    for key in old_map.keys() & new_map.keys():
+        for field in _DIFF_FIELDS:
+            if old_map[key].get(field) != new_map[key].get(field):
+                changed.append({"locator": key, "field": field,
+                                "old": old_map[key].get(field), "new": new_map[key].get(field)})
+    return {"added": sorted(new_map.keys() - old_map.keys()),
+            "removed": sorted(old_map.keys() - new_map.keys()),
+            "changed": sorted(changed, key=lambda c: (c["locator"], c["field"]))}
+
+
+def diff_history(url: str, older: int = -2, newer: int = -1) -> Optional[Dict[str, List[Any]]]:
+    """比较 url 历史中的两个快照（默认最近两次），快照不足时返回 None"""
+    snapshots = load_history(url)["snapshots"]
+    try:
+        return diff_elements(snapshots[older]["elements"], snapshots[newer]["elements"])
+    except IndexError:
+        return None
@@ -0,0 +1,100 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from utils.tools import estimate_tokens
+
+# 表格中标签文字的最大长度
+LABEL_MAX_CHARS = 30
+_CSS_IDENT_RE = re.compile(r"^-?[A-Za-z_][A-Za-z0-9_-]*$")
+_NEWLINE_RE = re.compile(r"\s*[\r\n]+\s*")
+
+
+def _css_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _short(value: Optional[str]) -> str:
+    value = " ".join((value or "").split())
+    return value if len(value) <= LABEL_MAX_CHARS else value[:LABEL_MAX_CHARS] + "…"
+
+
+def best_locator(el: Dict[str, Any]) -> Optional[str]:
+    """
+        元素最稳定的定位器：data-testid > id > name > aria-label/role > placeholder > text
+        返回 Playwright 可直接使用的 selector，没有可用属性时返回 None
+    """
+    tag = el.get("tag_name") or ""
+    if el.get("data_testid"):
+        return f'[data-testid="{_css_value(el["data_testid"])}"]'
+    if el.get("id"):
+        if _CSS_IDENT_RE.match(el["id"]):
+            return f"#{el['id']}"
+        return f'[id="{_css_value(el["id"])}"]'
+    if el.get("name"):
+        return f'{tag}[name="{_css_value(el["name"])}"]'
+    if el.get("aria_label"):
+        return f'{tag}[aria-label="{_css_value(el["aria_label"])}"]'
+    # has-text / role name 都是子串匹配，过长的文字只取前缀
+    text = " ".join((el.get("text") or "").split())[:LABEL_MAX_CHARS]
+    if el.get("role") and text:
+        return f'role={el["role"]}[name="{_css_value(text)}"]'
+    if el.get("placeholder"):
+        return f'{tag}[placeholder="{_css_value(el["placeholder"])}"]'
+    if text:
+        return f'{tag}:has-text("{_css_value(text)}")'
+    return None
+
+
+def _label(el: Dict[str, Any]) -> str:
+    """给 LLM 识别元素用的简短文字"""
+    for field in ("placeholder", "aria_label", "text", "name"):
+        if el.get(field):
+            return _short(el[field])
+    return ""
+
+
+def compact_selectors(elements: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+        每个元素只保留最稳定的一个定位器，去掉空字段、隐藏输入框和重复定位器
+        返回 [{"locator", "kind", "label"}]，顺序与页面元素一致
+    """
+    rows = []
+    seen = set()
+    for el in elements or []:
+        if (el.get("type") or "").lower() == "hidden":
+            continue
+        locator = best_locator(el)
+        if not locator or locator in seen:
+            continue
+        seen.add(locator)
+        row = {"locator": locator, "kind": el.get("element_type") or el.get("tag_name") or ""}
+        label = _label(el)
+        if label and label not in locator:
+            row["label"] = label
+        rows.append(row)
+    return rows
+
+
+def _cell(value: str) -> str:
+    """表格单元格：换行合并为空格，| 转义为 \\|，避免错列"""
+    return _NEWLINE_RE.sub(" ", value or "").replace("|", "\\|")
+
+
+def to_table(rows: List[Dict[str, str]]) -> str:
+    """压缩后的 selector 表，每行一个元素：locator | kind | label（单元格中的 \\| 表示字符 |）"""
+    lines = ["locator | kind | label"]
+    for row in rows:
+        cells = [_cell(row["locator"]), _cell(row["kind"]), _cell(row.get("label"))]
+        while cells and not cells[-1]:
+            cells.pop()
+        lines.append(" | ".join(cells))
+    return "\n".join(lines)
+
+
+def token_report(elements: List[Dict[str, Any]], table: str) -> Dict[str, Any]:
+    """压缩前（完整 ElementInfo JSON）与压缩后（表格）的 token 估算"""
+    raw_tokens = estimate_tokens(json.dumps(elements or [], ensure_ascii=False))
+    compact_tokens = estimate_tokens(table)
+    saved = 1 - compact_tokens / raw_tokens if raw_tokens else 0.0
+    return {"raw_tokens": raw_tokens, "compact_tokens": compact_tokens, "saved_ratio": round(saved, 3)}
@@ -0,0 +1,165 @@
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 建索引的字段及权重：用户能看到的文字权重高，技术属性权重低
+FIELD_WEIGHTS = {"placeholder": 3.0, "aria_label": 3.0, "text": 2.0, "data_testid": 2.0,
+                 "name": 2.0, "id": 1.5, "value": 1.0}
+# 每个步骤保留的候选元素数
+TOP_K = 5
+# 命中率（命中 token 的 idf 占比）低于该值视为没有匹配
+MIN_COVERAGE = 0.5
+
+# 中英文同义词，同组的词映射到同一个 token
+SYNONYMS = [
+    ("用户名", "账号", "帐号", "username", "user name", "account", "login name"),
+    ("密码", "password", "pwd", "passwd"),
+    ("登录", "登陆", "login", "signin", "sign in", "log in"),
+    ("注册", "register", "signup", "sign up"),
+    ("退出", "登出", "注销", "logout", "sign out", "log out"),
+    ("手机号", "手机", "电话", "phone", "mobile", "tel"),
+    ("邮箱", "email", "mail"),
+    ("验证码", "captcha", "verify code", "verification"),
+    ("提交", "submit"),
+    ("确定", "确认", "ok", "confirm"),
+    ("取消", "cancel"),
+    ("搜索", "查询", "search", "query"),
+    ("保存", "save"),
+    ("删除", "delete", "remove"),
+    ("编辑", "修改", "edit", "modify"),
+    ("新增", "添加", "新建", "add", "create", "new"),
+    ("上传", "upload"),
+    ("下一步", "next"),
+    ("上一步", "返回", "back", "prev", "previous"),
+    ("首页", "home"),
+    ("记住", "remember"),
+    ("忘记", "forgot", "forget"),
+]
+# 描述控件类型的词，不参与匹配（动作已经限定了元素类型）
+STOPWORDS = ("输入框", "文本框", "下拉框", "选择框", "复选框", "单选框", "按钮", "链接", "图标",
+             "区域", "页面", "控件", "字段", "框", "button", "btn", "input", "link", "field")
+
+_CJK_RUN_RE = re.compile(r"[一-鿿]+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CAMEL_RE = re.compile(r"([a-z0-9])([A-Z])")
+
+
+
+# 英文单词同义词按整词匹配，中文和多词短语按子串匹配（长的优先）
+_SYN_WORDS = {term: index for index, group in enumerate(SYNONYMS)
+              for term in group if _WORD_RE.fullmatch(term)}
+_SYN_PHRASES = sorted(((term, index) for index, group in enumerate(SYNONYMS)
+                       for term in group if not _WORD_RE.fullmatch(term)),
+                      key=lambda item: -len(item[0]))
+
+
+def tokenize(text: str, strip_stopwords: bool = False) -> List[str]:
+    """
+        中文按二元组、英文按单词（拆分驼峰和下划线）切分，同义词替换为同一个 token
+        同义词替换后剩下的单个汉字不参与匹配（整段只有一个汉字时除外）
+    """
+    if not text:
+        return []
+    text = _CAMEL_RE.sub(r"\1 \2", str(text)).lower().replace("_", " ").replace("-", " ")
+    if strip_stopwords:
+        for word in STOPWORDS:
+            text = text.replace(word, " ")
+    tokens = []
+    for term, index in _SYN_PHRASES:
+        if term in text:
+            tokens.append(f"syn:{index}")
+            text = text.replace(term, " ")
+    for word in _WORD_RE.findall(text):
+        tokens.append(f"syn:{_SYN_WORDS[word]}" if word in _SYN_WORDS else word)
+    singles = []
+    for run in _CJK_RUN_RE.findall(text):
+        if len(run) == 1:
+            singles.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens or singles
+
+
+class SelectorIndex:
+    """
+        页面元素的倒排索引：token -> {元素序号: 字段权重}
+        命中率 = 命中 token 的 idf 之和 / 查询 token 的 idf 之和，用于判断是否匹配；
+        命中率相同时按 idf × 字段权重排序
+    """
+
+    def __init__(self, elements: List[Dict[str, Any]]):
+        self.elements = elements or []
+        self.postings: Dict[str, Dict[int, float]] = {}
+        for doc, el in enumerate(self.elements):
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in set(tokenize(el.get(field))):
+                    docs = self.postings.setdefault(token, {})
+                    docs[doc] = max(docs.get(doc, 0.0), weight)
+        total = len(self.elements)
+        self.idf = {t: math.log(1 + total / len(d)) for t, d in self.postings.items()}
+        self.default_idf = math.log(1 + total) if total else 1.0
+
+    def search(self, target: str, k: int = TOP_K, kinds: Optional[Iterable[str]] = None,
+               min_coverage: float = 0.0) -> List[Tuple[float, Dict[str, Any]]]:
+        """返回与 target 最相关的 k 个元素 [(命中率, 元素)]，kinds 限定 element_type"""
+        tokens = set(tokenize(target, strip_stopwords=True))
+        if not tokens:
+            return []
+        kinds = {kind.lower() for kind in kinds} if kinds else None
+        matched: Dict[int, float] = {}
+        weighted: Dict[int, float] = {}
+        possible = 0.0
+        for token in tokens:
+            idf = self.idf.get(token, self.default_idf)
+            possible += idf
+            for doc, weight in self.postings.get(token, {}).items():
+                matched[doc] = matched.get(doc, 0.0) + idf
+                weighted[doc] = weighted.get(doc, 0.0) + idf * weight
+        results = []
+        for doc, score in matched.items():
+            el = self.elements[doc]
+            if kinds is not None and (el.get("element_type") or "").lower() not in kinds:
+                continue
+            coverage = score / possible
+            if coverage >= min_coverage:
+                results.append((coverage, weighted[doc], doc))
+        results.sort(key=lambda r: (-r[0], -r[1], r[2]))
+        return [(round(coverage, 4), self.elements[doc]) for coverage, _, doc in results[:k]]
+
+
+_index_cache: Dict[int, SelectorIndex] = {}
+_INDEX_CACHE_SIZE = 32
+
+
+def get_index(elements: List[Dict[str, Any]]) -> SelectorIndex:
+    """同一个页面的元素列表只建一次索引（按列表对象缓存）"""
+    index = _index_cache.get(id(elements))
+    if index is None or index.elements is not elements:
+        index = SelectorIndex(elements)
+        _index_cache[id(elements)] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.pop(next(iter(_index_cache)))
+    return index
+
+
+def relevant_elements(structured_case: Dict[str, Any], elements: List[Dict[str, Any]],
+                      k: int = TOP_K) -> List[Dict[str, Any]]:
+    """
+        用例每个步骤的 target 与断言的 expected 各取 top-k 个元素，合并后按页面顺序返回
+        用例没有可匹配的内容或匹配不到任何元素时返回全部元素
+    """
+    if not isinstance(structured_case, dict) or not elements:
+        return elements or []
+    index = get_index(elements)
+    queries = [step.get("target") for step in structured_case.get("steps") or []]
+    assertions = structured_case.get("assertions") or []
+    if isinstance(assertions, dict):
+        assertions = [assertions]
+    queries.extend(a.get("expected") for a in assertions)
+    picked = set()
+    for query in queries:
+        for _, el in index.search(query or "", k):
+            picked.add(id(el))
+    if not picked:
+        return elements
+    return [el for el in elements if id(el) in picked]
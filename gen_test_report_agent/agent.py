@@ -1,21 +1,83 @@
+import os
+import glob
 from datetime import datetime
-from typing import TypedDict, Dict, Any
-from gen_test_report_agent.diagnose import diagnose
+from typing import TypedDict, Dict, Any, List, Optional
+from gen_test_report_agent.diagnose import diagnose, diagnose_events, finished_report
+from gen_test_report_agent.live import run_and_diagnose
+from gen_test_report_agent.analytics import analyze, flip_rate_map
+from gen_test_report_agent.performance import analyze_report, render_section
+from run_test_code_agent.sharded_runner import REPORT_DIR, RUNNER_SHARD_TIMEOUT
 from langgraph.graph import START, END, StateGraph
 
+# 边执行边诊断时，超过该时间（秒）没有新的事件就停止等待（默认比单个分片的超时多 60 秒）
+REPORT_EVENTS_IDLE_TIMEOUT = float(os.environ.get("REPORT_EVENTS_IDLE_TIMEOUT", RUNNER_SHARD_TIMEOUT + 60))
+
 
 class ReportState(TypedDict):
     feature_id: str
+    # 不为空时先执行这些测试文件，执行的同时逐条诊断
+    test_code_refs: List[str]
+    # 用例选择模式：full / failed_first / impacted，为空时使用 RUNNER_SELECTION
+    selection: str
     report_file_path: str
+    # 执行器的实时事件文件，不为空时边执行边诊断
+    events_path: str
+    # 只诊断该次执行的事件，为空时取事件文件中最后一次执行
+    run_id: str
     result: Dict[str, Any]
+    # 基于执行历史的 flaky / 耗时回归 / 失败分类趋势摘要
+    analytics: Dict[str, Any]
+    # 执行耗时分析：最慢用例、setup 主导、按页面/feature 的耗时分布、超时
+    performance: Dict[str, Any]
+    performance_section: str
+
+
+def _report_path(state: ReportState) -> Optional[str]:
+    """report_file_path 指向 JSON 报告时使用它，否则使用该 feature 最新的执行报告，没有时返回 None"""
+    path = state.get("report_file_path") or ""
+    if path.endswith(".json"):
+        return path
+    files = glob.glob(os.path.join(REPORT_DIR, f"report_{state.get('feature_id')}_*.json"))
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def _print_diagnosis(item: Dict[str, Any]):
+    if item["diagnosis"]:
+        print(f"❌ {item['nodeid']}: {item['diagnosis']['category']}，{item['diagnosis']['suggestion']}")
 
 
 def test_report_create_node(state: ReportState):
     """提取测试报告信息"""
     print("生成测试报告信息")
-    result = diagnose("./output/reporters/report.json")
+    # 本次结果入库前的历史翻转率，用于 flaky 判断
+    flakiness = flip_rate_map(state.get("feature_id"))
+    run_id = state.get("run_id")
+    if state.get("test_code_refs"):
+        report_path, run_id, result = run_and_diagnose(
+            state["test_code_refs"], state["feature_id"], state.get("selection"), flakiness,
+            REPORT_EVENTS_IDLE_TIMEOUT, _print_diagnosis)
+    elif state.get("events_path"):
+        result = []
+        for item in diagnose_events(state["events_path"], idle_timeout=REPORT_EVENTS_IDLE_TIMEOUT,
+                                    run_id=run_id, flakiness=flakiness):
+            _print_diagnosis(item)
+            result.append(item)
+        report_path = finished_report(state["events_path"], run_id)
+    else:
+        report_path = _report_path(state)
+        if report_path and os.path.exists(report_path):
+            result = diagnose(report_path, flakiness)
+        else:
+            print(f"⚠️ 没有找到 feature {state.get('feature_id')} 的测试报告，跳过诊断")
+            result = []
     print(result)
-    return {"result": result}
+    analytics = analyze(state.get("feature_id"))
+    print(f"📈 历史分析: {analytics}")
+    performance = analyze_report(report_path) if report_path and os.path.exists(report_path) else None
+    section = render_section(performance, analytics)
+    print(section)
+    return {"report_file_path": report_path, "run_id": run_id, "result": result, "analytics": analytics,
+            "performance": performance, "performance_section": section}
 
 
 def create_graph():
@@ -0,0 +1,274 @@
+import os
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from gen_test_report_agent.diagnose import FLAKY_FLIP_RATE, FLAKY_MIN_RUNS
+from gen_test_report_agent.history_store import HistoryStore, history_store
+
+# 分析最近多少次执行
+ANALYTICS_RUNS = int(os.environ.get("ANALYTICS_RUNS", 500))
+# ANALYTICS_CACHE=0 时不使用矩阵缓存，每次从 history_store 完整读取
+ANALYTICS_CACHE = os.environ.get("ANALYTICS_CACHE", "1") != "0"
+# 指数加权通过率的衰减系数，越大越看重最近的执行
+EWMA_ALPHA = float(os.environ.get("ANALYTICS_EWMA_ALPHA", 0.1))
+# 耗时基线至少需要的执行次数
+MIN_RUNS = 5
+# 耗时回归：最近一次耗时与之前 DURATION_WINDOW 次的均值比较，z-score 达到 DURATION_Z 视为变慢
+DURATION_WINDOW = 20
+DURATION_Z = 3.0
+# 标准差下限（秒 / 均值比例），避免耗时非常稳定的用例因微小波动被标记
+DURATION_MIN_STD = 0.05
+DURATION_MIN_STD_RATIO = 0.05
+# 分类趋势统计最近多少次执行
+TREND_RUNS = 20
+# 摘要中每个列表最多保留的条目数
+SUMMARY_TOP_N = 10
+
+# 结果矩阵中的取值
+MISSING, PASSED, FAILED, SKIPPED = -1, 0, 1, 2
+_OUTCOME_CODES = {"passed": PASSED, "failed": FAILED, "error": FAILED, "skipped": SKIPPED}
+
+
+class RunMatrix:
+    """
+        用例 × 执行 的结果矩阵，行按 history_store.history_key（重新生成代码后不变）对齐
+        - outcome: int8，MISSING / PASSED / FAILED / SKIPPED
+        - duration: float32，只有 passed / failed 的执行有值，其余为 nan
+        - category: int16，失败分类在 categories 中的下标，没有分类为 -1
+    """
+
+    def __init__(self, keys: List[str], run_ids: List[int], outcome: np.ndarray,
+                 duration: np.ndarray, category: np.ndarray, categories: List[str]):
+        self.keys = keys
+        self.run_ids = run_ids
+        self.outcome = outcome
+        self.duration = duration
+        self.category = category
+        self.categories = categories
+
+
+def _cache_file(store: HistoryStore, feature_id: Optional[str], runs: int) -> str:
+    # 不同窗口（analyze 的 ANALYTICS_RUNS、flip_rate_map 的 HistoryStore.window）各自缓存，互不覆盖
+    return os.path.join(os.path.dirname(os.path.abspath(store.path)), f"matrix_{feature_id or 'all'}_{runs}.npz")
+
+
+def _load_cache(path: str) -> Optional[RunMatrix]:
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return RunMatrix(data["keys"].tolist(), data["run_ids"].tolist(), data["outcome"],
+                             data["duration"], data["category"], data["categories"].tolist())
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _save_cache(path: str, matrix: RunMatrix):
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, keys=np.asarray(matrix.keys, dtype=str),
+             run_ids=np.asarray(matrix.run_ids, dtype=np.int64), outcome=matrix.outcome,
+             duration=matrix.duration, category=matrix.category,
+             categories=np.asarray(matrix.categories, dtype=str))
+    os.replace(tmp_path, path)
+
+
+def load_matrix(store: HistoryStore = None, runs: int = None, feature_id: str = None,
+                use_cache: bool = None) -> RunMatrix:
+    """
+        从 history_store 读取最近 runs 次执行，构建结果矩阵
+        矩阵缓存为 npz（与历史库同目录），下次只读取缓存之后新增的执行
+    """
+    store = store or history_store
+    use_cache = ANALYTICS_CACHE if use_cache is None else use_cache
+    runs = runs or ANALYTICS_RUNS
+    run_ids = store.recent_runs(runs, feature_id)
+    path = _cache_file(store, feature_id, runs)
+    cached = _load_cache(path) if use_cache else None
+    cached_cols = {run_id: col for col, run_id in enumerate(cached.run_ids)} if cached else {}
+    missing = [run_id for run_id in run_ids if run_id not in cached_cols]
+
+    index = {key: row for row, key in enumerate(cached.keys)} if cached else {}
+    categories = {name: code for code, name in enumerate(cached.categories)} if cached else {}
+    columns = {run_id: col for col, run_id in enumerate(run_ids)}
+    parts = []
+    for batch in store.result_batches(missing):
+        names, batch_runs, outcomes, durations, cats = zip(*batch)
+        rows = np.fromiter((index.setdefault(n, len(index)) for n in names), dtype=np.int64, count=len(names))
+        cols = np.fromiter((columns[r] for r in batch_runs), dtype=np.int64, count=len(batch_runs))
+        codes = np.fromiter((_OUTCOME_CODES.get(o, MISSING) for o in outcomes),
+                            dtype=np.int8, count=len(outcomes))
+        cat_codes = np.fromiter((-1 if c is None else categories.setdefault(c, len(categories))
+                                 for c in cats), dtype=np.int16, count=len(cats))
+        parts.append((rows, cols, codes, np.asarray(durations, dtype=np.float32), cat_codes))
+
+    outcome = np.full((len(index), len(run_ids)), MISSING, dtype=np.int8)
+    duration = np.full(outcome.shape, np.nan, dtype=np.float32)
+    category = np.full(outcome.shape, -1, dtype=np.int16)
+    if cached is not None:
+        kept = [(columns[run_id], cached_cols[run_id]) for run_id in run_ids if run_id in cached_cols]
+        if kept:
+            new_cols, old_cols = map(list, zip(*kept))
+            old_rows = len(cached.keys)
+            outcome[:old_rows, new_cols] = cached.outcome[:, old_cols]
+            duration[:old_rows, new_cols] = cached.duration[:, old_cols]
+            category[:old_rows, new_cols] = cached.category[:, old_cols]
+    for rows, cols, codes, durations, cat_codes in parts:
+        outcome[rows, cols] = codes
+        executed = (codes == PASSED) | (codes == FAILED)
+        duration[rows[executed], cols[executed]] = durations[executed]
+        category[rows, cols] = cat_codes
+    # 同一次执行中同一用例有多条结果（新旧代码文件都在）时失败优先，与 history_store 一致
+    for rows, cols, codes, durations, cat_codes in parts:
+        failed = codes == FAILED
+        outcome[rows[failed], cols[failed]] = FAILED
+        duration[rows[failed], cols[failed]] = durations[failed]
+        category[rows[failed], cols[failed]] = cat_codes[failed]
+
+    # 去掉窗口内没有任何执行记录的用例（已删除的用例）
+    active = (outcome != MISSING).any(axis=1)
+    keys = [key for key, keep in zip(index, active) if keep]
+    matrix = RunMatrix(keys, run_ids, outcome[active], duration[active], category[active],
+                       list(categories))
+    if use_cache and (missing or cached is None or len(cached.run_ids) != len(run_ids)):
+        _save_cache(path, matrix)
+    return matrix
+
+
+def _executed(outcome: np.ndarray) -> np.ndarray:
+    return (outcome == PASSED) | (outcome == FAILED)
+
+
+def flip_rates(outcome: np.ndarray):
+    """
+        每个用例相邻两次执行（跳过未执行和 skipped）结果翻转的比例
+        返回 (翻转率, 执行次数)
+    """
+    executed = _executed(outcome)
+    cols = np.arange(outcome.shape[1])
+    # 每个位置之前最近一次执行所在的列（前向填充）
+    last = np.where(executed, cols, -1)
+    np.maximum.accumulate(last, axis=1, out=last)
+    prev = np.full_like(last, -1)
+    prev[:, 1:] = last[:, :-1]
+    prev_outcome = np.take_along_axis(outcome, np.maximum(prev, 0), axis=1)
+    flips = (executed & (prev >= 0) & (prev_outcome != outcome)).sum(axis=1)
+    counts = executed.sum(axis=1)
+    rates = np.divide(flips, counts - 1, out=np.zeros(len(counts)), where=counts > 1)
+    return rates, counts
+
+
+def ewma_pass_rates(outcome: np.ndarray, alpha: float = None) -> np.ndarray:
+    """指数加权通过率（越新的执行权重越大），没有执行记录的用例为 nan"""
+    alpha = alpha or EWMA_ALPHA
+    weights = (1 - alpha) ** np.arange(outcome.shape[1] - 1, -1, -1, dtype=np.float64)
+    passed = (outcome == PASSED).astype(np.float32) @ weights
+    total = _executed(outcome).astype(np.float32) @ weights
+    return np.divide(passed, total, out=np.full(len(total), np.nan), where=total > 0)
+
+
+def duration_zscores(duration: np.ndarray, window: int = None):
+    """
+        每个用例最近一次执行耗时相对之前 window 次执行的 z-score
+        返回 (z, 最近耗时, 基线均值)，基线不足 MIN_RUNS 次时 z 为 nan
+    """
+    window = window or DURATION_WINDOW
+    if duration.shape[1] == 0:
+        empty = np.full(duration.shape[0], np.nan)
+        return empty, empty, empty
+    # 稳定排序把 nan 移到左侧，每行有值的耗时按时间顺序靠右对齐
+    order = np.argsort(~np.isnan(duration), axis=1, kind="stable")
+    packed = np.take_along_axis(duration, order, axis=1)[:, -(window + 1):].astype(np.float64)
+    latest = packed[:, -1]
+    baseline = packed[:, :-1]
+    valid = ~np.isnan(baseline)
+    count = valid.sum(axis=1)
+    filled = np.where(valid, baseline, 0.0)
+    mean = np.divide(filled.sum(axis=1), count, out=np.full(len(count), np.nan), where=count > 0)
+    var = np.divide((np.where(valid, baseline - mean[:, None], 0.0) ** 2).sum(axis=1), count,
+                    out=np.full(len(count), np.nan), where=count > 0)
+    std = np.maximum(np.sqrt(var), np.maximum(DURATION_MIN_STD, mean * DURATION_MIN_STD_RATIO))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        z = np.where(count >= MIN_RUNS, (latest - mean) / std, np.nan)
+    return z, latest, mean
+
+
+def category_trends(outcome: np.ndarray, category: np.ndarray, n_categories: int,
+                    runs: int = None):
+    """
+        每个失败分类在最近 runs 次执行中每次的失败数，以及线性拟合的斜率（每次执行增加的失败数）
+        返回 (counts[分类, 执行], slope[分类])
+    """
+    runs = min(runs or TREND_RUNS, outcome.shape[1])
+    recent_outcome = outcome[:, outcome.shape[1] - runs:]
+    recent_category = category[:, category.shape[1] - runs:]
+    failed = (recent_outcome == FAILED) & (recent_category >= 0)
+    cols = np.broadcast_to(np.arange(runs), failed.shape)[failed]
+    index = recent_category[failed].astype(np.int64) * runs + cols
+    counts = np.bincount(index, minlength=n_categories * runs).reshape(n_categories, runs)
+    x = np.arange(runs, dtype=np.float64) - (runs - 1) / 2
+    denom = float(x @ x)
+    slope = counts @ x / denom if denom else np.zeros(n_categories)
+    return counts, slope
+
+
+def _round(value, digits: int = 3) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def summarize(matrix: RunMatrix) -> Dict[str, Any]:
+    """计算各项指标，返回报告可直接附带的精简摘要"""
+    outcome = matrix.outcome
+    summary: Dict[str, Any] = {"runs": len(matrix.run_ids), "tests": len(matrix.keys)}
+    if outcome.size == 0:
+        return summary
+
+    flips, counts = flip_rates(outcome)
+    ewma = ewma_pass_rates(outcome)
+    executed_last = _executed(outcome[:, -1])
+    summary["last_run_pass_rate"] = _round((outcome[:, -1] == PASSED).sum() / executed_last.sum()) \
+        if executed_last.any() else None
+    summary["ewma_pass_rate"] = _round(np.nanmean(ewma)) if (counts > 0).any() else None
+
+    flaky = np.flatnonzero((flips >= FLAKY_FLIP_RATE) & (counts >= FLAKY_MIN_RUNS))
+    flaky = flaky[np.argsort(-flips[flaky], kind="stable")]
+    summary["flaky_count"] = int(len(flaky))
+    summary["flaky"] = [{"test_key": matrix.keys[i], "flip_rate": _round(flips[i]),
+                         "ewma_pass_rate": _round(ewma[i]), "runs": int(counts[i])}
+                        for i in flaky[:SUMMARY_TOP_N]]
+
+    z, latest, mean = duration_zscores(matrix.duration)
+    with np.errstate(invalid="ignore"):
+        slow = np.flatnonzero(z >= DURATION_Z)
+    slow = slow[np.argsort(-z[slow], kind="stable")]
+    summary["duration_regression_count"] = int(len(slow))
+    summary["duration_regressions"] = [{"test_key": matrix.keys[i], "duration": _round(latest[i]),
+                                        "baseline": _round(mean[i]), "z": _round(z[i], 2)}
+                                       for i in slow[:SUMMARY_TOP_N]]
+
+    trend_counts, slope = category_trends(outcome, matrix.category, len(matrix.categories))
+    trends = [{"category": name, "recent_failures": int(trend_counts[i].sum()),
+               "last_run": int(trend_counts[i, -1]), "slope": _round(slope[i])}
+              for i, name in enumerate(matrix.categories) if trend_counts[i].any()]
+    summary["category_trends"] = sorted(trends, key=lambda t: (-t["recent_failures"], t["category"]))
+    return summary
+
+
+def analyze(feature_id: str = None, store: HistoryStore = None, runs: int = None) -> Dict[str, Any]:
+    """读取历史并返回摘要"""
+    return summarize(load_matrix(store, runs, feature_id))
+
+
+def flip_rate_map(feature_id: str = None, store: HistoryStore = None,
+                  runs: int = None) -> Dict[str, tuple]:
+    """
+        每个用例的 {test_key: (翻转率, 执行次数)}，供 diagnose 判断 flaky
+        默认只取最近 HistoryStore.window 次执行，与 history_store.flip_rate 的窗口一致
+    """
+    store = store or history_store
+    matrix = load_matrix(store, runs or store.window, feature_id)
+    if matrix.outcome.size == 0:
+        return {}
+    rates, counts = flip_rates(matrix.outcome)
+    return {key: (float(rates[i]), int(counts[i])) for i, key in enumerate(matrix.keys)}
@@ -1,15 +1,19 @@
+import os
 import json
-import hashlib
+import time
 from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from gen_test_report_agent.history_store import history_store, history_key
+from gen_test_report_agent.report_stream import iter_report_tests
+from gen_test_report_agent.fingerprint import FailureClusters, failure_text, fingerprint
 
 
 # ---------- 工具方法 ----------
 
 def stack_hash(traceback: str) -> str:
-    """用 traceback 生成稳定 hash，用于影响范围判断"""
-    if not traceback:
-        return ""
-    return hashlib.md5(traceback.encode("utf-8")).hexdigest()[:8]
+    """用规范化后的 traceback 生成稳定 hash（忽略路径、行号、生成的文件名等），用于影响范围判断"""
+    return fingerprint(traceback)
 
 
 def classify_failure(error_type: str, error_message: str) -> str:
@@ -29,82 +33,210 @@ def classify_failure(error_type: str, error_message: str) -> str:
     return "UNKNOWN"
 
 
-def is_flaky(pass_rate: float) -> bool:
-    """MVP flaky 判断"""
-    return pass_rate < 0.95
-
+# 相邻两次执行结果翻转的比例达到该值、且执行次数足够时视为 flaky（analytics 也使用这条规则）
+# 只看通过率会把连续失败的真实回归（如 18/20 通过）也判为 flaky
+FLAKY_FLIP_RATE = float(os.environ.get("ANALYTICS_FLAKY_FLIP_RATE", 0.2))
+FLAKY_MIN_RUNS = 5
 
-# ---------- 历史数据（MVP 用 mock） ----------
 
-MOCK_HISTORY = {
-    "tests/test_login.py::test_login_fail": {
-        "pass_rate": 0.72,
-        "last_outcome": "passed"
-    }
-}
+def is_flaky(flip_rate: Optional[float], runs: int) -> bool:
+    """flaky 判断：历史中通过与失败交替出现，而不是通过率低"""
+    return flip_rate is not None and runs >= FLAKY_MIN_RUNS and flip_rate >= FLAKY_FLIP_RATE
 
 
 # ---------- 诊断主逻辑 ----------
 
-def diagnose(report_path: str):
-    with open(report_path, "r", encoding="utf-8") as f:
-        report = json.load(f)
-
-    tests = report.get("tests", [])
-    diagnostics = []
+def add_failure(test: Dict[str, Any], clusters: FailureClusters):
+    """失败的用例加入聚类，用于影响范围判断"""
+    if test.get("outcome") in ("failed", "error"):
+        clusters.add(failure_text(test), key=test["nodeid"])
+
+
+def diagnose_test(test: Dict[str, Any], clusters: FailureClusters,
+                  before_run: int = None, flakiness: Dict[str, tuple] = None) -> Dict[str, Any]:
+    """
+        单条用例诊断，历史数据取自 history_store 中 before_run 之前的执行
+        flakiness 为 analytics.flip_rate_map 的结果 {test_key: (翻转率, 执行次数)}，没有该用例时按 history_store 计算
+        impact 为同一聚类（同一根因）中的失败数
+    """
+    nodeid = test["nodeid"]
+    outcome = test["outcome"]
+
+    history = history_store.history(nodeid, before_run) if outcome == "failed" else {}
+    last_outcome = history.get("last_outcome")
+
+    diagnosis = {
+        "nodeid": nodeid,
+        "outcome": outcome,
+        "timestamp": datetime.utcnow().isoformat(),
+        "diagnosis": {}
+    }
 
-    # 先算 stack_hash 的影响范围
-    stack_counter = {}
-
-    for test in tests:
-        call = test.get("call", {})
-        crash = call.get("crash", {})
-        tb = crash.get("traceback", "")
-        h = stack_hash(tb)
-        if h:
-            stack_counter[h] = stack_counter.get(h, 0) + 1
-
-    # 单条用例诊断
-    for test in tests:
-        nodeid = test["nodeid"]
-        outcome = test["outcome"]
-
-        history = MOCK_HISTORY.get(nodeid, {})
-        last_outcome = history.get("last_outcome")
-        pass_rate = history.get("pass_rate", 1.0)
-
-        diagnosis = {
-            "nodeid": nodeid,
-            "outcome": outcome,
-            "timestamp": datetime.utcnow().isoformat(),
-            "diagnosis": {}
+    if outcome == "failed":
+        crash = test.get("call", {}).get("crash", {})
+        error_type = crash.get("message", "")
+        traceback = crash.get("traceback", "")
+
+        failure_type = classify_failure(error_type, traceback)
+        flip_rate, runs = (flakiness or {}).get(history_key(nodeid)) or (history.get("flip_rate"), history.get("runs") or 0)
+        flaky = is_flaky(flip_rate, runs)
+        regression = last_outcome == "passed"
+
+        fp = clusters.keys.get(nodeid)
+        if fp is None:
+            fp = stack_hash(failure_text(test))
+        cluster_id, cluster_size = clusters.cluster(fp)
+        impact = cluster_size or 1
+
+        diagnosis["diagnosis"] = {
+            "category": failure_type,
+            "regression": regression,
+            "flaky": flaky,
+            "impact": impact,
+            "cluster_id": cluster_id,
+            "cluster_size": cluster_size,
+            "first_failing_run": (history.get("first_failing_run") or {}).get("run_id"),
+            "suggestion": build_suggestion(
+                failure_type, flaky, regression
+            )
         }
 
-        if outcome == "failed":
-            crash = test.get("call", {}).get("crash", {})
-            error_type = crash.get("message", "")
-            traceback = crash.get("traceback", "")
-
-            failure_type = classify_failure(error_type, traceback)
-            flaky = is_flaky(pass_rate)
-            regression = last_outcome == "passed"
-
-            h = stack_hash(traceback)
-            impact = stack_counter.get(h, 1)
-
-            diagnosis["diagnosis"] = {
-                "category": failure_type,
-                "regression": regression,
-                "flaky": flaky,
-                "impact": impact,
-                "suggestion": build_suggestion(
-                    failure_type, flaky, regression
-                )
-            }
-
+    return diagnosis
+
+
+def _categories(diagnostics) -> Dict[str, str]:
+    return {d["nodeid"]: d["diagnosis"]["category"] for d in diagnostics if d["diagnosis"]}
+
+
+def iter_diagnose(report_path: str, flakiness: Dict[str, tuple] = None) -> Iterator[Dict[str, Any]]:
+    """
+        流式诊断：不把整个报告读入内存，逐条返回诊断结果
+        第一遍只对失败做指纹聚类，第二遍逐条诊断，全部返回后把报告导入 history_store
+    """
+    # 先聚类，得到每个根因的影响范围
+    clusters = FailureClusters()
+    for test in iter_report_tests(report_path):
+        add_failure(test, clusters)
+
+    # 报告已入库时（重复诊断）只参考它之前的历史
+    before_run = history_store.run_id(report_path)
+    categories = {}
+    for test in iter_report_tests(report_path):
+        diagnosis = diagnose_test(test, clusters, before_run, flakiness)
+        if diagnosis["diagnosis"]:
+            categories[diagnosis["nodeid"]] = diagnosis["diagnosis"]["category"]
+        yield diagnosis
+    history_store.ingest(report_path, categories=categories, fingerprints=clusters.keys)
+
+
+def diagnose(report_path: str, flakiness: Dict[str, tuple] = None):
+    return list(iter_diagnose(report_path, flakiness))
+
+
+# ---------- 实时事件（执行过程中增量诊断） ----------
+
+def _latest_run_offset(f) -> int:
+    """文件中最后一条 run_started 事件的位置（没有时为文件开头）"""
+    latest = offset = f.tell()
+    for line in iter(f.readline, ""):
+        if line.endswith("\n") and '"run_started"' in line:
+            latest = offset
+        offset = f.tell()
+    return latest
+
+
+def follow_events(events_path: str, poll_interval: float = 0.2,
+                  idle_timeout: float = None, run_id: str = None) -> Iterator[Dict[str, Any]]:
+    """
+        跟随读取执行器写入的 JSONL 事件文件（类似 tail -f），逐条返回事件
+        事件文件可能被多次执行复用：指定 run_id 时只返回该次执行的事件，
+        否则从最后一次执行（最后一条 run_started）开始读取，之后出现新的 run_started 时切换到新的执行
+        run_finished 事件为最后一条；超过 idle_timeout 秒没有新内容时提前结束
+    """
+    last_read = time.monotonic()
+    while not os.path.exists(events_path):
+        if idle_timeout is not None and time.monotonic() - last_read > idle_timeout:
+            print(f"⚠️ {idle_timeout} 秒内没有生成事件文件，停止等待: {events_path}")
+            return
+        time.sleep(poll_interval)
+
+    buffer = ""
+    current = run_id
+    with open(events_path, "r", encoding="utf-8") as f:
+        if run_id is None:
+            f.seek(_latest_run_offset(f))
+        while True:
+            chunk = f.read()
+            if not chunk:
+                if idle_timeout is not None and time.monotonic() - last_read > idle_timeout:
+                    print(f"⚠️ {idle_timeout} 秒没有新的结果事件，停止读取: {events_path}")
+                    return
+                time.sleep(poll_interval)
+                continue
+            last_read = time.monotonic()
+            buffer += chunk
+            # 只处理完整的行，写到一半的行留到下次
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if run_id is None and event.get("event") == "run_started":
+                    current = event.get("run_id")
+                if current is not None and event.get("run_id") != current:
+                    continue
+                yield event
+                if event.get("event") == "run_finished":
+                    return
+
+
+def finished_report(events_path: str, run_id: str = None) -> Optional[str]:
+    """
+        run_finished 事件记录的合并报告路径（run_id 为空时取最后一次执行），执行未结束时返回 None
+    """
+    target, finished = run_id, {}
+    try:
+        with open(events_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if '"run_started"' not in line and '"run_finished"' not in line:
+                    continue
+                event = json.loads(line)
+                if event.get("event") == "run_started" and run_id is None:
+                    target = event.get("run_id")
+                elif event.get("event") == "run_finished":
+                    finished[event.get("run_id")] = event.get("report_path")
+    except (OSError, ValueError):
+        return None
+    return finished.get(target)
+
+
+def diagnose_events(events_path: str, poll_interval: float = 0.2,
+                    idle_timeout: float = None, run_id: str = None,
+                    flakiness: Dict[str, tuple] = None) -> Iterator[Dict[str, Any]]:
+    """
+        边执行边诊断：每收到一条用例结果就输出它的诊断
+        impact / cluster_size 只统计到目前为止收到的同一聚类的失败数
+        执行结束后把合并报告导入 history_store
+    """
+    clusters = FailureClusters()
+    diagnostics = []
+    for event in follow_events(events_path, poll_interval, idle_timeout, run_id):
+        if event.get("event") == "run_started":
+            # 切换到新的一次执行，之前的结果不再计入聚类
+            clusters = FailureClusters()
+            diagnostics = []
+            continue
+        if event.get("event") == "run_finished":
+            if event.get("report_path"):
+                history_store.ingest(event["report_path"], categories=_categories(diagnostics),
+                                     fingerprints=clusters.keys)
+            break
+        if event.get("event") != "test":
+            continue
+        add_failure(event, clusters)
+        diagnosis = diagnose_test(event, clusters, flakiness=flakiness)
         diagnostics.append(diagnosis)
-
-    return diagnostics
+        yield diagnosis
 
 
 def build_suggestion(category, flaky, regression):
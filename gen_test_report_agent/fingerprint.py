@@ -0,0 +1,155 @@
+import re
+import zlib
+import random
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+# MinHash 签名长度 = LSH_BANDS * LSH_ROWS；相似度阈值约为 (1 / bands) ** (1 / rows)
+LSH_BANDS = 16
+LSH_ROWS = 4
+# 同一 LSH 桶中的候选，签名估计的 Jaccard 相似度达到该值才归为一类
+SIMILARITY = 0.7
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+                 for _ in range(LSH_BANDS * LSH_ROWS)]
+
+# 只保留 traceback 中与根因相关的行：pytest 的 "E   " 错误行、"path:line: Error" 位置行、Python 的 File 行
+_RELEVANT_LINE_RE = re.compile(r'^\s*(E\s|File "|\S+:\d+:\s)')
+# 规范化规则，按顺序替换
+_NORMALIZE_RULES = [
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<uuid>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<time>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<hex>"),
+    # 路径只保留文件名
+    (re.compile(r"(?<![\w.\-])(?:[A-Za-z]:)?[\\/]?(?:[\w.\-]+[\\/])+([\w.\-]+)"), r"\1"),
+    # 生成的测试文件 / 函数名（test_<case_id>_<时间>）
+    (re.compile(r"\btest_[\w\-]+"), "test_*"),
+    # 引号中的值：selector、输入值、URL 等
+    (re.compile(r"\"[^\"\n]*\"|'[^'\n]*'"), "<str>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+    (re.compile(r"[ \t]+"), " "),
+]
+_TOKEN_RE = re.compile(r"<\w+>|\w+|[^\w\s]")
+
+
+def failure_text(test: Dict[str, Any]) -> str:
+    """用例失败信息：crash message + traceback（pytest-json-report 的 longrepr）"""
+    parts = []
+    for stage in ("setup", "call", "teardown"):
+        info = test.get(stage) or {}
+        if info.get("outcome", "failed") != "failed":
+            continue
+        crash = info.get("crash") or {}
+        parts.extend(str(v) for v in (crash.get("message"), crash.get("traceback"), info.get("longrepr")) if v)
+    return "\n".join(parts)
+
+
+def normalize(text: str) -> str:
+    """去掉与根因无关的变化部分：路径、行号、数字、十六进制地址、时间、生成的文件名、引号中的值"""
+    if not text:
+        return ""
+    lines = [line for line in text.splitlines() if _RELEVANT_LINE_RE.match(line)]
+    text = "\n".join(lines) if lines else text
+    for pattern, repl in _NORMALIZE_RULES:
+        text = pattern.sub(repl, text)
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def _digest(normalized: str) -> str:
+    return hashlib.md5(normalized.encode("utf-8")).hexdigest()[:8] if normalized else ""
+
+
+def fingerprint(text: str) -> str:
+    """规范化后的失败指纹，空文本返回空字符串"""
+    return _digest(normalize(text))
+
+
+def minhash(normalized: str) -> Optional[Tuple[int, ...]]:
+    """按 token 3-gram 计算 MinHash 签名，token 太少时返回 None（只按指纹精确匹配）"""
+    tokens = _TOKEN_RE.findall(normalized)
+    if len(tokens) < SHINGLE_SIZE:
+        return None
+    hashes = {zlib.crc32(" ".join(tokens[i:i + SHINGLE_SIZE]).encode("utf-8"))
+              for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def _similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class FailureClusters:
+    """
+        失败聚类：规范化后指纹相同的直接合并，不同指纹用 MinHash + LSH 找相似候选，并查集合并
+        可增量添加；聚类 id 取类中最早出现的指纹，合并后保持不变
+    """
+
+    def __init__(self, similarity: float = None):
+        self.similarity = SIMILARITY if similarity is None else similarity
+        self.parent: Dict[str, str] = {}
+        self.order: Dict[str, int] = {}
+        self.size: Dict[str, int] = {}
+        self.signatures: Dict[str, Tuple[int, ...]] = {}
+        self.buckets: List[Dict[Tuple[int, ...], List[str]]] = [{} for _ in range(LSH_BANDS)]
+        # 调用方的标识（如 nodeid）-> 指纹，避免重复规范化
+        self.keys: Dict[str, str] = {}
+
+    def _find(self, fp: str) -> str:
+        root = fp
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[fp] != root:
+            self.parent[fp], fp = root, self.parent[fp]
+        return root
+
+    def _union(self, a: str, b: str):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return
+        if self.order[root_b] < self.order[root_a]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size.pop(root_b)
+
+    def add(self, text: str, key: str = None) -> str:
+        """加入一条失败，返回其指纹（没有失败信息时返回空字符串）；key 用于之后按标识查询"""
+        normalized = normalize(text)
+        fp = _digest(normalized)
+        if key is not None:
+            self.keys[key] = fp
+        if not fp:
+            return ""
+        if fp in self.parent:
+            self.size[self._find(fp)] += 1
+            return fp
+        self.parent[fp] = fp
+        self.order[fp] = len(self.order)
+        self.size[fp] = 1
+        signature = minhash(normalized)
+        if signature is None:
+            return fp
+        self.signatures[fp] = signature
+        for band, bucket in enumerate(self.buckets):
+            key = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+            members = bucket.setdefault(key, [])
+            for other in members:
+                if self._find(other) != self._find(fp) and \
+                        _similarity(signature, self.signatures[other]) >= self.similarity:
+                    self._union(other, fp)
+            members.append(fp)
+        return fp
+
+    def cluster(self, fp: str) -> Tuple[str, int]:
+        """指纹所在的聚类：(cluster_id, 类中失败数)"""
+        if not fp or fp not in self.parent:
+            return "", 0
+        root = self._find(fp)
+        return f"C-{root}", self.size[root]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """所有聚类，按失败数从多到少"""
+        roots = sorted(self.size, key=lambda r: (-self.size[r], self.order[r]))
+        return [{"cluster_id": f"C-{root}", "size": self.size[root]} for root in roots]
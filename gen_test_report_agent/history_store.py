@@ -0,0 +1,267 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from run_test_code_agent.sharded_runner import file_key
+from gen_test_report_agent.report_stream import iter_report_tests
+from gen_test_report_agent.fingerprint import failure_text, fingerprint
+
+DEFAULT_HISTORY_PATH = "./output/history/test_history.sqlite3"
+# 计算通过率的滑动窗口（最近多少次执行）
+HISTORY_WINDOW = int(os.environ.get("TEST_HISTORY_WINDOW", 20))
+
+# 参与通过率计算的结果，skipped 不计入
+_COUNTED_OUTCOMES = ("passed", "failed", "error")
+_FAILED_OUTCOMES = ("failed", "error")
+_REPORT_NAME_RE = re.compile(r"report_(.+)_\d{14}\.json$")
+# 最近一次执行的结果，同一次执行有多条结果时失败优先
+_LAST_OUTCOME_SQL = (f"SELECT outcome FROM results WHERE test_key = ? AND run_id < ? "
+                     f"ORDER BY run_id DESC, outcome IN {_FAILED_OUTCOMES} DESC LIMIT 1")
+
+
+def history_key(nodeid: str) -> str:
+    """
+        用例的稳定标识：去掉目录和生成时间戳的文件名 + 测试函数（含参数），
+        重新生成代码（文件名带新的时间戳）后历史仍然连续
+    """
+    path, sep, name = nodeid.partition("::")
+    return file_key(path) + sep + name
+
+
+def crash_hash(test: Dict[str, Any]) -> str:
+    """规范化后的失败指纹（与诊断的聚类一致），通过的用例返回空字符串"""
+    if test.get("outcome") not in _FAILED_OUTCOMES:
+        return ""
+    return fingerprint(failure_text(test))
+
+
+def _duration(test: Dict[str, Any]) -> float:
+    return sum((test.get(stage) or {}).get("duration", 0.0) for stage in ("setup", "call", "teardown"))
+
+
+class HistoryStore:
+    """
+        测试执行历史（SQLite + WAL）
+        - runs: 每份 pytest JSON 报告一条，run_id 自增即执行顺序
+        - results: 每条用例每次执行一条，主键 (nodeid, run_id)；test_key 为用例的稳定标识，
+          按用例查询历史都按 test_key 做索引范围扫描，同一次执行中同一 test_key 有多条结果（新旧代码文件都在）时
+          只要有一条失败即视为该次执行失败
+    """
+
+    def __init__(self, path: str = None, window: int = None):
+        self.path = path or os.environ.get("TEST_HISTORY_PATH", DEFAULT_HISTORY_PATH)
+        self.window = window or HISTORY_WINDOW
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    report_path TEXT UNIQUE,
+                    feature_id TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    nodeid TEXT NOT NULL,
+                    run_id INTEGER NOT NULL,
+                    outcome TEXT NOT NULL,
+                    duration REAL NOT NULL,
+                    crash_hash TEXT NOT NULL DEFAULT '',
+                    category TEXT,
+                    test_key TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (nodeid, run_id)
+                ) WITHOUT ROWID
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            if "test_key" not in columns:
+                # 旧版本按 nodeid 建的库：补上 test_key 列并回填
+                conn.execute("ALTER TABLE results ADD COLUMN test_key TEXT NOT NULL DEFAULT ''")
+                nodeids = [row[0] for row in conn.execute("SELECT DISTINCT nodeid FROM results")]
+                conn.executemany("UPDATE results SET test_key = ? WHERE nodeid = ?",
+                                 ((history_key(nodeid), nodeid) for nodeid in nodeids))
+                conn.execute("DROP INDEX IF EXISTS idx_results_outcome")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_key ON results(test_key, run_id)")
+            # 查找最近一次通过/失败的执行
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_results_key_outcome ON results(test_key, outcome, run_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def run_id(self, report_path: str) -> Optional[int]:
+        """报告已入库时返回其 run_id"""
+        with self._lock:
+            row = self._connect().execute("SELECT run_id FROM runs WHERE report_path = ?",
+                                          (os.path.abspath(report_path),)).fetchone()
+        return row[0] if row else None
+
+    def ingest(self, report_path: str, feature_id: str = None,
+               categories: Dict[str, str] = None, fingerprints: Dict[str, str] = None) -> int:
+        """
+            导入一份 pytest JSON 报告，返回 run_id；同一份报告重复导入时直接返回已有 run_id
+            categories / fingerprints 为诊断得到的 {nodeid: 失败分类} / {nodeid: 失败指纹}
+        """
+        existing = self.run_id(report_path)
+        if existing is not None:
+            return existing
+        if feature_id is None:
+            match = _REPORT_NAME_RE.search(os.path.basename(report_path))
+            feature_id = match.group(1) if match else None
+        return self.ingest_tests(iter_report_tests(report_path), report_path, feature_id,
+                                 os.path.getmtime(report_path), categories, fingerprints)
+
+    def ingest_tests(self, tests: Iterable[Dict[str, Any]], report_path: str = None,
+                     feature_id: str = None, created_at: float = None,
+                     categories: Dict[str, str] = None, fingerprints: Dict[str, str] = None) -> int:
+        """写入一次执行的全部用例结果（tests 可以是生成器，边读边写），返回 run_id"""
+        categories = categories or {}
+        fingerprints = fingerprints or {}
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO runs(report_path, feature_id, created_at) VALUES (?, ?, ?)",
+                    (os.path.abspath(report_path) if report_path else None, feature_id,
+                     created_at or time.time()))
+                run_id = cursor.lastrowid
+                conn.executemany(
+                    "INSERT OR REPLACE INTO results(nodeid, run_id, outcome, duration, crash_hash, category, test_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((t["nodeid"], run_id, t.get("outcome", ""), _duration(t),
+                      fingerprints[t["nodeid"]] if t["nodeid"] in fingerprints else crash_hash(t),
+                      categories.get(t["nodeid"]), history_key(t["nodeid"])) for t in tests))
+        return run_id
+
+    def _failed_runs(self, nodeid: str, window: int = None, before_run: int = None) -> List[bool]:
+        """最近 window 次执行（不含 skipped）是否失败，从新到旧"""
+        with self._lock:
+            rows = self._connect().execute(f"""
+                SELECT MAX(outcome IN {_FAILED_OUTCOMES}) FROM results
+                WHERE test_key = ? AND run_id < ? AND outcome IN {_COUNTED_OUTCOMES}
+                GROUP BY run_id ORDER BY run_id DESC LIMIT ?
+            """, (history_key(nodeid), before_run or 2 ** 62, window or self.window)).fetchall()
+        return [bool(row[0]) for row in rows]
+
+    def pass_rate(self, nodeid: str, window: int = None, before_run: int = None) -> Optional[float]:
+        """最近 window 次执行（不含 skipped）的通过率，没有历史时返回 None"""
+        failed = self._failed_runs(nodeid, window, before_run)
+        return failed.count(False) / len(failed) if failed else None
+
+    def flip_rate(self, nodeid: str, window: int = None, before_run: int = None) -> Optional[Tuple[float, int]]:
+        """
+            最近 window 次执行（不含 skipped）中相邻两次结果翻转（通过 <-> 失败）的比例和执行次数，
+            不足 2 次时返回 None
+        """
+        failed = self._failed_runs(nodeid, window, before_run)
+        if len(failed) < 2:
+            return None
+        return sum(a != b for a, b in zip(failed, failed[1:])) / (len(failed) - 1), len(failed)
+
+    def last_outcome(self, nodeid: str, before_run: int = None) -> Optional[str]:
+        """最近一次执行的结果"""
+        with self._lock:
+            row = self._connect().execute(_LAST_OUTCOME_SQL, (history_key(nodeid), before_run or 2 ** 62)).fetchone()
+        return row[0] if row else None
+
+    def first_failing_run(self, nodeid: str, before_run: int = None) -> Optional[Dict[str, Any]]:
+        """
+            当前连续失败从哪次执行开始：最后一次通过之后的第一次失败
+            最近一次执行不是失败时返回 None
+        """
+        key = history_key(nodeid)
+        upper = before_run or 2 ** 62
+        with self._lock:
+            conn = self._connect()
+            last = conn.execute(_LAST_OUTCOME_SQL, (key, upper)).fetchone()
+            if not last or last[0] not in _FAILED_OUTCOMES:
+                return None
+            # 最后一次通过：该次执行的结果里没有失败
+            passed = conn.execute(f"""
+                SELECT run_id FROM results WHERE test_key = ? AND run_id < ?
+                GROUP BY run_id HAVING MAX(outcome = 'passed') AND NOT MAX(outcome IN {_FAILED_OUTCOMES})
+                ORDER BY run_id DESC LIMIT 1
+            """, (key, upper)).fetchone()
+            row = conn.execute(f"""
+                SELECT r.run_id, r.report_path, r.feature_id, r.created_at FROM results t
+                JOIN runs r ON r.run_id = t.run_id
+                WHERE t.test_key = ? AND t.run_id > ? AND t.run_id < ? AND t.outcome IN {_FAILED_OUTCOMES}
+                ORDER BY t.run_id LIMIT 1
+            """, (key, passed[0] if passed else 0, upper)).fetchone()
+        if row is None:
+            return None
+        return {"run_id": row[0], "report_path": row[1], "feature_id": row[2], "created_at": row[3]}
+
+    def history(self, nodeid: str, before_run: int = None) -> Dict[str, Any]:
+        """诊断使用的历史信息：pass_rate / flip_rate / runs / last_outcome / first_failing_run"""
+        flip_rate, runs = self.flip_rate(nodeid, before_run=before_run) or (None, 0)
+        return {"pass_rate": self.pass_rate(nodeid, before_run=before_run),
+                "flip_rate": flip_rate, "runs": runs,
+                "last_outcome": self.last_outcome(nodeid, before_run),
+                "first_failing_run": self.first_failing_run(nodeid, before_run)}
+
+    def results(self, nodeid: str = None, limit: int = None) -> List[Dict[str, Any]]:
+        """按执行顺序返回历史结果（nodeid 为空时返回全部用例，否则返回同一 test_key 的结果）"""
+        sql = ("SELECT t.run_id, t.nodeid, t.test_key, t.outcome, t.duration, t.crash_hash, t.category, "
+               "r.created_at FROM results t JOIN runs r ON r.run_id = t.run_id")
+        params = []
+        if nodeid is not None:
+            sql += " WHERE t.test_key = ?"
+            params.append(history_key(nodeid))
+        sql += " ORDER BY t.run_id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        keys = ("run_id", "nodeid", "test_key", "outcome", "duration", "crash_hash", "category", "created_at")
+        return [dict(zip(keys, row)) for row in reversed(rows)]
+
+    def recent_runs(self, limit: int, feature_id: str = None) -> List[int]:
+        """最近 limit 次执行的 run_id（从旧到新），feature_id 不为空时只取该 feature 的执行"""
+        sql = "SELECT run_id FROM runs"
+        params = []
+        if feature_id is not None:
+            sql += " WHERE feature_id = ?"
+            params.append(feature_id)
+        sql += " ORDER BY run_id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def result_batches(self, run_ids: List[int],
+                       batch_size: int = 100000) -> Iterator[List[Tuple[str, int, str, float, Optional[str]]]]:
+        """
+            分批读取指定执行的结果 (test_key, run_id, outcome, duration, category)，不保证顺序
+            使用独立的只读连接（WAL 下不阻塞写入）
+        """
+        self._connect()
+        conn = sqlite3.connect(self.path)
+        try:
+            for start in range(0, len(run_ids), 500):
+                chunk = run_ids[start:start + 500]
+                cursor = conn.execute(
+                    "SELECT test_key, run_id, outcome, duration, category FROM results "
+                    f"WHERE run_id IN ({','.join('?' * len(chunk))})", chunk)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+        finally:
+            conn.close()
+
+
+history_store = HistoryStore()
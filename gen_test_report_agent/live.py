@@ -0,0 +1,45 @@
+"""
+边执行边诊断：先生成 run_id 和事件文件，再在后台线程中执行 run_sharded，
+当前线程同时按同一个 run_id 消费事件并逐条诊断，不必等合并报告写出
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from gen_test_report_agent.diagnose import diagnose_events
+from run_test_code_agent.event_plugin import append_event
+from run_test_code_agent.selection import select_tests, record_baseline
+from run_test_code_agent.sharded_runner import new_run, run_sharded
+
+
+def run_and_diagnose(files: List[str], feature_id: str, selection: str = None,
+                     flakiness: Dict[str, tuple] = None, idle_timeout: float = None,
+                     on_diagnosis: Callable[[Dict[str, Any]], None] = None
+                     ) -> Tuple[Optional[str], str, List[Dict[str, Any]]]:
+    """
+        按选择模式筛选并执行测试文件，执行的同时诊断每条用例的结果（on_diagnosis 逐条回调）
+        返回 (合并报告路径, run_id, 诊断结果)，没有执行任何用例时报告路径为 None
+    """
+    files, first = select_tests(files, feature_id, selection)
+    run_id, events_path = new_run(feature_id)
+
+    def _run() -> Optional[str]:
+        try:
+            return run_sharded(files, feature_id, first=first, events_path=events_path, run_id=run_id)
+        except Exception:
+            # 执行器在写出 run_finished 之前失败时补写一条，诊断不必等到 idle_timeout
+            append_event(events_path, {"event": "run_finished", "time": time.time(), "run_id": run_id,
+                                       "report_path": None})
+            raise
+
+    diagnostics = []
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(_run)
+        for item in diagnose_events(events_path, idle_timeout=idle_timeout, run_id=run_id, flakiness=flakiness):
+            if on_diagnosis:
+                on_diagnosis(item)
+            diagnostics.append(item)
+        report_path = future.result()
+    if report_path:
+        record_baseline(feature_id, files, report_path)
+    return report_path, run_id, diagnostics
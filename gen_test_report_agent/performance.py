@@ -0,0 +1,183 @@
+import os
+import heapq
+from typing import Any, Dict, List, Optional
+
+from gen_test_report_agent.report_stream import iter_report_tests
+from run_test_code_agent.case_meta import load_meta
+from run_test_code_agent.sharded_runner import RUNNER_TEST_TIMEOUT
+
+# 每个列表最多保留的条目数
+PERF_TOP_N = int(os.environ.get("PERF_TOP_N", 10))
+# setup 占单条用例耗时的比例达到该值视为 setup 主导（通常是启动浏览器 / 登录的开销）
+SETUP_DOMINATED_RATIO = 0.5
+# 耗时低于该值（秒）的用例不参与 setup 主导判断
+MIN_DURATION = 1.0
+# call 耗时达到单条用例超时的该比例时视为接近超时
+NEAR_TIMEOUT_RATIO = 0.8
+
+_STAGES = ("setup", "call", "teardown")
+
+
+def _stage_durations(test: Dict[str, Any]) -> Dict[str, float]:
+    return {stage: float((test.get(stage) or {}).get("duration") or 0.0) for stage in _STAGES}
+
+
+def _crash_message(test: Dict[str, Any]) -> str:
+    for stage in _STAGES:
+        crash = (test.get(stage) or {}).get("crash") or {}
+        if crash.get("message"):
+            return crash["message"]
+    return ""
+
+
+def _is_timeout(test: Dict[str, Any]) -> bool:
+    return test.get("outcome") in ("failed", "error") and "timeout" in _crash_message(test).lower()
+
+
+class _TopN:
+    """只保留 key 最大的 n 条（小顶堆），内存与报告大小无关"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.heap = []
+        self.seq = 0
+
+    def push(self, key: float, item: Dict[str, Any]):
+        self.seq += 1
+        entry = (key, -self.seq, item)
+        if len(self.heap) < self.n:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def items(self) -> List[Dict[str, Any]]:
+        return [item for _, _, item in sorted(self.heap, reverse=True)]
+
+
+def _meta_for(nodeid: str, cache: Dict[str, Dict[str, Any]], root: str = None) -> Dict[str, Any]:
+    """按 nodeid 中的文件路径读取生成代码旁的 .meta.json（相对 root 或当前目录）"""
+    path = nodeid.split("::")[0]
+    if path not in cache:
+        candidates = [os.path.join(root, path)] if root else []
+        candidates += [path, os.path.join("./output/codes", os.path.basename(path))]
+        cache[path] = next((meta for meta in map(load_meta, candidates) if meta), {})
+    return cache[path]
+
+
+def _group(groups: Dict[str, Dict[str, Any]], key: str, durations: Dict[str, float]):
+    group = groups.setdefault(key, {"tests": 0, "total": 0.0, **{stage: 0.0 for stage in _STAGES}})
+    group["tests"] += 1
+    group["total"] += sum(durations.values())
+    for stage in _STAGES:
+        group[stage] += durations[stage]
+
+
+def _rounded_groups(groups: Dict[str, Dict[str, Any]], wall: float) -> List[Dict[str, Any]]:
+    rows = []
+    for name, group in groups.items():
+        row = {"name": name, "tests": group["tests"],
+               **{key: round(group[key], 2) for key in ("total", *_STAGES)},
+               "share": round(group["total"] / wall, 3) if wall else 0.0}
+        rows.append(row)
+    return sorted(rows, key=lambda r: -r["total"])
+
+
+def analyze_report(report_path: str, root: str = None, top_n: int = None) -> Dict[str, Any]:
+    """
+        流式读取 pytest JSON 报告，统计执行耗时分布：
+        - slowest: 总耗时最长的用例
+        - setup_dominated: setup 占比高的用例（浏览器启动 / 登录开销）
+        - by_page / by_feature: 按用例元数据中的页面、feature 汇总 setup / call / teardown 耗时
+        - timeouts / near_timeout: 超时失败、接近单条用例超时的用例
+        与历史相比的耗时回归由 analytics 的 duration_regressions 给出，见 render_section
+    """
+    top_n = top_n or PERF_TOP_N
+    slowest, setup_heavy = _TopN(top_n), _TopN(top_n)
+    timeouts, near_timeout = _TopN(top_n), _TopN(top_n)
+    by_page, by_feature = {}, {}
+    meta_cache = {}
+    totals = {"tests": 0, "total": 0.0, **{stage: 0.0 for stage in _STAGES}}
+    counts = {"setup_dominated": 0, "timeouts": 0, "near_timeout": 0}
+
+    for test in iter_report_tests(report_path):
+        nodeid = test.get("nodeid", "")
+        durations = _stage_durations(test)
+        total = sum(durations.values())
+        totals["tests"] += 1
+        totals["total"] += total
+        for stage in _STAGES:
+            totals[stage] += durations[stage]
+        row = {"nodeid": nodeid, "outcome": test.get("outcome"), "total": round(total, 2),
+               **{stage: round(durations[stage], 2) for stage in _STAGES}}
+        slowest.push(total, row)
+
+        if total >= MIN_DURATION and durations["setup"] / total >= SETUP_DOMINATED_RATIO:
+            counts["setup_dominated"] += 1
+            setup_heavy.push(durations["setup"], {**row, "setup_ratio": round(durations["setup"] / total, 3)})
+
+        meta = _meta_for(nodeid, meta_cache, root)
+        _group(by_page, meta.get("page") or meta.get("url") or "(unknown)", durations)
+        _group(by_feature, meta.get("feature_id") or "(unknown)", durations)
+
+        if _is_timeout(test):
+            counts["timeouts"] += 1
+            timeouts.push(total, {**row, "message": _crash_message(test)[:200]})
+        elif RUNNER_TEST_TIMEOUT and durations["call"] >= RUNNER_TEST_TIMEOUT * NEAR_TIMEOUT_RATIO:
+            counts["near_timeout"] += 1
+            near_timeout.push(durations["call"], row)
+
+    wall = totals["total"]
+    return {
+        "tests": totals["tests"],
+        "total": round(wall, 2),
+        **{stage: round(totals[stage], 2) for stage in _STAGES},
+        "setup_share": round(totals["setup"] / wall, 3) if wall else 0.0,
+        "counts": counts,
+        "slowest": slowest.items(),
+        "setup_dominated": setup_heavy.items(),
+        "by_page": _rounded_groups(by_page, wall),
+        "by_feature": _rounded_groups(by_feature, wall),
+        "timeouts": timeouts.items(),
+        "near_timeout": near_timeout.items(),
+    }
+
+
+def render_section(perf: Optional[Dict[str, Any]], analytics: Dict[str, Any] = None) -> str:
+    """报告中的性能章节（Markdown），耗时回归取自 analytics.summarize 的结果"""
+    if not perf or not perf.get("tests"):
+        return "## 执行耗时\n\n没有可统计的用例"
+    analytics = analytics or {}
+    lines = ["## 执行耗时", "",
+             f"- 用例数: {perf['tests']}，总耗时: {perf['total']}s"
+             f"（setup {perf['setup']}s / call {perf['call']}s / teardown {perf['teardown']}s，"
+             f"setup 占比 {perf['setup_share']:.0%}）",
+             f"- setup 主导: {perf['counts']['setup_dominated']}，"
+             f"耗时回归: {analytics.get('duration_regression_count', 0)}，"
+             f"超时: {perf['counts']['timeouts']}，接近超时: {perf['counts']['near_timeout']}"]
+
+    def table(title: str, header: List[str], rows: List[List[Any]]):
+        if not rows:
+            return
+        lines.extend(["", f"### {title}", "", "| " + " | ".join(header) + " |",
+                      "|" + "---|" * len(header)])
+        lines.extend("| " + " | ".join(str(v).replace("|", "\\|") for v in row) + " |" for row in rows)
+
+    table("最慢的用例", ["用例", "结果", "总耗时", "setup", "call", "teardown"],
+          [[r["nodeid"], r["outcome"], r["total"], r["setup"], r["call"], r["teardown"]]
+           for r in perf["slowest"]])
+    table("setup 主导的用例", ["用例", "setup", "占比"],
+          [[r["nodeid"], r["setup"], f"{r['setup_ratio']:.0%}"] for r in perf["setup_dominated"]])
+    table("按页面", ["页面", "用例数", "总耗时", "setup", "call", "占比"],
+          [[r["name"], r["tests"], r["total"], r["setup"], r["call"], f"{r['share']:.0%}"]
+           for r in perf["by_page"][:PERF_TOP_N]])
+    table("按 feature", ["feature", "用例数", "总耗时", "setup", "call", "占比"],
+          [[r["name"], r["tests"], r["total"], r["setup"], r["call"], f"{r['share']:.0%}"]
+           for r in perf["by_feature"][:PERF_TOP_N]])
+    table("耗时回归", ["用例", "当前", "历史均值", "z"],
+          [[r["test_key"], r["duration"], r["baseline"], r["z"]]
+           for r in analytics.get("duration_regressions", [])])
+    table("超时", ["用例", "耗时", "错误"],
+          [[r["nodeid"], r["total"], r["message"].splitlines()[0] if r["message"] else ""]
+           for r in perf["timeouts"]])
+    table("接近超时", ["用例", "call 耗时"], [[r["nodeid"], r["call"]] for r in perf["near_timeout"]])
+    return "\n".join(lines)
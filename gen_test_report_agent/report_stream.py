@@ -0,0 +1,136 @@
+import re
+import json
+from json.decoder import scanstring
+from typing import Any, Dict, Iterator
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# 每次读取的字符数；单条用例的 JSON 超过缓冲区时按倍数加大读取量
+CHUNK_SIZE = 1 << 20
+
+_TOKEN_RE = re.compile(r'["{}\[\],]')
+_WS_RE = re.compile(r"\s*")
+
+
+class _Reader:
+    """按块读取文件的滑动缓冲区，已处理的内容在下次读取时丢弃"""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self, factor: int = 1):
+        if self.eof:
+            raise ValueError("pytest JSON 报告不完整")
+        data = self.f.read(self.chunk_size * factor)
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def skip_ws(self) -> bool:
+        """跳过空白，缓冲区中还有字符时返回 True"""
+        self.pos = _WS_RE.match(self.buf, self.pos).end()
+        return self.pos < len(self.buf)
+
+
+def _array_items(reader: _Reader) -> Iterator[Any]:
+    """逐个解析数组元素（reader.pos 位于 '[' 之后）"""
+    decoder = json.JSONDecoder()
+    while True:
+        while not reader.skip_ws() or reader.buf[reader.pos] == ",":
+            if reader.pos < len(reader.buf):
+                reader.pos += 1
+            else:
+                reader.more()
+        if reader.buf[reader.pos] == "]":
+            reader.pos += 1
+            return
+        attempts = 1
+        while True:
+            try:
+                item, end = decoder.raw_decode(reader.buf, reader.pos)
+                # 元素后面必须是 ',' 或 ']'，否则可能是缓冲区末尾被截断的数字（如 "2.5" 只读到 "2."）
+                follow = _WS_RE.match(reader.buf, end).end()
+                if follow < len(reader.buf) and reader.buf[follow] in ",]":
+                    break
+                if reader.eof:
+                    raise ValueError("pytest JSON 报告不完整")
+            except json.JSONDecodeError:
+                if reader.eof:
+                    raise
+            reader.more(attempts)
+            attempts *= 2
+        reader.pos = end
+        yield item
+
+
+def _scan_items(f, key: str, chunk_size: int) -> Iterator[Any]:
+    """不依赖 ijson 的实现：扫描顶层对象找到 key 对应的数组，再逐个 raw_decode 元素"""
+    reader = _Reader(f, chunk_size)
+    depth = 0
+    expect_key = False
+    while True:
+        match = _TOKEN_RE.search(reader.buf, reader.pos)
+        if match is None:
+            reader.pos = len(reader.buf)
+            if reader.eof:
+                return
+            reader.more()
+            continue
+        reader.pos = start = match.start()
+        token = match.group()
+        if token == '"':
+            try:
+                text, end = scanstring(reader.buf, start + 1)
+            except json.JSONDecodeError:
+                reader.more()
+                continue
+            if depth == 1 and expect_key:
+                # 顶层的键：确认后面是 ':' 和值的第一个字符，缓冲区不够时从键开始重新扫描
+                reader.pos = end
+                if not reader.skip_ws() or reader.buf[reader.pos] != ":":
+                    if reader.pos >= len(reader.buf):
+                        reader.pos = start
+                        reader.more()
+                    continue
+                reader.pos += 1
+                if not reader.skip_ws():
+                    reader.pos = start
+                    reader.more()
+                    continue
+                expect_key = False
+                if text == key and reader.buf[reader.pos] == "[":
+                    reader.pos += 1
+                    yield from _array_items(reader)
+                    return
+                continue
+            reader.pos = end
+            continue
+        if token in "{[":
+            depth += 1
+            expect_key = token == "{" and depth == 1
+        elif token in "}]":
+            depth -= 1
+        else:
+            expect_key = depth == 1
+        reader.pos = start + 1
+
+
+def iter_report_tests(report_path: str, chunk_size: int = None) -> Iterator[Dict[str, Any]]:
+    """
+        流式读取 pytest JSON 报告的 tests 数组，逐条返回用例，内存占用只与单条用例大小有关
+        安装了 ijson 时使用 ijson，否则使用基于 json.raw_decode 的增量解析
+    """
+    if ijson is not None:
+        with open(report_path, "rb") as f:
+            yield from ijson.items(f, "tests.item", use_float=True)
+        return
+    with open(report_path, "r", encoding="utf-8") as f:
+        yield from _scan_items(f, "tests", chunk_size or CHUNK_SIZE)
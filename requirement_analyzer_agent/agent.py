@@ -1,14 +1,23 @@
 
 from datetime import datetime
+import re
 import json
 from typing import Annotated, Dict, Optional, TypedDict, List, Any
 from langgraph.graph import StateGraph, END, START
+from langgraph.types import Send
 from langchain_core.output_parsers import JsonOutputParser
 import requirement_analyzer_agent.schemas as schema
 from requirement_analyzer_agent.prompts import ExtractFeaturePrompt, CommonUserPrompt, \
-    ExtractApiPrompt, ExtractFlowPrompt, ExtractRulePrompt
+    FillApiInfoPrompt, ExtractFlowPrompt, ExtractRulePrompt, ExtractCombinedPrompt
+from requirement_analyzer_agent.api_parser import parse_apis
 from utils.llm_client import llm_client
+from requirement_analyzer_agent.chunker import plan_reuse, split_markdown
 from utils.tools import append_reducer, make_id
+from utils.trm import load_latest_trm
+
+# 抽取模式：split 为 feature/api/flow/rule 四次并行调用，combined 为一次调用抽取全部信息
+MODE_SPLIT = "split"
+MODE_COMBINED = "combined"
 
 
 class DocParserState(TypedDict):
@@ -17,119 +26,425 @@ class DocParserState(TypedDict):
     """
     feature_id: str
     fragment: str
-    ext_features: Dict[str, str]
+    ext_features: Annotated[List[Any], append_reducer]
     ext_apis: Annotated[List[Any], append_reducer]
     ext_flows: Annotated[List[Any], append_reducer]
     ext_rules: Annotated[List[Any], append_reducer]
     ext_exceptions: Annotated[List[Any], append_reducer]
+    chunks: List[Dict[str, Any]]
+    previous_trm: Optional[Dict[str, Any]]
     trm_result: Optional[Dict[str, Any]]
 
 
-def extract_feature_node(state: DocParserState):
-    """提取feature信息节点"""
-    user_input = state["fragment"]
-    parser = JsonOutputParser(pydantic_object=schema.FeatureSchema)
-    resp = llm_client.run_prompt(system_prompt=ExtractFeaturePrompt.system_prompt,
-                                 user_prompt=CommonUserPrompt.prompt,
-                                 input={"fragment": user_input},
-                                 parser=parser)
-    result = resp
+def _to_result(resp):
+    """LLM 返回值转为 python 对象"""
     if isinstance(resp, str):
-        result = json.loads(resp)
+        return json.loads(resp)
+    return resp
 
-    return {"ext_features": result}
 
+def _tag(items, state: DocParserState) -> List[Dict[str, Any]]:
+    """给抽取结果打上来源章节及章节内容哈希"""
+    if isinstance(items, dict):
+        items = [items]
+    source = {"source_section": state.get("section", ""),
+              "section_hash": state.get("section_hash", "")}
+    tagged = []
+    for item in items or []:
+        if not isinstance(item, dict):
+            item = {"text": item}
+        tagged.append({**item, **source})
+    return tagged
 
-def extract_api_node(state: DocParserState) -> DocParserState:
-    """提取api信息节点"""
-    user_input = state["fragment"]
-    parser = JsonOutputParser(pydantic_object=schema.ApiSchema)
-    resp = llm_client.run_prompt(system_prompt=ExtractApiPrompt.system_prompt,
+
+def _source(item: Dict[str, Any]) -> Dict[str, str]:
+    return {"source_section": item.get("source_section", ""),
+            "section_hash": item.get("section_hash", "")}
+
+
+def _extract(system_prompt: str, schema_cls, fragment: str):
+    """调用 LLM 抽取信息"""
+    parser = JsonOutputParser(pydantic_object=schema_cls)
+    resp = llm_client.run_prompt(system_prompt=system_prompt,
                                  user_prompt=CommonUserPrompt.prompt,
-                                 input={"fragment": user_input},
+                                 input={"fragment": fragment},
                                  parser=parser)
-    result = resp
-    if isinstance(resp, str):
-        result = json.loads(resp)
-    return {"requiremext_apisents": result}
+    return _to_result(resp)
+
+
+async def _aextract(system_prompt: str, schema_cls, fragment: str):
+    """调用 LLM 抽取信息（异步）"""
+    parser = JsonOutputParser(pydantic_object=schema_cls)
+    resp = await llm_client.arun_prompt(system_prompt=system_prompt,
+                                        user_prompt=CommonUserPrompt.prompt,
+                                        input={"fragment": fragment},
+                                        parser=parser)
+    return _to_result(resp)
+
+
+def extract_feature_node(state: DocParserState):
+    """提取feature信息节点"""
+    result = _extract(ExtractFeaturePrompt.system_prompt,
+                      schema.FeatureSchema, state["fragment"])
+    return {"ext_features": _tag(result, state)}
+
+
+async def aextract_feature_node(state: DocParserState):
+    """提取feature信息节点（异步）"""
+    result = await _aextract(ExtractFeaturePrompt.system_prompt,
+                             schema.FeatureSchema, state["fragment"])
+    return {"ext_features": _tag(result, state)}
+
+
+def _fill_input(apis: List[Dict[str, Any]], fragment: str) -> Dict[str, str]:
+    skeleton = [{"method": a["method"], "url": a["url"]} for a in apis]
+    return {"apis": json.dumps(skeleton, ensure_ascii=False), "fragment": fragment}
+
+
+def _merge_api_info(apis: List[Dict[str, Any]], infos) -> List[Dict[str, Any]]:
+    """用 LLM 补全的名称和说明填充规则解析结果中缺失的字段"""
+    if isinstance(infos, dict):
+        infos = [infos]
+    by_key = {((i.get("method") or "").upper(), i.get("url")): i for i in infos or []}
+    for api in apis:
+        info = by_key.get((api["method"], api["url"]), {})
+        api["name"] = api["name"] or info.get("name", "")
+        api["description"] = api["description"] or info.get("description", "")
+    return apis
+
+
+def extract_api_node(state: DocParserState) -> DocParserState:
+    """
+        提取api信息节点
+        先用规则解析 API、参数表和响应示例，只有名称或说明缺失时才调用 LLM 补全
+    """
+    apis, complete = parse_apis(state["fragment"])
+    if apis and not complete:
+        parser = JsonOutputParser(pydantic_object=schema.ApiInfoSchema)
+        resp = llm_client.run_prompt(system_prompt=FillApiInfoPrompt.system_prompt,
+                                     user_prompt=FillApiInfoPrompt.user_prompt,
+                                     input=_fill_input(apis, state["fragment"]),
+                                     parser=parser)
+        _merge_api_info(apis, _to_result(resp))
+    return {"ext_apis": _tag(apis, state)}
+
+
+async def aextract_api_node(state: DocParserState) -> DocParserState:
+    """提取api信息节点（异步）"""
+    apis, complete = parse_apis(state["fragment"])
+    if apis and not complete:
+        parser = JsonOutputParser(pydantic_object=schema.ApiInfoSchema)
+        resp = await llm_client.arun_prompt(system_prompt=FillApiInfoPrompt.system_prompt,
+                                            user_prompt=FillApiInfoPrompt.user_prompt,
+                                            input=_fill_input(apis, state["fragment"]),
+                                            parser=parser)
+        _merge_api_info(apis, _to_result(resp))
+    return {"ext_apis": _tag(apis, state)}
 
 
 def extract_flow_node(state: DocParserState) -> DocParserState:
     """提取flow信息节点"""
-    user_input = state["fragment"]
-    parser = JsonOutputParser(pydantic_object=schema.FlowSchema)
-    resp = llm_client.run_prompt(system_prompt=ExtractFlowPrompt.system_prompt,
-                                 user_prompt=CommonUserPrompt.prompt,
-                                 input={"fragment": user_input},
-                                 parser=parser)
+    result = _extract(ExtractFlowPrompt.system_prompt,
+                      schema.FlowSchema, state["fragment"])
+    return {"ext_flows": _tag(result, state)}
 
-    result = resp
-    if isinstance(resp, str):
-        result = json.loads(resp)
-    return {"ext_flows": result}
+
+async def aextract_flow_node(state: DocParserState) -> DocParserState:
+    """提取flow信息节点（异步）"""
+    result = await _aextract(ExtractFlowPrompt.system_prompt,
+                             schema.FlowSchema, state["fragment"])
+    return {"ext_flows": _tag(result, state)}
 
 
 def extract_rule_node(state: DocParserState) -> DocParserState:
     """提取rule信息节点"""
-    user_input = state["fragment"]
-    parser = JsonOutputParser(pydantic_object=schema.RuleSchema)
-    resp = llm_client.run_prompt(system_prompt=ExtractRulePrompt.system_prompt,
-                                 user_prompt=CommonUserPrompt.prompt,
-                                 input={"fragment": user_input},
-                                 parser=parser)
+    result = _extract(ExtractRulePrompt.system_prompt,
+                      schema.RuleSchema, state["fragment"])
+    return {"ext_rules": _tag(result, state)}
 
-    result = resp
-    if isinstance(resp, str):
-        result = json.loads(resp)
 
-    return {"ext_rules": result}
+async def aextract_rule_node(state: DocParserState) -> DocParserState:
+    """提取rule信息节点（异步）"""
+    result = await _aextract(ExtractRulePrompt.system_prompt,
+                             schema.RuleSchema, state["fragment"])
+    return {"ext_rules": _tag(result, state)}
 
 
 def extract_exception_node(state: DocParserState) -> DocParserState:
     """提取exception信息节点"""
-    return {"requiremeext_exceptionsnts": []}
+    return {"ext_exceptions": []}
+
+
+async def aextract_exception_node(state: DocParserState) -> DocParserState:
+    """提取exception信息节点（异步）"""
+    return extract_exception_node(state)
+
+
+def _feature_exceptions(features, exceptions) -> tuple:
+    """
+        合并抽取返回的顶层 exceptions 按 feature 归入各 feature 的 exceptions，
+        与 split 模式的 feature 抽取结果一致，之后同样由 _collect_exceptions 归属、去重并沿用 id
+        文本中出现 feature 名称的归入该 feature（名称长的优先），否则归入本章节的第一个 feature；
+        没有 feature 时原样返回
+    """
+    if isinstance(features, dict):
+        features = [features]
+    features = [dict(f) for f in features or [] if isinstance(f, dict)]
+    if not features:
+        return features, exceptions or []
+    by_name = sorted(((_norm_text(f.get("feature") or f.get("name")), f) for f in features),
+                     key=lambda pair: -len(pair[0]))
+    for e in exceptions or []:
+        text = e.get("text") if isinstance(e, dict) else e
+        norm = _norm_text(text)
+        if not norm:
+            continue
+        target = next((f for name, f in by_name if name and name in norm), features[0])
+        target_exceptions = list(target.get("exceptions") or [])
+        if text not in target_exceptions:
+            target_exceptions.append(text)
+        target["exceptions"] = target_exceptions
+    return features, []
+
+
+def _split_combined(result: Dict[str, Any], state: DocParserState) -> DocParserState:
+    """
+        将合并抽取的结果拆分成各个 ext_* 字段
+        规则解析出的 API 排在前面，collect 去重时以其为准，LLM 结果只用于补全缺失字段
+        顶层 exceptions 归入所属 feature，与 split 模式走同样的合并流程
+    """
+    parsed_apis, _ = parse_apis(state["fragment"])
+    features, exceptions = _feature_exceptions(result.get("features", []), result.get("exceptions"))
+    return {
+        "ext_features": _tag(features, state),
+        "ext_apis": _tag(parsed_apis + (result.get("apis") or []), state),
+        "ext_flows": _tag(result.get("flows", []), state),
+        "ext_rules": _tag(result.get("rules", []), state),
+        "ext_exceptions": _tag(exceptions, state),
+    }
+
+
+def extract_combined_node(state: DocParserState) -> DocParserState:
+    """一次调用提取feature, api, flow, rule, exception信息节点"""
+    result = _extract(ExtractCombinedPrompt.system_prompt,
+                      schema.TrmSchema, state["fragment"])
+    return _split_combined(result, state)
+
+
+async def aextract_combined_node(state: DocParserState) -> DocParserState:
+    """一次调用提取feature, api, flow, rule, exception信息节点（异步）"""
+    result = await _aextract(ExtractCombinedPrompt.system_prompt,
+                             schema.TrmSchema, state["fragment"])
+    return _split_combined(result, state)
+
+
+def chunk_node(state: DocParserState) -> DocParserState:
+    """按标题层级切分需求文档"""
+    chunks = list(split_markdown(state["fragment"]))
+    print(f"需求文档切分为 {len(chunks)} 个分片")
+    return {"chunks": chunks}
+
+
+def fan_out_chunks(state: DocParserState, node_names: List[str]):
+    """
+        每个分片 Send 到各个抽取节点（map），增量分析时跳过其中章节哈希都未变化的分片（见 plan_reuse）
+        exception 节点不调用 LLM，只发送一次
+    """
+    skipped, _ = plan_reuse(state["chunks"], (state.get("previous_trm") or {}).get("sections"))
+    changed = [c for c in state["chunks"] if c["section"] not in skipped]
+    print(f"需要重新抽取的分片: {len(changed)}/{len(state['chunks'])}")
+    if not changed:
+        return "collect_result_task"
+    sends = []
+    for index, chunk in enumerate(changed):
+        payload = {"feature_id": state["feature_id"], "fragment": chunk["text"],
+                   "section": chunk["section"], "section_hash": chunk["section_hash"]}
+        for name in node_names:
+            if name == "ext_exception_task" and index > 0:
+                continue
+            sends.append(Send(name, payload))
+    return sends
+
+
+def _norm_text(text: str) -> str:
+    """去掉空白和标点并转小写，用于去重"""
+    return re.sub(r"[\s\W_]+", "", text or "").lower()
+
+
+def _dedupe(items: List[Any], key_fn, merge_fn=None) -> List[Any]:
+    """按 key 去重，重复项通过 merge_fn 合并到第一次出现的项"""
+    merged = {}
+    for item in items:
+        key = key_fn(item)
+        if key not in merged:
+            merged[key] = dict(item)
+        elif merge_fn:
+            merge_fn(merged[key], item)
+    return list(merged.values())
+
+
+def _merge_feature(old: Dict[str, Any], new: Dict[str, Any]):
+    old["description"] = old.get("description") or new.get("description", "")
+    old["exceptions"] = list(old.get("exceptions") or []) + \
+        [e for e in new.get("exceptions") or [] if e not in (old.get("exceptions") or [])]
+
+
+def _merge_api(old: Dict[str, Any], new: Dict[str, Any]):
+    old["name"] = old.get("name") or new.get("name", "")
+    old["description"] = old.get("description") or new.get("description", "")
+    params = {p.get("param"): p for p in old.get("request_params") or []}
+    for p in new.get("request_params") or []:
+        params.setdefault(p.get("param"), p)
+    old["request_params"] = list(params.values())
+    examples = list(old.get("response_examples") or [])
+    examples += [e for e in new.get("response_examples") or [] if e not in examples]
+    old["response_examples"] = examples
+
+
+def _merge_flow(old: Dict[str, Any], new: Dict[str, Any]):
+    if len(new.get("steps") or []) > len(old.get("steps") or []):
+        old["steps"] = new["steps"]
+
+
+def _feature_key(f):
+    return _norm_text(f.get("feature") or f.get("name"))
+
+
+def _flow_key(fl):
+    return _norm_text(fl.get("name"))
+
+
+def _rule_key(r):
+    return _norm_text(r.get("normalized") or r.get("text"))
+
+
+def _api_key(a):
+    return ((a.get("method") or "").upper(), (a.get("url") or "").rstrip("/"))
+
+
+def _exception_key(e):
+    return _norm_text(e.get("text"))
+
+
+def _previous_ids(entries: List[Any], key_fn, id_field: str) -> Dict[Any, str]:
+    """上一次 TRM 中 {key: id}，内容相同的条目沿用原来的 id"""
+    return {key_fn(e): e[id_field] for e in entries or [] if e.get(id_field)}
+
+
+def _feature_owner(features: List[Dict[str, Any]], default: str):
+    """
+        flow/api/rule/exception 所属的 feature：名称/文本中出现 feature 名称的优先（名称长的优先），
+        其次取同一章节中的第一个 feature，都没有时取第一个 feature
+    """
+    by_name = sorted(((_norm_text(f.get("name")), f["id"]) for f in features if _norm_text(f.get("name"))),
+                     key=lambda pair: -len(pair[0]))
+    by_section = {}
+    for f in features:
+        by_section.setdefault(f.get("source_section", ""), f["id"])
+    default = features[0]["id"] if features else default
+
+    def owner(item: Dict[str, Any]) -> str:
+        text = _norm_text(" ".join(str(item.get(k) or "") for k in ("name", "text", "description")))
+        for name, fid in by_name:
+            if name in text:
+                return fid
+        return by_section.get(item.get("source_section", ""), default)
+    return owner
+
+
+def _patch(previous: List[Any], entries: List[Any], unchanged: set, key_fn) -> List[Any]:
+    """保留未变化章节的旧条目，与重新抽取的条目合并去重（同一 key 以重新抽取的条目为准）"""
+    kept = [e for e in previous or [] if e.get("source_section") in unchanged]
+    return _dedupe(entries + kept, key_fn)
 
 
 def collect_result_node(state: DocParserState) -> DocParserState:
     """
-        合并抽取的feature, api, flow, rule, exception信息, 生成TRM
+        合并抽取的feature, api, flow, rule, exception信息, 生成TRM（reduce）
+        多个分片的结果在此去重：feature/flow 按名称，api 按 method+url，rule 按规范化文本
+        每个 feature 有自己的 id，flow/api/rule/exception 的 feature_id 指向所属 feature
+        增量分析时保留跳过的分片对应的旧条目，内容未变的条目沿用原来的 id
+        sections 记录 {分片: {章节: 章节哈希}}，分片名与条目的 source_section 一致
     """
     print("start to collect")
     feature_id = state["feature_id"]
-    features = state["ext_features"]
-    flows = state["ext_flows"]
-    rules = state["ext_rules"]
-    apis = state["ext_apis"]
+    previous = state.get("previous_trm") or {}
+    chunks = state.get("chunks") or []
+    prev_sections = previous.get("sections") or {}
+    skipped, unchanged = plan_reuse(chunks, prev_sections)
+    # 保留的旧条目仍按旧分片记录，重新抽取的按本次分片记录
+    sections = {name: prev_sections[name] for name in unchanged}
+    sections.update({c["section"]: c["section_hashes"] for c in chunks if c["section"] not in skipped})
+
+    features = _dedupe(state.get("ext_features") or [], _feature_key, _merge_feature)
+    flows = _dedupe(state.get("ext_flows") or [], _flow_key, _merge_flow)
+    rules = _dedupe(state.get("ext_rules") or [], _rule_key)
+    apis = _dedupe(state.get("ext_apis") or [], _api_key, _merge_api)
+    exceptions = state.get("ext_exceptions") or []
+
+    # 旧版本 TRM 中所有 feature 的 id 都是文档的 feature_id，不沿用
+    feature_ids = {k: v for k, v in _previous_ids(previous.get("features"), _feature_key, "id").items()
+                   if v != feature_id}
     feat_list = []
     for f in features:
-        feat_list.append({"id": feature_id, "name": f.get("feature") or f.get(
-            "name") or feature_id, "description": f.get("description", "")})
-
+        key = _feature_key(f)
+        feature_ids.setdefault(key, make_id("F"))
+        feat_list.append({"id": feature_ids[key], "name": f.get("feature") or f.get(
+            "name") or feature_id, "description": f.get("description", ""), **_source(f)})
+    feat_list = _patch(previous.get("features"), feat_list, unchanged, _feature_key)
+    owner = _feature_owner(feat_list, feature_id)
+
+    flow_ids = _previous_ids(previous.get("flows"), _flow_key, "flow_id")
     flow_list = []
     for fl in flows:
-        flow_list.append({"feature_id": feature_id, "flow_id": make_id(
-            "FLOW"), "name": fl.get("name", "flow"), "steps": fl.get("steps", [])})
+        flow_list.append({"feature_id": owner(fl), "flow_id": flow_ids.get(_flow_key(fl)) or make_id(
+            "FLOW"), "name": fl.get("name", "flow"), "steps": fl.get("steps", []), **_source(fl)})
 
     api_list = []
     for a in apis:
         a_entry = a.copy()
-        a_entry.setdefault("feature_id", feature_id)
+        a_entry["feature_id"] = owner(a)
         api_list.append(a_entry)
 
+    rule_ids = _previous_ids(previous.get("rules"), _rule_key, "rule_id")
     rule_list = []
     for r in rules:
-        rule_list.append({"feature_id": feature_id, "rule_id": make_id("R"), "text": r.get(
-            "text"), "type": r.get("type", "input_validation"), "normalized": r.get("normalized", "")})
+        rule_list.append({"feature_id": owner(r), "rule_id": rule_ids.get(_rule_key(r)) or make_id("R"), "text": r.get(
+            "text"), "type": r.get("type", "input_validation"), "normalized": r.get("normalized", ""), **_source(r)})
+
+    exception_ids = _previous_ids(previous.get("exceptions"), _exception_key, "exception_id")
+    exception_list = _collect_exceptions(features, exceptions, exception_ids, feature_ids, owner)
 
     return {"trm_result": {
         "features": feat_list,
-        "flows": flow_list,
-        "api": api_list,
-        "rules": rule_list,
-        "exceptions": []
+        "flows": _patch(previous.get("flows"), flow_list, unchanged, _flow_key),
+        "api": _patch(previous.get("api"), api_list, unchanged, _api_key),
+        "rules": _patch(previous.get("rules"), rule_list, unchanged, _rule_key),
+        "exceptions": _patch(previous.get("exceptions"), exception_list, unchanged, _exception_key),
+        "sections": sections
     }}
 
 
+def _collect_exceptions(features: List[Any], exceptions: List[Any], exception_ids: Dict[Any, str],
+                        feature_ids: Dict[Any, str], owner) -> List[Dict[str, Any]]:
+    """
+        合并 exception 节点的结果与 feature 中的异常场景并去重，
+        两种抽取模式得到一致的 exceptions；feature 中的异常直接归属该 feature
+    """
+    items = [e if isinstance(e, dict) else {"text": e} for e in exceptions]
+    for f in features:
+        fid = feature_ids.get(_feature_key(f))
+        items.extend({"text": e, **_source(f), **({"feature_id": fid} if fid else {})}
+                     for e in f.get("exceptions") or [])
+    items = [e for e in items if (e.get("text") or "").strip()]
+    exception_list = []
+    for e in _dedupe(items, _exception_key):
+        exception_list.append({"feature_id": e.get("feature_id") or owner(e),
+                               "exception_id": exception_ids.get(_exception_key(e)) or make_id("E"),
+                               "text": e["text"].strip(), **_source(e)})
+    return exception_list
+
+
 def save_node(state: DocParserState):
     print("saving trm doc")
     feature_id = state["feature_id"]
@@ -140,34 +455,43 @@ def save_node(state: DocParserState):
     return state
 
 
-def create_graph():
-    """创建并运行简单的并行图"""
+def create_graph(is_async: bool = False, mode: str = MODE_SPLIT):
+    """
+        创建并运行简单的并行图
+        is_async=True 时使用异步节点, 需通过 ainvoke 调用
+        mode: split（四次并行抽取）/ combined（一次调用抽取全部信息）
+    """
     print("开始创建图-文档分析")
     # 创建图
     workflow = StateGraph(DocParserState)
 
     # 添加节点
-    workflow.add_node("ext_feature_task", extract_feature_node)
-    workflow.add_node("ext_api_task", extract_api_node)
-    workflow.add_node("ext_flow_task", extract_flow_node)
-    workflow.add_node("ext_rule_task", extract_rule_node)
-    workflow.add_node("ext_exception_task", extract_exception_node)
+    if mode == MODE_COMBINED:
+        ext_nodes = {
+            "ext_combined_task": aextract_combined_node if is_async else extract_combined_node,
+        }
+    else:
+        ext_nodes = {
+            "ext_feature_task": aextract_feature_node if is_async else extract_feature_node,
+            "ext_api_task": aextract_api_node if is_async else extract_api_node,
+            "ext_flow_task": aextract_flow_node if is_async else extract_flow_node,
+            "ext_rule_task": aextract_rule_node if is_async else extract_rule_node,
+            "ext_exception_task": aextract_exception_node if is_async else extract_exception_node,
+        }
+    for name, node in ext_nodes.items():
+        workflow.add_node(name, node)
+    workflow.add_node("chunk_task", chunk_node)
     workflow.add_node("collect_result_task", collect_result_node)
     workflow.add_node("save_task", save_node)
 
-    # 并行任务
-    workflow.add_edge(START, "ext_feature_task")
-    workflow.add_edge(START, "ext_api_task")
-    workflow.add_edge(START, "ext_flow_task")
-    workflow.add_edge(START, "ext_rule_task")
-    workflow.add_edge(START, "ext_exception_task")
-
-    # 结果合并业务
-    workflow.add_edge("ext_feature_task", "collect_result_task")
-    workflow.add_edge("ext_api_task", "collect_result_task")
-    workflow.add_edge("ext_flow_task", "collect_result_task")
-    workflow.add_edge("ext_rule_task", "collect_result_task")
-    workflow.add_edge("ext_exception_task", "collect_result_task")
+    # 分片后并行任务 & 结果合并业务
+    node_names = list(ext_nodes)
+    workflow.add_edge(START, "chunk_task")
+    workflow.add_conditional_edges(
+        "chunk_task", lambda state: fan_out_chunks(state, node_names),
+        node_names + ["collect_result_task"])
+    for name in ext_nodes:
+        workflow.add_edge(name, "collect_result_task")
     workflow.add_edge("collect_result_task", "save_task")
     # 结束
     workflow.add_edge("save_task", END)
@@ -176,3 +500,26 @@ def create_graph():
     graph = workflow.compile()
 
     return graph
+
+
+def _initial_state(fragment: str, feature_id: str, incremental: bool) -> DocParserState:
+    """incremental=True 时基于最近一次 TRM 只重新抽取变化的章节"""
+    state = {"feature_id": feature_id, "fragment": fragment}
+    if incremental:
+        state["previous_trm"] = load_latest_trm(feature_id)
+    return state
+
+
+def run_graph(fragment: str, feature_id: str = "123", mode: str = MODE_SPLIT, incremental: bool = False):
+    """同步执行需求解析"""
+    graph = create_graph(mode=mode)
+    final_state = graph.invoke(_initial_state(fragment, feature_id, incremental))
+    return final_state["trm_result"]
+
+
+async def arun_graph(fragment: str, feature_id: str = "123", mode: str = MODE_SPLIT,
+                     incremental: bool = False):
+    """异步执行需求解析（基于 ainvoke）"""
+    graph = create_graph(is_async=True, mode=mode)
+    final_state = await graph.ainvoke(_initial_state(fragment, feature_id, incremental))
+    return final_state["trm_result"]
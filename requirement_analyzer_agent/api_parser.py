@@ -0,0 +1,193 @@
+import re
+import textwrap
+from typing import Any, Dict, List, Optional, Tuple
+
+# 与 ExtractApiPrompt 中的规则一致：同一行出现 HTTP 方法和以 / 开头的 URL 即为一个 API
+_METHOD_RE = re.compile(r"(?i)\b(GET|POST|PUT|DELETE|PATCH)\b")
+_URL_RE = re.compile(r"(?<![\w/])(/[A-Za-z0-9_\-/{}:.]+)")
+_HEADING_RE = re.compile(r"^\s*(#{1,6})\s+(.+?)\s*#*\s*$")
+_TABLE_RE = re.compile(r"^\s*\|.*\|\s*$")
+_TABLE_SEP_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+# 标题前的序号，如 "1." "2.1" "一、"
+_NUMBERING_RE = re.compile(r"^\s*([0-9]+(\.[0-9]+)*\.?|[一二三四五六七八九十]+、)\s*")
+# 只起提示作用的标签行，如 "请求方式：" "请求参数：" "响应示例（成功）："
+_LABEL_RE = re.compile(r"^\s*(请求方式|请求方法|请求地址|接口地址|请求参数|参数说明|返回参数|响应参数|响应示例|返回示例|"
+                       r"request|response|method|url|params?)[^:：]{0,20}[:：]?\s*$", re.I)
+
+_PARAM_COLUMNS = ("参数", "参数名", "字段", "字段名", "名称", "name", "param", "field")
+_TYPE_COLUMNS = ("类型", "参数类型", "type")
+_DESC_COLUMNS = ("说明", "描述", "备注", "含义", "description", "desc", "comment")
+
+
+def _match_api(line: str) -> Optional[Tuple[str, str]]:
+    method = _METHOD_RE.search(line)
+    url = _URL_RE.search(line)
+    if method and url:
+        return method.group(1).upper(), url.group(1)
+    return None
+
+
+def _api_description(line: str) -> str:
+    """API 行中 URL 之后的文字，如 "POST /api/logout 退出登录" 中的「退出登录」"""
+    url = _URL_RE.search(line)
+    return line[url.end():].strip(" \t`*|-—:：()（）") if url else ""
+
+
+def _column(header: List[str], names: Tuple[str, ...]) -> Optional[int]:
+    for index, cell in enumerate(header):
+        if cell.strip().lower() in names:
+            return index
+    return None
+
+
+def _cells(line: str) -> List[str]:
+    return [c.strip() for c in line.strip().strip("|").split("|")]
+
+
+def _parse_table(rows: List[str]) -> List[Dict[str, str]]:
+    """解析 markdown 参数表，按表头识别 参数/类型/说明 列"""
+    if len(rows) < 2:
+        return []
+    header = _cells(rows[0])
+    param_col = _column(header, _PARAM_COLUMNS)
+    if param_col is None:
+        return []
+    type_col = _column(header, _TYPE_COLUMNS)
+    desc_col = _column(header, _DESC_COLUMNS)
+    params = []
+    for row in rows[1:]:
+        if _TABLE_SEP_RE.match(row):
+            continue
+        cells = _cells(row)
+
+        def cell(col):
+            return cells[col] if col is not None and col < len(cells) else ""
+        if not cell(param_col):
+            continue
+        params.append({"param": cell(param_col), "param_type": cell(type_col),
+                       "description": cell(desc_col)})
+    return params
+
+
+def _json_end(lines: List[str], start: int) -> int:
+    """从 start 行开始的 JSON 示例结束行（括号配平），返回结束行的下一行"""
+    depth = 0
+    in_string = False
+    escape = False
+    for index in range(start, len(lines)):
+        for ch in lines[index]:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = in_string
+            elif ch == '"':
+                in_string = not in_string
+            elif not in_string and ch in "{[":
+                depth += 1
+            elif not in_string and ch in "}]":
+                depth -= 1
+        if depth <= 0:
+            return index + 1
+    return len(lines)
+
+
+def _parse_block(lines: List[str], name: str) -> Dict[str, Any]:
+    """解析一个 API 所在区域：说明文字、参数表、响应示例"""
+    descriptions = []
+    params = []
+    examples = []
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        stripped = line.strip()
+        if _TABLE_RE.match(line):
+            end = index
+            while end < len(lines) and _TABLE_RE.match(lines[end]):
+                end += 1
+            params.extend(_parse_table(lines[index:end]))
+            index = end
+            continue
+        if _FENCE_RE.match(line):
+            end = index + 1
+            while end < len(lines) and not _FENCE_RE.match(lines[end]):
+                end += 1
+            body = textwrap.dedent("\n".join(lines[index + 1:end])).strip()
+            if body.startswith(("{", "[")):
+                examples.append(body)
+            index = end + 1
+            continue
+        if stripped.startswith(("{", "[")):
+            end = _json_end(lines, index)
+            examples.append(textwrap.dedent("\n".join(lines[index:end])).strip())
+            index = end
+            continue
+        if _match_api(stripped):
+            # API 行本身只取 URL 之后的说明文字
+            stripped = _api_description(stripped)
+        if stripped and not _LABEL_RE.match(stripped):
+            descriptions.append(stripped)
+        index += 1
+    return {"name": name, "description": "\n".join(descriptions),
+            "request_params": params, "response_examples": examples}
+
+
+def parse_apis(text: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+        不调用 LLM，逐行扫描提取 API（结构与 ApiSchema 一致）
+        - 名称取 API 所在章节标题（去掉序号）
+        - 说明取该区域中的普通文字，参数表与 JSON 响应示例分别归入 request_params / response_examples
+        API 区域为所在章节中上一个 API（或章节开头）到下一个 API（或下一个同级及以上标题）之间的内容。
+        返回 (apis, complete)，complete 表示所有 API 的名称和说明都已解析到
+    """
+    lines = text.splitlines()
+    # 先定位标题与 API 行
+    headings = []  # (line_no, level, title)
+    api_lines = []  # (line_no, method, url)
+    in_fence = False
+    for line_no, line in enumerate(lines):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        heading = _HEADING_RE.match(line)
+        if heading:
+            headings.append((line_no, len(heading.group(1)), heading.group(2).strip()))
+            continue
+        api = _match_api(line)
+        if api:
+            api_lines.append((line_no,) + api)
+
+    apis = []
+    seen = set()
+    for index, (line_no, method, url) in enumerate(api_lines):
+        if (method, url) in seen:
+            continue
+        seen.add((method, url))
+        section = None
+        for heading in headings:
+            if heading[0] < line_no:
+                section = heading
+        # 区域起点：所在章节开头或上一个 API 行之后
+        start = section[0] + 1 if section else 0
+        if index > 0 and api_lines[index - 1][0] >= start:
+            start = api_lines[index - 1][0] + 1
+        # 区域终点：下一个 API 行或下一个同级及以上标题
+        end = len(lines)
+        if index + 1 < len(api_lines):
+            end = api_lines[index + 1][0]
+        level = section[1] if section else 0
+        for heading in headings:
+            if line_no < heading[0] < end and (level == 0 or heading[1] <= level):
+                end = heading[0]
+                break
+        # 子标题本身（如 "### 请求参数"）不计入说明
+        block = [l for l in lines[start:end] if not _HEADING_RE.match(l)]
+        name = _NUMBERING_RE.sub("", section[2]) if section else ""
+        api = {"method": method, "url": url}
+        api.update(_parse_block(block, name))
+        apis.append(api)
+
+    complete = all(api["name"] and api["description"] for api in apis)
+    return apis, complete
@@ -0,0 +1,104 @@
+#-*- coding: utf-8 -*-
+"""
+    对比 split（四次并行抽取）与 combined（一次抽取）两种模式的 token 使用量与耗时
+    用法: python requirement_analyzer_agent/benchmark.py [需求文档.md] [重复次数]
+"""
+import sys
+import os
+import time
+import asyncio
+
+# 将项目根目录添加到 Python 路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(current_dir))
+
+from utils.llm_client import llm_client
+from utils.llm_cache import CACHE_BYPASS
+from requirement_analyzer_agent.agent import MODE_SPLIT, MODE_COMBINED, collect_result_node, \
+    aextract_feature_node, aextract_api_node, aextract_flow_node, aextract_rule_node, \
+    aextract_exception_node, aextract_combined_node
+
+SAMPLE_MD = """
+# 登录与用户管理模块需求说明
+
+## 1. 用户登录功能
+用户可以在登录页面输入手机号与密码进行登录。
+- 手机号必须为 11 位数字。
+- 密码需至少 8 位，并且包含数字与字母。
+- 若密码错误次数超过 5 次，则账号锁定 10 分钟。
+
+请求方式：
+POST /api/login
+
+请求参数：
+| 参数 | 类型 | 说明 |
+|------|------|------|
+| phone | string | 手机号 |
+| password | string | 登录密码 |
+
+响应示例（成功）：
+{
+  "code": 0,
+  "msg": "ok",
+  "data": { "token": "xxxxx" }
+}
+
+响应示例（失败）：
+{
+  "code": 401,
+  "msg": "Unauthorized"
+}
+"""
+
+MODE_NODES = {
+    MODE_SPLIT: [aextract_feature_node, aextract_api_node, aextract_flow_node,
+                 aextract_rule_node, aextract_exception_node],
+    MODE_COMBINED: [aextract_combined_node],
+}
+
+
+async def run_mode(mode: str, fragment: str, feature_id: str = "bench"):
+    """与图中相同的方式并行执行抽取节点并合并结果（不保存 TRM 文件）"""
+    state = {"feature_id": feature_id, "fragment": fragment}
+    results = await asyncio.gather(*[node(state) for node in MODE_NODES[mode]])
+    for result in results:
+        state.update(result)
+    return collect_result_node(state)["trm_result"]
+
+
+def benchmark(fragment: str, repeat: int = 3):
+    """返回每种模式的平均耗时、请求数与估算 token 数"""
+    llm_client.cache_mode = CACHE_BYPASS
+    scheduler = llm_client.scheduler
+    summary = {}
+    for mode in MODE_NODES:
+        scheduler.reset_metrics()
+        start = time.perf_counter()
+        trm = None
+        for _ in range(repeat):
+            trm = asyncio.run(run_mode(mode, fragment))
+        elapsed = time.perf_counter() - start
+        metrics = scheduler.metrics()
+        summary[mode] = {
+            "latency_avg": elapsed / repeat,
+            "requests": metrics["requests"] / repeat,
+            "prompt_tokens": metrics["prompt_tokens"] / repeat,
+            "completion_tokens": metrics["completion_tokens"] / repeat,
+            "counts": {k: len(v) for k, v in trm.items()},
+        }
+    return summary
+
+
+if __name__ == '__main__':
+    fragment = SAMPLE_MD
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            fragment = f.read()
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    summary = benchmark(fragment, repeat)
+    print(f"{'mode':<10}{'latency(s)':>12}{'requests':>10}{'prompt_tok':>12}{'output_tok':>12}  counts")
+    for mode, item in summary.items():
+        print(f"{mode:<10}{item['latency_avg']:>12.2f}{item['requests']:>10.1f}"
+              f"{item['prompt_tokens']:>12.0f}{item['completion_tokens']:>12.0f}  {item['counts']}")
+    print("token 数为估算值（utils.tools.estimate_tokens）")
@@ -0,0 +1,223 @@
+import os
+import re
+import hashlib
+from typing import Iterator, List, Dict, Any, Set, Tuple
+
+from utils.tools import estimate_tokens
+
+# 每个分片的最大 token 数与相邻分片的重叠 token 数
+CHUNK_MAX_TOKENS = int(os.environ.get("TRM_CHUNK_MAX_TOKENS", 3000))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("TRM_CHUNK_OVERLAP_TOKENS", 200))
+
+_HEADING_RE = re.compile(r"^\s*(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+
+
+class Section:
+    """markdown 标题节点"""
+
+    def __init__(self, level: int, title: str, heading: str = ""):
+        self.level = level
+        self.title = title
+        self.heading = heading
+        self.lines: List[str] = []
+        self.children: List["Section"] = []
+        self._tokens = None
+
+    def body(self) -> str:
+        """直属正文（不含标题行与子标题）"""
+        return "\n".join(self.lines).strip("\n")
+
+    def full_text(self) -> str:
+        """标题、正文及全部子标题内容"""
+        parts = [self.heading, self.body()] + [c.full_text() for c in self.children]
+        return "\n\n".join(p for p in parts if p.strip())
+
+    def tokens(self) -> int:
+        if self._tokens is None:
+            self._tokens = estimate_tokens(self.heading) + estimate_tokens(self.body()) + \
+                sum(c.tokens() for c in self.children)
+        return self._tokens
+
+
+def parse_sections(text: str) -> Section:
+    """按标题层级将 markdown 解析为树（代码块中的 # 不视为标题）"""
+    root = Section(0, "")
+    stack = [root]
+    in_fence = False
+    for line in text.splitlines():
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING_RE.match(line)
+        if not match:
+            stack[-1].lines.append(line)
+            continue
+        level = len(match.group(1))
+        while stack[-1].level >= level:
+            stack.pop()
+        section = Section(level, match.group(2).strip(), line.strip())
+        stack[-1].children.append(section)
+        stack.append(section)
+    return root
+
+
+def _tail(units: List[str], overlap_tokens: int) -> List[str]:
+    """取末尾不超过 overlap_tokens 的若干段，作为下一个分片的重叠部分"""
+    tail = []
+    total = 0
+    for unit in reversed(units):
+        total += estimate_tokens(unit)
+        if total > overlap_tokens:
+            break
+        tail.insert(0, unit)
+    return tail
+
+
+def _split_units(text: str, max_tokens: int) -> List[str]:
+    """将超长文本拆成不超过 max_tokens 的单元：先按段落，再按行，最后按字符"""
+    units = []
+    for para in re.split(r"\n\s*\n", text):
+        if not para.strip():
+            continue
+        if estimate_tokens(para) <= max_tokens:
+            units.append(para)
+            continue
+        for line in para.splitlines():
+            if estimate_tokens(line) <= max_tokens:
+                units.append(line)
+                continue
+            # 单行超长时按字符硬切分（按最坏情况 1 字符 1 token）
+            for i in range(0, len(line), max_tokens):
+                units.append(line[i:i + max_tokens])
+    return units
+
+
+def split_text(text: str, max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """将超长文本按段落打包成多个分片，相邻分片保留 overlap_tokens 的重叠"""
+    buffer: List[str] = []
+    buffer_tokens = 0
+    for unit in _split_units(text, max_tokens):
+        unit_tokens = estimate_tokens(unit)
+        if buffer and buffer_tokens + unit_tokens > max_tokens:
+            yield "\n\n".join(buffer)
+            buffer = _tail(buffer, min(overlap_tokens, max_tokens - unit_tokens))
+            buffer_tokens = sum(estimate_tokens(u) for u in buffer)
+        buffer.append(unit)
+        buffer_tokens += unit_tokens
+    if buffer:
+        yield "\n\n".join(buffer)
+
+
+def _pieces(section: Section, path: List[str]) -> List[Tuple[List[str], Any]]:
+    """章节的组成部分：直属正文 + 各子章节"""
+    pieces = []
+    if section.body().strip():
+        pieces.append((path, section.body()))
+    for child in section.children:
+        pieces.append((path + [child.title], child))
+    return pieces
+
+
+def _emit(section: Section, path: List[str], breadcrumb: List[str],
+          max_tokens: int, overlap_tokens: int) -> Iterator[Dict[str, Any]]:
+    """
+        递归生成分片：能放下的相邻部分合并为一个分片，放不下的子章节继续拆分，
+        放不下的正文按段落切分并保留重叠。breadcrumb 为祖先及本章节的标题行
+    """
+    prefix = "\n".join(breadcrumb)
+    buffer: List[str] = []
+    buffer_paths: List[List[str]] = []
+    buffer_tokens = 0
+
+    def flush():
+        if buffer:
+            yield _make_chunk(buffer_paths, prefix, buffer)
+
+    for piece_path, piece in _pieces(section, path):
+        is_section = isinstance(piece, Section)
+        text = piece.full_text() if is_section else piece
+        tokens = piece.tokens() if is_section else estimate_tokens(text)
+        if tokens > max_tokens:
+            yield from flush()
+            buffer, buffer_paths, buffer_tokens = [], [], 0
+            if is_section:
+                child_breadcrumb = breadcrumb + [piece.heading]
+                yield from _emit(piece, piece_path, child_breadcrumb, max_tokens, overlap_tokens)
+            else:
+                for part_no, part in enumerate(split_text(text, max_tokens, overlap_tokens)):
+                    yield _make_chunk([piece_path + [f"#{part_no + 1}"]], prefix, [part])
+            continue
+        if buffer_tokens + tokens > max_tokens:
+            yield from flush()
+            buffer, buffer_paths, buffer_tokens = [], [], 0
+        buffer.append(text)
+        buffer_paths.append(piece_path)
+        buffer_tokens += tokens
+    yield from flush()
+
+
+def _make_chunk(paths: List[List[str]], prefix: str, pieces: List[str]) -> Dict[str, Any]:
+    names = [" > ".join(p) or "/" for p in paths]
+    text = "\n\n".join(pieces)
+    if prefix:
+        text = prefix + "\n\n" + text
+    return {"section": " | ".join(names), "text": text, "section_hash": section_hash(text),
+            "section_hashes": [[name, section_hash(piece)] for name, piece in zip(names, pieces)]}
+
+
+def section_hash(text: str) -> str:
+    """分片内容哈希，用于增量分析判断章节是否变化"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def split_markdown(text: str, max_tokens: int = None, overlap_tokens: int = None) -> Iterator[Dict[str, Any]]:
+    """
+        按标题层级切分 markdown 需求文档
+        返回 {"section": 标题路径, "text": 分片内容, "section_hash": 内容哈希,
+              "section_hashes": {章节: 章节内容哈希}} 的生成器，
+        一个分片可能打包了多个相邻章节，section_hashes 为其中每个章节（或超长正文的每一段）的哈希；
+        每个分片前会带上祖先标题，便于模型理解上下文；标题路径重复时追加序号保证唯一
+    """
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    root = parse_sections(text)
+    seen = {}
+    seen_sections = {}
+    for chunk in _emit(root, [], [], max_tokens, overlap_tokens):
+        count = seen.get(chunk["section"], 0)
+        seen[chunk["section"]] = count + 1
+        if count:
+            chunk["section"] = f"{chunk['section']} ~{count + 1}"
+        hashes = {}
+        for name, digest in chunk["section_hashes"]:
+            count = seen_sections.get(name, 0)
+            seen_sections[name] = count + 1
+            hashes[f"{name} ~{count + 1}" if count else name] = digest
+        chunk["section_hashes"] = hashes
+        yield chunk
+
+
+def plan_reuse(chunks: List[Dict[str, Any]], previous: Dict[str, Any]) -> Tuple[Set[str], Set[str]]:
+    """
+        增量分析时哪些分片可以跳过、上一次 TRM 中哪些分片的条目可以保留
+        previous 为上一次 TRM 的 sections：{分片: {章节: 章节哈希}}（旧格式的字符串哈希视为已变化）
+        - 上一次的分片中所有章节内容都未变化（且都还在）时，它的条目才可以保留
+        - 分片中每个章节都未变化、且都属于可保留的旧分片时才跳过，否则整个分片重新抽取
+        - 旧分片的章节全部落在跳过的分片中才保留，避免与重新抽取的条目重复
+        返回 (跳过的分片名, 保留的旧分片名)
+    """
+    current = {name: digest for c in chunks for name, digest in (c.get("section_hashes") or {}).items()}
+    clean = {name: set(hashes) for name, hashes in (previous or {}).items()
+             if isinstance(hashes, dict) and hashes
+             and all(current.get(s) == digest for s, digest in hashes.items())}
+    owned = set().union(*clean.values())
+    skipped = {c["section"]: set(c.get("section_hashes") or {}) for c in chunks}
+    skipped = {name: sections for name, sections in skipped.items() if sections and sections <= owned}
+    while True:
+        covered = set().union(*skipped.values())
+        kept = {name for name, sections in clean.items() if sections <= covered}
+        kept_sections = set().union(*(clean[name] for name in kept))
+        remaining = {name: sections for name, sections in skipped.items() if sections <= kept_sections}
+        if len(remaining) == len(skipped):
+            return set(skipped), kept
+        skipped = remaining
@@ -63,6 +63,28 @@ class ExtractApiPrompt:
     """
 
 
+class FillApiInfoPrompt:
+
+    system_prompt = """
+    以下 API 已经通过规则从需求文档中提取出来（HTTP 方法和 URL 已确定），
+    请根据需求文档为每个 API 补全名称和说明，并输出为 JSON 数组：
+
+    【要求】
+    1. 只补全下面列出的 API，不要新增或删除 API，method 和 url 保持不变。
+    2. name: 根据 API 所在章节标题或上下文推断的名称。
+    3. description: API 附近的描述文字。
+    4. 数组里面的每一个API的JSON格式输出
+    {format_instructions}
+    """
+
+    user_prompt = """需要补全的 API 如下：
+            {apis}
+
+            我的需求文档如下：
+            {fragment}
+            """
+
+
 class ExtractFlowPrompt:
     system_prompt = """你是一个流程提取代理。从给定片段中提取任何用户/流程流,并输出为 JSON 数组字符串。
                        # 提取信息要求
@@ -93,3 +115,37 @@ class ExtractRulePrompt:
                     - 如果没有提取到规则，返回 []。
                     - 不允许以其他格式输出。
                 """
+
+
+class ExtractCombinedPrompt:
+
+    system_prompt = """
+    #角色
+    你是软件需求分析专家。
+
+    #职责
+    请一次性从用户提供的需求文档中抽取以下全部信息，输出为一个 JSON 对象：
+    1. features: 识别所有独立的功能点（feature），每个功能点提取
+       - feature : 短标题，不超过8个汉字
+       - description : 一段简洁描述
+       - inputs / outputs : 输入参数名 / 输出字段名
+       - rules : 业务规则或约束（句子）
+       - exceptions : 异常场景的简短描述
+    2. apis: 逐行扫描全文，只要一行中同时出现 HTTP 方法（GET|POST|PUT|DELETE）和以 / 开头的 URL，
+       就必须识别为一个 API，并提取 method、url、name（由章节标题推断）、description（紧随其后的描述）、
+       request_params（该章节中的参数表）、response_examples（该章节中的全部响应示例）。
+       不需要推断不存在的 API。
+    3. flows: 提取用户/业务流程，包括 name 和 steps，例如 ["输入用户名和密码","登陆"]。
+    4. rules: 提取明确的规则和约束，包括
+       - text: 规则的原始文本
+       - type: 从 input_validation，rate_limit，auth，other 中选择
+       - normalized: 规范化后的规则
+    5. exceptions: 文档中描述的全部异常场景。
+
+    #输出要求
+    1. 如果无法提取某类信息，请返回空数组。
+    2. 不要遗漏任何可能的功能点、API、流程和规则。
+    3. 输出格式如下：
+    {format_instructions}
+    4. 不允许以其他格式输出。
+    """
@@ -36,6 +36,14 @@ class ApiSchema(BaseModel):
     response_examples: List[str] = Field(description="响应示例")
 
 
+class ApiInfoSchema(BaseModel):
+
+    method: str = Field(description="HTTP 方法")
+    url: str = Field(description="API URL")
+    name: str = Field(description="API 名称")
+    description: str = Field(description="API 说明")
+
+
 class FlowSchema(BaseModel):
 
     name: str = Field(description="Feature的名称")
@@ -47,3 +55,11 @@ class RuleSchema(BaseModel):
     type: RuleType = Field(description="类型", examples=[
                       "input_validation", "rate_limit", "auth", "other"])
     normalized: str = Field(description="规范化文本")
+
+
+class TrmSchema(BaseModel):
+    features: List[FeatureSchema] = Field(description="功能点列表")
+    apis: List[ApiSchema] = Field(description="API列表")
+    flows: List[FlowSchema] = Field(description="流程列表")
+    rules: List[RuleSchema] = Field(description="规则列表")
+    exceptions: List[str] = Field(description="异常场景列表")
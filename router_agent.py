@@ -1,7 +1,11 @@
+import asyncio
+from typing import Dict
 from langgraph.graph import START, END, StateGraph
 from state import GlobalState
 from gen_test_case_agent.agent import create_graph as test_case_create_agent
 from gen_test_code_agent.agent import create_graph as test_code_create_agent
+from gen_test_code_agent.browser_pool import close_browser_pool, close_sync_browser_pool
+from gen_test_report_agent.agent import create_graph as test_report_create_agent
 from requirement_analyzer_agent.agent import create_graph as trm_create_agent
 
 
@@ -27,6 +31,7 @@ def test_code_create_node(state: GlobalState):
     print("生成代码节点")
     init_state = {
         "url": "http://localhost:5173/login",
+        "page_urls": state.get("page_urls") or {},
         "test_case_result": state["test_case_result"]
     }
     resp = test_code_create_agent().invoke(init_state)
@@ -34,21 +39,78 @@ def test_code_create_node(state: GlobalState):
     return {"test_code_refs": resp["test_code_refs"]}
 
 
-def create_graph():
-    """创建并运行简单的并行图"""
+def test_report_create_node(state: GlobalState):
+    """执行测试并生成报告节点：执行的同时逐条诊断"""
+    print("执行测试并生成报告节点")
+    result = test_report_create_agent().invoke(
+        {"feature_id": state["feature_id"], "test_code_refs": state.get("test_code_refs") or []})
+    return _report_update(result)
+
+
+def _report_update(result: Dict) -> Dict:
+    return {"execution_result": result["result"],
+            "report": {key: result.get(key) for key in
+                       ("report_file_path", "run_id", "analytics", "performance", "performance_section")}}
+
+
+async def atrm_create_node(state: GlobalState):
+    """需求解析节点（异步）"""
+    print("需求解析节点")
+    result = await trm_create_agent(is_async=True).ainvoke({"feature_id": state["feature_id"],
+                                                            "fragment": state["fragment"]})
+    return {"doc_parser_result": result["trm_result"]}
+
+
+async def atest_case_create_node(state: GlobalState):
+    """生成测试用例节点（异步）"""
+    print("生成测试用例节点")
+    result = await test_case_create_agent(is_async=True).ainvoke(
+        {"trm_result": state["doc_parser_result"], "feature_id": state["feature_id"]})
+    return {"test_case_result": result["test_case_result"]}
+
+
+async def atest_code_create_node(state: GlobalState):
+    """生成代码节点（异步）"""
+    print("生成代码节点")
+    init_state = {
+        "url": "http://localhost:5173/login",
+        "page_urls": state.get("page_urls") or {},
+        "test_case_result": state["test_case_result"]
+    }
+    resp = await test_code_create_agent(is_async=True).ainvoke(init_state)
+    return {"test_code_refs": resp["test_code_refs"]}
+
+
+async def atest_report_create_node(state: GlobalState):
+    """执行测试并生成报告节点（异步）：pytest 子进程和诊断在线程中进行，不阻塞 event loop"""
+    print("执行测试并生成报告节点")
+    result = await asyncio.to_thread(test_report_create_agent().invoke,
+                                     {"feature_id": state["feature_id"],
+                                      "test_code_refs": state.get("test_code_refs") or []})
+    return _report_update(result)
+
+
+def create_graph(is_async: bool = False):
+    """创建并运行简单的并行图, is_async=True 时使用异步节点, 需通过 ainvoke 调用"""
     print("开始创建图")
     # 创建图
     workflow = StateGraph(GlobalState)
 
     # 添加节点
-    workflow.add_node("create_trm_task", trm_create_node)
-    workflow.add_node("create_test_case_task", test_case_create_node)
-    workflow.add_node("create_test_code_task", test_code_create_node)
+    workflow.add_node("create_trm_task",
+                      atrm_create_node if is_async else trm_create_node)
+    workflow.add_node("create_test_case_task",
+                      atest_case_create_node if is_async else test_case_create_node)
+    workflow.add_node("create_test_code_task",
+                      atest_code_create_node if is_async else test_code_create_node)
+    workflow.add_node("create_test_report_task",
+                      atest_report_create_node if is_async else test_report_create_node)
 
     # 任务
     workflow.add_edge(START, "create_trm_task")
     workflow.add_edge("create_trm_task", "create_test_case_task")
     workflow.add_edge("create_test_case_task", "create_test_code_task")
+    workflow.add_edge("create_test_code_task", "create_test_report_task")
     workflow.add_edge("create_test_case_task", END)
 
     # 编译图
@@ -57,16 +119,12 @@ def create_graph():
     return graph
 
 
-def run(user_input: str):
-    """
-    执行工作流
-    """
-    print("=" * 50)
-
-    # 创建初始状态
-    initial_state = {
-        "feature_id": "123",
+def build_initial_state(user_input: str, feature_id: str = "123", page_urls: Dict[str, str] = None):
+    """创建初始状态，page_urls 为 {页面名称: url}，用于按页面提取 selector"""
+    return {
+        "feature_id": feature_id,
         "fragment": user_input,
+        "page_urls": page_urls or {},
         "doc_parer_result": {},
         "test_case_result": [],
         "test_code_refs": [],
@@ -74,7 +132,7 @@ def run(user_input: str):
         "report": None,
         "bugs": [],
         "router": {
-            "session": "123",
+            "session": feature_id,
             "current_stage": "init",
             "workflow_status": "running",
             "agent_status": None,
@@ -82,18 +140,59 @@ def run(user_input: str):
             "retry_info": None
         }
     }
+
+
+def run(user_input: str, feature_id: str = "123", page_urls: Dict[str, str] = None):
+    """
+    执行工作流，page_urls 为 {页面名称: url}
+    """
+    print("=" * 50)
+
+    # 创建初始状态
+    initial_state = build_initial_state(user_input, feature_id, page_urls)
     print("--------------------初始化状态--------------")
     print(initial_state)
     print("-------------------------------------------")
     graph = create_graph()
     print("\n开始执行工作流...")
     print("-" * 50)
-    final_state = graph.invoke(initial_state)
+    try:
+        final_state = graph.invoke(initial_state)
+    finally:
+        close_sync_browser_pool()
     print(final_state)
     print("-" * 50)
     print("工作流执行完毕")
 
 
+async def arun(user_input: str, feature_id: str = "123", page_urls: Dict[str, str] = None):
+    """
+    异步执行工作流（基于 ainvoke），page_urls 为 {页面名称: url}
+    """
+    graph = create_graph(is_async=True)
+    try:
+        return await graph.ainvoke(build_initial_state(user_input, feature_id, page_urls))
+    finally:
+        await close_browser_pool()
+
+
+async def arun_batch(fragments: Dict[str, str], page_urls: Dict[str, str] = None):
+    """
+    在同一个 event loop 上并发执行多个 feature 的工作流
+    fragments: {feature_id: 需求文档片段}
+    page_urls: {页面名称: url}，所有 feature 共用
+    """
+    graph = create_graph(is_async=True)
+    tasks = [graph.ainvoke(build_initial_state(fragment, feature_id, page_urls))
+             for feature_id, fragment in fragments.items()]
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        # 所有 feature 共用同一个浏览器池，全部完成后再关闭
+        await close_browser_pool()
+    return dict(zip(fragments.keys(), results))
+
+
 if __name__ == "__main__":
     SAMPLE_MD = """
             # 登录与用户管理模块需求说明
@@ -1,27 +1,47 @@
-from datetime import datetime
-from typing import TypedDict
+import os
+import glob
+import uuid
+from typing import TypedDict, List
 from langgraph.graph import START, END, StateGraph
-import pytest
+from run_test_code_agent.sharded_runner import run_sharded
+from run_test_code_agent.selection import select_tests, record_baseline
 
 
 class RunnerState(TypedDict):
     feature_id: str
+    # 测试代码目录，test_code_refs 为空时执行目录下全部 test_*.py
     file_path: str
+    test_code_refs: List[str]
+    # 用例选择模式：full / failed_first / impacted，为空时使用 RUNNER_SELECTION
+    selection: str
+    # 实时结果事件文件，为空时与报告同名（events_*.jsonl）
+    events_path: str
+    # 本次执行的标识，写入每条事件；与报告节点并发消费同一事件文件时两边传同一个值
+    run_id: str
     output_path: str
 
 
+def _test_files(state: RunnerState) -> List[str]:
+    files = state.get("test_code_refs") or []
+    if files:
+        return files
+    path = state.get("file_path") or ""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "test_*.py")))
+    return [path] if path else []
+
+
 def test_code_create_node(state: RunnerState):
-    """测试代码执行节点"""
+    """测试代码执行节点：按选择模式筛选用例，分片到多个 pytest 子进程并行执行，合并报告"""
     print("执行代码")
-    create_date = datetime.now().strftime("%Y%m%d%H%M%S")
     feature_id = state["feature_id"]
-    reporter_file_name = f"./output/reporters/report_{feature_id}_{create_date}.json"
-    pytest.main([
-        state["file_path"],
-        "--json-report",
-        "--json-report-file={}".format(reporter_file_name)
-    ])
-    return state
+    files, first = select_tests(_test_files(state), feature_id, state.get("selection"))
+    run_id = state.get("run_id") or uuid.uuid4().hex[:12]
+    report_path = run_sharded(files, feature_id, first=first, events_path=state.get("events_path"),
+                              run_id=run_id)
+    if report_path:
+        record_baseline(feature_id, files, report_path)
+    return {"output_path": report_path, "run_id": run_id}
 
 
 def create_graph():
@@ -0,0 +1,135 @@
+"""
+生成的测试代码使用的 pytest fixture，由 sharded_runner 在测试目录注入的 conftest.py 引入：
+- browser: 每个 worker 进程只启动一个浏览器（session 级）
+- context / page: 每条用例一个新的 context，用例之间状态隔离
+- 目标页面不是登录页的用例自动加上 storage_state 标记，复用登录态，不再通过 UI 重复登录
+"""
+import os
+import importlib
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import pytest
+from playwright.sync_api import sync_playwright
+
+from gen_test_code_agent import selector_cache
+from run_test_code_agent.case_meta import load_meta
+
+BROWSER_HEADLESS = os.environ.get("BROWSER_HEADLESS", "1") != "0"
+# 登录态文件；不存在时如果配置了 AUTH_SETUP（"模块:函数"，参数为 page），每个 worker 登录一次并保存
+AUTH_STORAGE_STATE = os.environ.get("AUTH_STORAGE_STATE", "./output/auth/storage_state.json")
+AUTH_SETUP = os.environ.get("AUTH_SETUP", "")
+
+CONTEXT_ARGS = {"viewport": {"width": 1280, "height": 800}}
+
+# 登录页 URL 的路径段（逗号分隔，忽略扩展名，如 /user/login.html）
+AUTH_LOGIN_PATHS = {p.strip().lower() for p in os.environ.get(
+    "AUTH_LOGIN_PATHS", "login,signin,sign-in,sign_in,logon,auth").split(",") if p.strip()}
+
+
+def has_login_form(elements: Optional[List[Dict[str, Any]]]) -> bool:
+    """页面上有登录表单：恰好一个可见的密码输入框（注册 / 修改密码页通常有多个）"""
+    passwords = [el for el in elements or [] if (el.get("type") or "").lower() == "password"]
+    return len(passwords) == 1
+
+
+def is_login_page(url: Optional[str], elements: Optional[List[Dict[str, Any]]] = None) -> bool:
+    """按 URL 路径或页面上的登录表单判断是否是登录页"""
+    segments = [os.path.splitext(s)[0].lower() for s in urlparse(url or "").path.split("/") if s]
+    return any(s in AUTH_LOGIN_PATHS for s in segments) or has_login_form(elements)
+
+
+def _latest_elements(url: str) -> List[Dict[str, Any]]:
+    snapshots = selector_cache.load_history(url)["snapshots"]
+    return (snapshots[-1].get("elements") or []) if snapshots else []
+
+
+def needs_login(meta: Dict[str, Any]) -> bool:
+    """
+        用例是否使用保存的登录态：元数据中的 requires_login（true / false）优先；
+        否则目标页面不是登录页时复用登录态，登录页上的用例以未登录状态执行，没有页面 url 时不使用
+    """
+    if isinstance(meta.get("requires_login"), bool):
+        return meta["requires_login"]
+    url = meta.get("url")
+    if not url:
+        return False
+    return not is_login_page(url, _latest_elements(url))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "storage_state(path): 使用保存的登录态创建 browser context")
+
+
+def pytest_collection_modifyitems(config, items):
+    """根据元数据中的目标页面给需要登录的用例加上 storage_state 标记"""
+    cache = {}
+    for item in items:
+        path = str(item.fspath)
+        if path not in cache:
+            cache[path] = load_meta(path)
+        if item.get_closest_marker("storage_state") is None and needs_login(cache[path]):
+            item.add_marker(pytest.mark.storage_state(AUTH_STORAGE_STATE))
+
+
+@pytest.fixture(scope="session")
+def browser():
+    """每个 worker 进程共用一个浏览器"""
+    playwright = sync_playwright().start()
+    browser = playwright.chromium.launch(headless=BROWSER_HEADLESS)
+    yield browser
+    browser.close()
+    playwright.stop()
+
+
+def _run_auth_setup(browser, path: str):
+    """执行 AUTH_SETUP 登录一次并保存登录态（先写临时文件，避免多个 worker 读到写了一半的文件）"""
+    module_name, _, func_name = AUTH_SETUP.partition(":")
+    login = getattr(importlib.import_module(module_name), func_name)
+    context = browser.new_context(**CONTEXT_ARGS)
+    try:
+        login(context.new_page())
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        context.storage_state(path=tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        context.close()
+
+
+@pytest.fixture(scope="session")
+def auth_storage_state(browser):
+    """按登录态文件路径缓存，同一个 worker 内最多登录一次"""
+    prepared = {}
+
+    def get(path: str) -> Optional[str]:
+        if path not in prepared:
+            if not os.path.exists(path) and AUTH_SETUP:
+                print(f"🔑 登录并保存登录态: {path}")
+                _run_auth_setup(browser, path)
+            if not os.path.exists(path):
+                print(f"⚠️ 登录态文件不存在: {path}，用例将以未登录状态执行")
+            prepared[path] = path if os.path.exists(path) else None
+        return prepared[path]
+    return get
+
+
+@pytest.fixture
+def context(browser, request, auth_storage_state):
+    """每条用例一个新的 context，带 storage_state 标记时加载登录态"""
+    args = dict(CONTEXT_ARGS)
+    marker = request.node.get_closest_marker("storage_state")
+    if marker is not None:
+        state = auth_storage_state(marker.args[0] if marker.args else AUTH_STORAGE_STATE)
+        if state:
+            args["storage_state"] = state
+    context = browser.new_context(**args)
+    yield context
+    context.close()
+
+
+@pytest.fixture
+def page(context):
+    page = context.new_page()
+    yield page
+    page.close()
@@ -0,0 +1,17 @@
+import os
+import json
+from typing import Any, Dict
+
+
+def meta_path(test_file: str) -> str:
+    """测试代码旁的用例元数据文件：test_xxx.py -> test_xxx.meta.json"""
+    return os.path.splitext(str(test_file))[0] + ".meta.json"
+
+
+def load_meta(test_file: str) -> Dict[str, Any]:
+    """读取用例元数据（case_id / feature_id / page / url / preconditions / trm_refs），不存在时返回空字典"""
+    try:
+        with open(meta_path(test_file), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,99 @@
+"""
+pytest 插件：每条用例执行完（teardown 结束）立即向 JSONL 事件文件追加一条结果，
+报告和诊断阶段可以边执行边消费，不必等所有分片结束
+由 sharded_runner 通过 -p run_test_code_agent.event_plugin 加载，事件文件由环境变量 RUNNER_EVENTS_FILE 指定，
+RUNNER_RUN_ID / RUNNER_SHARD 为本次执行和分片的标识，写入每条事件的 run_id / shard 字段
+收集结束时写一条 collected 事件（分片内全部 nodeid），分片超时或崩溃时执行器据此找出未完成的用例
+事件的 setup / call / teardown 字段与 pytest-json-report 的 tests 条目一致
+"""
+import os
+import json
+import time
+from typing import Any, Dict
+
+EVENTS_FILE_ENV = "RUNNER_EVENTS_FILE"
+SHARD_ENV = "RUNNER_SHARD"
+RUN_ID_ENV = "RUNNER_RUN_ID"
+
+_fd = None
+_tags: Dict[str, str] = {}
+# nodeid -> {阶段: 结果}，teardown 结束后写出并清除
+_stages: Dict[str, Dict[str, Any]] = {}
+
+
+def write_event(fd: int, event: Dict[str, Any]):
+    """一次 write 写入一整行：O_APPEND 下多个分片进程同时追加也不会交错"""
+    os.write(fd, (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def append_event(path: str, event: Dict[str, Any]):
+    """在插件之外（如执行器主进程）追加事件"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        write_event(fd, event)
+    finally:
+        os.close(fd)
+
+
+def test_outcome(stages: Dict[str, Dict[str, Any]]) -> str:
+    """按 pytest-json-report 的规则合并各阶段结果：setup/teardown 失败为 error"""
+    setup = (stages.get("setup") or {}).get("outcome")
+    if setup == "failed":
+        return "error"
+    if setup == "skipped":
+        return "skipped"
+    outcome = (stages.get("call") or {}).get("outcome", "passed")
+    if outcome == "passed" and (stages.get("teardown") or {}).get("outcome") == "failed":
+        return "error"
+    return outcome
+
+
+def _stage(report) -> Dict[str, Any]:
+    stage = {"duration": report.duration, "outcome": report.outcome}
+    if report.failed:
+        crash = getattr(report.longrepr, "reprcrash", None)
+        if crash is not None:
+            stage["crash"] = {"path": crash.path, "lineno": crash.lineno, "message": crash.message}
+        stage["longrepr"] = str(report.longrepr)
+    return stage
+
+
+def _tagged(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {**event, **_tags}
+
+
+def pytest_configure(config):
+    global _fd
+    path = os.environ.get(EVENTS_FILE_ENV)
+    if path:
+        _fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        for key, env in (("run_id", RUN_ID_ENV), ("shard", SHARD_ENV)):
+            if os.environ.get(env):
+                _tags[key] = os.environ[env]
+
+
+def pytest_unconfigure(config):
+    global _fd
+    if _fd is not None:
+        os.close(_fd)
+        _fd = None
+
+
+def pytest_collection_finish(session):
+    if _fd is None:
+        return
+    write_event(_fd, _tagged({"event": "collected", "time": time.time(), "pid": os.getpid(),
+                              "nodeids": [item.nodeid for item in session.items]}))
+
+
+def pytest_runtest_logreport(report):
+    if _fd is None:
+        return
+    stages = _stages.setdefault(report.nodeid, {})
+    stages[report.when] = _stage(report)
+    if report.when != "teardown":
+        return
+    del _stages[report.nodeid]
+    write_event(_fd, _tagged({"event": "test", "nodeid": report.nodeid, "lineno": report.location[1],
+                              "outcome": test_outcome(stages), "time": time.time(), "pid": os.getpid(),
+                              **stages}))
@@ -0,0 +1,161 @@
+import os
+import glob
+import json
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from utils.trm import TRM_ITEM_KEYS, TRM_SOURCE_FIELDS, load_latest_trm, trm_ref
+from gen_test_code_agent import selector_cache
+from run_test_code_agent.case_meta import load_meta
+from run_test_code_agent.sharded_runner import REPORT_DIR, RUNNER_HISTORY_REPORTS, file_key
+
+# 用例选择模式：
+# full          执行全部用例
+# failed_first  执行全部用例，上次失败的用例排在各分片最前面
+# impacted      只执行上次失败的用例，以及自上次通过后代码、TRM 条目或页面 selector 有变化的用例
+SELECTION_MODES = ("full", "failed_first", "impacted")
+RUNNER_SELECTION = os.environ.get("RUNNER_SELECTION", "full")
+BASELINE_DIR = os.path.join(REPORT_DIR, "baseline")
+
+_FAILED_OUTCOMES = ("failed", "error")
+
+
+def _hash(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def last_outcomes(feature_id: str, report_dir: str = REPORT_DIR, limit: int = None) -> Dict[str, str]:
+    """
+        最近几份报告中每个测试文件的结果（新报告覆盖旧报告），
+        文件内任一用例失败即为 failed
+    """
+    limit = limit or RUNNER_HISTORY_REPORTS
+    files = sorted(glob.glob(os.path.join(report_dir, f"report_{feature_id}_*.json")))
+    outcomes = {}
+    for path in files[-limit:]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                tests = json.load(f).get("tests", [])
+        except (OSError, ValueError):
+            continue
+        per_file = {}
+        for test in tests:
+            key = file_key(test.get("nodeid", ""))
+            failed = test.get("outcome") in _FAILED_OUTCOMES
+            per_file[key] = "failed" if failed or per_file.get(key) == "failed" else "passed"
+        outcomes.update(per_file)
+    return outcomes
+
+
+def trm_hashes(feature_id: str) -> Dict[str, str]:
+    """最新 TRM 中每个条目的内容哈希：{trm_ref: hash}"""
+    trm = load_latest_trm(feature_id) or {}
+    hashes = {}
+    for key in TRM_ITEM_KEYS:
+        for item in trm.get(key) or []:
+            content = {k: v for k, v in item.items() if k not in TRM_SOURCE_FIELDS}
+            hashes[trm_ref(key, item)] = _hash(content)
+    return hashes
+
+
+def selector_fingerprint(url: str) -> Optional[str]:
+    """页面最近一次提取的 selector 快照标识（DOM 指纹，没有时用元素列表哈希）"""
+    if not url:
+        return None
+    snapshots = selector_cache.load_history(url)["snapshots"]
+    if not snapshots:
+        return None
+    latest = snapshots[-1]
+    return latest.get("fingerprint") or _hash(latest.get("elements") or [])
+
+
+def signature(test_file: str, feature_id: str, trm_cache: Dict[str, Dict[str, str]]) -> Dict[str, Any]:
+    """
+        测试文件当前的依赖状态：代码内容、来源 TRM 条目、页面 selector
+        TRM 按本次执行的 feature_id 读取（用例元数据中的 feature_id 是 TRM 内 feature 的 id）
+    """
+    meta = load_meta(test_file)
+    if feature_id not in trm_cache:
+        trm_cache[feature_id] = trm_hashes(feature_id)
+    with open(test_file, "rb") as f:
+        code_hash = hashlib.sha1(f.read()).hexdigest()[:16]
+    return {"code": code_hash,
+            "trm": {ref: trm_cache[feature_id].get(ref) for ref in meta.get("trm_refs") or []},
+            "selectors": selector_fingerprint(meta.get("url"))}
+
+
+def _baseline_file(feature_id: str) -> str:
+    return os.path.join(BASELINE_DIR, f"baseline_{feature_id}.json")
+
+
+def load_baseline(feature_id: str) -> Dict[str, Any]:
+    """上次通过时各测试文件的依赖状态：{file_key: signature}"""
+    try:
+        with open(_baseline_file(feature_id), "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def record_baseline(feature_id: str, files: List[str], report_path: str):
+    """执行后把全部用例通过的测试文件的当前依赖状态记为基线"""
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            tests = json.load(f).get("tests", [])
+    except (OSError, ValueError, TypeError):
+        return
+    failed = {file_key(t.get("nodeid", "")) for t in tests if t.get("outcome") in _FAILED_OUTCOMES}
+    ran = {file_key(t.get("nodeid", "")) for t in tests}
+    baseline = load_baseline(feature_id)
+    trm_cache = {}
+    for path in files:
+        key = file_key(path)
+        if key in ran and key not in failed:
+            baseline[key] = signature(path, feature_id, trm_cache)
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = _baseline_file(feature_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"updated_at": datetime.now().strftime("%Y%m%d%H%M%S"), "files": baseline},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def select_tests(files: List[str], feature_id: str, mode: str = None) -> Tuple[List[str], Set[str]]:
+    """
+        按选择模式筛选测试文件，返回 (要执行的文件, 需要优先执行的文件)
+        impacted 模式下：上次失败、没有基线、或代码/TRM 条目/selector 与基线不同的文件会被执行
+    """
+    mode = mode or RUNNER_SELECTION
+    if mode not in SELECTION_MODES:
+        print(f"⚠️ 未知的选择模式 {mode}，执行全部用例")
+        mode = "full"
+    if mode == "full":
+        return files, set()
+
+    outcomes = last_outcomes(feature_id)
+    failed = {f for f in files if outcomes.get(file_key(f)) == "failed"}
+    if mode == "failed_first":
+        print(f"🔁 上次失败的 {len(failed)} 个文件优先执行")
+        return files, failed
+
+    baseline = load_baseline(feature_id)
+    trm_cache = {}
+    selected = []
+    reasons = {"failed": 0, "new": 0, "changed": 0}
+    for path in files:
+        key = file_key(path)
+        if path in failed:
+            reasons["failed"] += 1
+        elif key not in baseline:
+            reasons["new"] += 1
+        elif baseline[key] != signature(path, feature_id, trm_cache):
+            reasons["changed"] += 1
+        else:
+            continue
+        selected.append(path)
+    print(f"🎯 影响分析: 选中 {len(selected)}/{len(files)} 个文件"
+          f"（上次失败 {reasons['failed']}，无基线 {reasons['new']}，依赖变化 {reasons['changed']}）")
+    return selected, failed
@@ -0,0 +1,335 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import heapq
+import shutil
+import signal
+import uuid
+import subprocess
+import importlib.util
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from run_test_code_agent.event_plugin import EVENTS_FILE_ENV, SHARD_ENV, RUN_ID_ENV, append_event
+
+REPORT_DIR = "./output/reporters"
+# worker 子进程数、单个分片的超时（秒）、单条用例的超时（秒，需要安装 pytest-timeout）
+RUNNER_WORKERS = int(os.environ.get("RUNNER_WORKERS", min(4, os.cpu_count() or 1)))
+RUNNER_SHARD_TIMEOUT = int(os.environ.get("RUNNER_SHARD_TIMEOUT", 900))
+RUNNER_TEST_TIMEOUT = int(os.environ.get("RUNNER_TEST_TIMEOUT", 120))
+# 没有历史耗时的文件按该耗时（秒）估算
+RUNNER_DEFAULT_DURATION = float(os.environ.get("RUNNER_DEFAULT_DURATION", 10))
+# 读取最近多少份报告统计历史耗时
+RUNNER_HISTORY_REPORTS = int(os.environ.get("RUNNER_HISTORY_REPORTS", 10))
+
+# 注入到测试目录的 conftest：每个 worker 一个浏览器、每条用例一个 context、非登录页的用例复用登录态
+CONFTEST_HEADER = "# 由 run_test_code_agent 自动生成，请勿修改\n"
+CONFTEST_CONTENT = (
+    CONFTEST_HEADER +
+    "from run_test_code_agent.browser_fixtures import *  # noqa: F401,F403\n"
+)
+
+# 生成的代码文件名为 test_<case_id>_<时间戳>.py，历史耗时按去掉时间戳后的名称对齐
+_TIMESTAMP_RE = re.compile(r"_\d{14}$")
+
+
+def file_key(path: str) -> str:
+    """测试文件的稳定标识：去掉目录、扩展名和生成时间戳"""
+    stem = os.path.splitext(os.path.basename(path.split("::")[0]))[0]
+    return _TIMESTAMP_RE.sub("", stem)
+
+
+def test_duration(test: Dict[str, Any]) -> float:
+    """单条用例 setup + call + teardown 的耗时"""
+    return sum((test.get(stage) or {}).get("duration", 0.0) for stage in ("setup", "call", "teardown"))
+
+
+def load_durations(report_dir: str = REPORT_DIR, limit: int = None) -> Dict[str, float]:
+    """从最近的报告中统计每个测试文件的耗时（新报告覆盖旧报告）"""
+    limit = limit or RUNNER_HISTORY_REPORTS
+    files = sorted(glob.glob(os.path.join(report_dir, "report_*.json")), key=os.path.getmtime)
+    durations = {}
+    for path in files[-limit:]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                tests = json.load(f).get("tests", [])
+        except (OSError, ValueError):
+            continue
+        per_file = {}
+        for test in tests:
+            key = file_key(test.get("nodeid", ""))
+            per_file[key] = per_file.get(key, 0.0) + test_duration(test)
+        durations.update(per_file)
+    return durations
+
+
+def plan_shards(files: List[str], workers: int, durations: Dict[str, float] = None) -> List[List[str]]:
+    """按历史耗时做 LPT 分配：耗时长的文件优先，每次分给当前总耗时最小的分片"""
+    durations = durations or {}
+    workers = max(1, min(workers, len(files)))
+    heap = [(0.0, index) for index in range(workers)]
+    shards = [[] for _ in range(workers)]
+    ordered = sorted(files, key=lambda f: -durations.get(file_key(f), RUNNER_DEFAULT_DURATION))
+    for path in ordered:
+        load, index = heapq.heappop(heap)
+        shards[index].append(path)
+        heapq.heappush(heap, (load + durations.get(file_key(path), RUNNER_DEFAULT_DURATION), index))
+    return [shard for shard in shards if shard]
+
+
+def ensure_conftest(files: List[str]):
+    """
+        在每个测试文件所在目录写入 conftest.py（已存在且内容一致时跳过）
+        目录中已有用户自己的 conftest.py 时不覆盖，只给出提示
+    """
+    for directory in sorted({os.path.dirname(os.path.abspath(f.split("::")[0])) for f in files}):
+        path = os.path.join(directory, "conftest.py")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except OSError:
+            content = None
+        if content == CONFTEST_CONTENT:
+            continue
+        if content is not None and not content.startswith(CONFTEST_HEADER):
+            print(f"⚠️ {path} 已存在且不是自动生成的，不覆盖；需要共享浏览器 fixture 时请在其中加入: "
+                  f"from run_test_code_agent.browser_fixtures import *")
+            continue
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(CONFTEST_CONTENT)
+
+
+def events_path_for(report_path: str) -> str:
+    """报告对应的实时事件文件：report_xxx.json -> events_xxx.jsonl"""
+    directory, name = os.path.split(report_path)
+    return os.path.join(directory, "events_" + name[len("report_"):-len(".json")] + ".jsonl")
+
+
+def new_run(feature_id: str) -> Tuple[str, str]:
+    """
+        预先生成一次执行的 (run_id, 事件文件路径)，传给 run_sharded 的 run_id / events_path，
+        调用方在执行开始前就能按同一个 run_id 消费事件
+    """
+    create_date = datetime.now().strftime("%Y%m%d%H%M%S")
+    run_id = uuid.uuid4().hex[:12]
+    return run_id, os.path.join(REPORT_DIR, f"events_{feature_id}_{create_date}_{run_id}.jsonl")
+
+
+def _pytest_args(files: List[str], report_path: str, extra_args: List[str] = None) -> List[str]:
+    args = [sys.executable, "-m", "pytest", *files, "-q", "-p", "no:cacheprovider",
+            "-p", "run_test_code_agent.event_plugin",
+            "--json-report", f"--json-report-file={report_path}"]
+    # 单条用例卡住时由 pytest-timeout 结束，分片里其余用例继续执行
+    if RUNNER_TEST_TIMEOUT and importlib.util.find_spec("pytest_timeout"):
+        args.append(f"--timeout={RUNNER_TEST_TIMEOUT}")
+    return args + list(extra_args or [])
+
+
+def _kill(proc: subprocess.Popen):
+    """结束分片进程及其子进程（浏览器等）"""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except OSError:
+        pass
+
+
+def _failed_report(files: List[str], message: str, duration: float) -> Dict[str, Any]:
+    """把没有结果的用例（或整个文件）记为失败"""
+    tests = [{"nodeid": path, "lineno": 0, "outcome": "failed", "keywords": [],
+              "setup": {"duration": 0.0, "outcome": "passed"},
+              "call": {"duration": duration, "outcome": "failed",
+                       "crash": {"path": path, "lineno": 0, "message": message},
+                       "longrepr": message},
+              "teardown": {"duration": 0.0, "outcome": "passed"}}
+             for path in files]
+    return {"exitcode": 1, "duration": duration, "tests": tests,
+            "summary": {"failed": len(tests), "total": len(tests), "collected": len(tests)}}
+
+
+def _emit_failed(events_path: Optional[str], report: Dict[str, Any], run_id: str = None):
+    """分片没有生成报告时，把补记为失败的条目也写入事件文件"""
+    if not events_path:
+        return
+    for test in report["tests"]:
+        append_event(events_path, {"event": "test", "time": time.time(), "run_id": run_id, **test})
+
+
+# 事件中不属于 pytest-json-report tests 条目的字段
+_EVENT_FIELDS = ("event", "time", "pid", "shard", "run_id")
+
+
+def _shard_events(events_path: str, shard_id: str) -> Tuple[Optional[List[str]], Dict[str, Dict[str, Any]]]:
+    """事件文件中该分片收集到的 nodeid（没有收集事件时为 None）和已完成用例的结果"""
+    collected, finished = None, {}
+    try:
+        with open(events_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("shard") != shard_id:
+                    continue
+                if event.get("event") == "collected":
+                    collected = event.get("nodeids") or []
+                elif event.get("event") == "test":
+                    finished[event["nodeid"]] = {k: v for k, v in event.items() if k not in _EVENT_FIELDS}
+    except OSError:
+        pass
+    return collected, finished
+
+
+def _recover_report(files: List[str], events_path: str, shard_id: str, message: str,
+                    duration: float) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+        分片超时或崩溃、没有生成报告时，从事件文件重建报告：已完成的用例保留其结果，
+        只把未完成的用例记为失败（收集前就中断时，没有任何完成用例的文件整体记为失败）
+        返回 (分片报告, 补记为失败的部分)
+    """
+    collected, finished = _shard_events(events_path, shard_id)
+    if collected is None:
+        done = {file_key(nodeid) for nodeid in finished}
+        unfinished = [f for f in files if file_key(f) not in done]
+    else:
+        unfinished = [nodeid for nodeid in collected if nodeid not in finished]
+    failed = _failed_report(unfinished, message, duration)
+    tests = list(finished.values()) + failed["tests"]
+    summary = {"total": len(tests), "collected": len(tests)}
+    for test in tests:
+        summary[test["outcome"]] = summary.get(test["outcome"], 0) + 1
+    print(f"🩹 从事件恢复 {len(finished)} 条已完成的用例，{len(unfinished)} 条未完成记为失败")
+    return {"exitcode": 1, "duration": duration, "tests": tests, "summary": summary}, failed
+
+
+def run_shard(index: int, files: List[str], report_path: str, timeout: int = None,
+              extra_args: List[str] = None, events_path: str = None, run_id: str = None) -> Dict[str, Any]:
+    """
+        在独立子进程中执行一个分片，返回该分片的 JSON 报告；events_path 不为空时实时写入用例结果事件
+        （为空时写入分片自己的临时事件文件），分片超时或崩溃时据此保留已完成用例的结果
+    """
+    timeout = timeout or RUNNER_SHARD_TIMEOUT
+    start = time.monotonic()
+    print(f"▶️ 分片 {index}: {len(files)} 个文件")
+    shard_id = uuid.uuid4().hex[:12]
+    shard_events = events_path or os.path.splitext(report_path)[0] + ".events.jsonl"
+    env = dict(os.environ)
+    env[EVENTS_FILE_ENV] = os.path.abspath(shard_events)
+    env[SHARD_ENV] = shard_id
+    if run_id:
+        env[RUN_ID_ENV] = run_id
+    try:
+        proc = subprocess.Popen(_pytest_args(files, report_path, extra_args),
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env,
+                                start_new_session=(os.name == "posix"))
+        try:
+            output, _ = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill(proc)
+            proc.communicate()
+            print(f"⏱️ 分片 {index} 超过 {timeout} 秒，已终止")
+            report, failed = _recover_report(files, shard_events, shard_id,
+                                             f"Timeout: shard {index} exceeded {timeout}s",
+                                             time.monotonic() - start)
+            _emit_failed(events_path, failed, run_id)
+            return report
+        duration = time.monotonic() - start
+        try:
+            with open(report_path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            tail = output.decode("utf-8", errors="replace")[-2000:]
+            print(f"💥 分片 {index} 异常退出（exitcode={proc.returncode}），没有生成报告")
+            report, failed = _recover_report(files, shard_events, shard_id,
+                                             f"Crash: shard {index} exited with {proc.returncode}\n{tail}",
+                                             duration)
+            _emit_failed(events_path, failed, run_id)
+            return report
+        print(f"✅ 分片 {index} 完成: {duration:.1f}s, exitcode={proc.returncode}")
+        return report
+    finally:
+        if not events_path:
+            try:
+                os.remove(shard_events)
+            except OSError:
+                pass
+
+
+def merge_reports(reports: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    """合并各分片报告，结构与 pytest-json-report 一致"""
+    summary = {}
+    merged = {"created": time.time(), "duration": duration, "exitcode": 0,
+              "root": os.getcwd(), "environment": {}, "summary": summary,
+              "collectors": [], "tests": [], "warnings": []}
+    for report in reports:
+        merged["exitcode"] = max(merged["exitcode"], report.get("exitcode", 0))
+        merged["environment"] = merged["environment"] or report.get("environment", {})
+        for key in ("collectors", "tests", "warnings"):
+            merged[key].extend(report.get(key) or [])
+        for key, value in (report.get("summary") or {}).items():
+            if isinstance(value, (int, float)):
+                summary[key] = summary.get(key, 0) + value
+    return merged
+
+
+def run_sharded(files: List[str], feature_id: str, workers: int = None, timeout: int = None,
+                extra_args: List[str] = None, first: Set[str] = None,
+                events_path: str = None, run_id: str = None) -> Optional[str]:
+    """
+        将测试文件按历史耗时分片，在多个 pytest 子进程中并行执行，
+        合并报告写入 output/reporters/report_<feature_id>_<时间>.json 并返回路径
+        first 中的文件（如上次失败的用例）排在所在分片的最前面
+        执行过程中每条用例的结果实时追加到 events_path（默认与报告同名的 events_*.jsonl），
+        开始时写入 run_started 事件、结束时写入 run_finished 事件，所有事件带 run_id（为空时自动生成）；
+        同一个事件文件被多次执行复用时，消费方按 run_id 只读取本次执行的事件
+    """
+    files = [f for f in files or [] if f]
+    create_date = datetime.now().strftime("%Y%m%d%H%M%S")
+    report_path = os.path.join(REPORT_DIR, f"report_{feature_id}_{create_date}.json")
+    events_path = events_path or events_path_for(report_path)
+    run_id = run_id or uuid.uuid4().hex[:12]
+    os.makedirs(os.path.dirname(os.path.abspath(events_path)), exist_ok=True)
+    append_event(events_path, {"event": "run_started", "time": time.time(), "run_id": run_id,
+                               "feature_id": feature_id, "report_path": report_path, "files": len(files)})
+    if not files:
+        print("没有需要执行的测试文件")
+        append_event(events_path, {"event": "run_finished", "time": time.time(), "run_id": run_id,
+                                   "report_path": None})
+        return None
+    shard_dir = os.path.join(REPORT_DIR, "shards", f"{feature_id}_{create_date}")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    ensure_conftest(files)
+    if RUNNER_TEST_TIMEOUT and not importlib.util.find_spec("pytest_timeout"):
+        print(f"⚠️ RUNNER_TEST_TIMEOUT={RUNNER_TEST_TIMEOUT} 需要 pytest-timeout，当前未安装："
+              f"单条用例卡住时会拖到整个分片超时（{timeout or RUNNER_SHARD_TIMEOUT} 秒）")
+    shards = plan_shards(files, workers or RUNNER_WORKERS, load_durations())
+    if first:
+        shards = [sorted(shard, key=lambda f: f not in first) for shard in shards]
+    print(f"🧩 {len(files)} 个测试文件分为 {len(shards)} 个分片")
+    print(f"📡 实时结果事件: {events_path}")
+    start = time.monotonic()
+    written = None
+    try:
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            futures = [pool.submit(run_shard, index, shard, os.path.join(shard_dir, f"shard_{index}.json"),
+                                   timeout, extra_args, events_path, run_id)
+                       for index, shard in enumerate(shards)]
+            reports = [future.result() for future in futures]
+        merged = merge_reports(reports, time.monotonic() - start)
+
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(merged, f, ensure_ascii=False, indent=2)
+        written = report_path
+    finally:
+        append_event(events_path, {"event": "run_finished", "time": time.time(), "run_id": run_id,
+                                   "report_path": written})
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    print(f"📄 合并报告: {report_path}（{merged['summary']}）")
+    return report_path
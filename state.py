@@ -105,6 +105,8 @@ class GlobalState(TypedDict):
     # ===== Shared State（数据面）=====
     feature_id: str
     fragment: str
+    # {页面名称: url}，测试代码生成时按页面提取 selector
+    page_urls: Optional[Dict[str, str]]
     doc_parser_result: Optional[Dict[str, Any]]
     test_case_result: Optional[List[Any]]
     test_code_refs: Optional[List[Any]]
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from gen_test_report_agent import analytics
+from gen_test_report_agent.analytics import FAILED, MISSING, PASSED, flip_rate_map, flip_rates, load_matrix
+from gen_test_report_agent.history_store import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.sqlite3"), window=4)
+
+
+def _ingest(store, outcomes):
+    """每个元素是一次执行：{nodeid: outcome}"""
+    return [store.ingest_tests([{"nodeid": n, "outcome": o, "call": {"duration": 1.0}}
+                                for n, o in run.items()]) for run in outcomes]
+
+
+def test_flip_rates_skip_missing_and_skipped():
+    outcome = np.array([[PASSED, MISSING, FAILED, 2, PASSED],
+                        [PASSED, PASSED, PASSED, PASSED, PASSED],
+                        [MISSING, MISSING, MISSING, MISSING, FAILED]], dtype=np.int8)
+    rates, counts = flip_rates(outcome)
+    assert rates.tolist() == [1.0, 0.0, 0.0]
+    assert counts.tolist() == [3, 5, 1]
+
+
+def test_flip_rate_map_uses_history_window(store):
+    # 早期频繁翻转，最近 4 次稳定通过：窗口内不算 flaky
+    _ingest(store, [{"a.py::t": "passed"}, {"a.py::t": "failed"}] * 3 + [{"a.py::t": "passed"}] * 4)
+    assert flip_rate_map(store=store) == {"a::t": (0.0, 4)}
+    rate, runs = flip_rate_map(store=store, runs=10)["a::t"]
+    assert runs == 10 and rate == pytest.approx(6 / 9)
+    assert store.flip_rate("a.py::t") == (0.0, 4)
+
+
+def test_regenerated_files_share_a_row(store):
+    _ingest(store, [{"test_TC-1_20260101000000.py::t": "passed"},
+                    {"test_TC-1_20260101000000.py::t": "passed", "test_TC-1_20260102000000.py::t": "failed"},
+                    {"test_TC-1_20260102000000.py::t": "passed"}])
+    matrix = load_matrix(store, use_cache=False)
+    assert matrix.keys == ["test_TC-1::t"]
+    assert matrix.outcome.tolist() == [[PASSED, FAILED, PASSED]]
+
+
+def test_cache_is_kept_per_window_and_updated_incrementally(store):
+    _ingest(store, [{"a::t": "passed", "a::u": "failed"}] * 3)
+    flip_rate_map(store=store)
+    analytics.analyze(store=store)
+    directory = os.path.dirname(store.path)
+    assert {"matrix_all_4.npz", f"matrix_all_{analytics.ANALYTICS_RUNS}.npz"} <= set(os.listdir(directory))
+
+    _ingest(store, [{"a::t": "failed"}, {"a::t": "passed", "a::v": "passed"}])
+    cached = load_matrix(store, runs=4)
+    fresh = load_matrix(store, runs=4, use_cache=False)
+    assert cached.run_ids == fresh.run_ids and len(cached.run_ids) == 4
+    assert sorted(zip(cached.keys, cached.outcome.tolist())) == sorted(zip(fresh.keys, fresh.outcome.tolist()))
+
+
+def test_summarize_reports_flaky_tests_by_stable_key(store):
+    _ingest(store, [{"codes/test_TC-1_20260101000000.py::t": outcome}
+                    for outcome in ["passed", "failed"] * 3])
+    summary = analytics.analyze(store=store)
+    assert summary["runs"] == 6 and summary["tests"] == 1
+    assert summary["flaky_count"] == 1
+    assert summary["flaky"][0]["test_key"] == "test_TC-1::t"
@@ -0,0 +1,59 @@
+from requirement_analyzer_agent.api_parser import parse_apis
+
+DOC = """# 接口
+
+## 1.2 退出登录
+
+POST /api/logout 退出登录
+
+| 参数 | 类型 | 说明 |
+|---|---|---|
+| token | string | 登录令牌 |
+
+```json
+{"code": 0, "msg": "ok"}
+```
+
+## 查询订单
+
+接口地址：GET /api/orders/{id}
+请求参数：
+| name | type | desc |
+| --- | --- | --- |
+| id | int | 订单 id |
+返回示例：
+{
+  "id": 1,
+  "note": "a } b"
+}
+"""
+
+
+def test_parse_apis_extracts_name_description_params_and_examples():
+    apis, complete = parse_apis(DOC)
+    assert [(a["method"], a["url"]) for a in apis] == [("POST", "/api/logout"), ("GET", "/api/orders/{id}")]
+
+    logout, orders = apis
+    assert logout["name"] == "退出登录"
+    assert logout["description"] == "退出登录"
+    assert logout["request_params"] == [{"param": "token", "param_type": "string", "description": "登录令牌"}]
+    assert logout["response_examples"] == ['{"code": 0, "msg": "ok"}']
+
+    assert orders["name"] == "查询订单"
+    assert orders["request_params"] == [{"param": "id", "param_type": "int", "description": "订单 id"}]
+    assert orders["response_examples"] == ['{\n  "id": 1,\n  "note": "a } b"\n}']
+    # 第二个 API 没有说明文字
+    assert orders["description"] == ""
+    assert complete is False
+
+
+def test_parse_apis_skips_code_fences_and_duplicates():
+    doc = "## 登录\n\nPOST /api/login 用户登录\n\n```\nGET /api/in-code\n```\n\nPOST /api/login\n"
+    apis, complete = parse_apis(doc)
+    assert [(a["method"], a["url"]) for a in apis] == [("POST", "/api/login")]
+    assert apis[0]["description"] == "用户登录"
+    assert complete is True
+
+
+def test_parse_apis_without_api_lines():
+    assert parse_apis("# 标题\n\n只有说明文字") == ([], True)
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+pytest.importorskip("playwright.sync_api")
+
+from gen_test_code_agent import selector_cache
+from run_test_code_agent import browser_fixtures
+from run_test_code_agent.browser_fixtures import is_login_page, needs_login
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(selector_cache, "SELECTOR_CACHE_DIR", str(tmp_path / "selector_cache"))
+    monkeypatch.setattr(selector_cache, "SELECTOR_CACHE_ENABLED", True)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://shop.example.com/login", True),
+    ("https://shop.example.com/user/Login.html?next=/cart", True),
+    ("https://shop.example.com/sign-in", True),
+    ("https://shop.example.com/cart", False),
+    # 查询参数和路径中的子串不算登录页
+    ("https://shop.example.com/cart?from=login", False),
+    ("https://shop.example.com/loginhistory", False),
+])
+def test_is_login_page_by_url_path(url, expected):
+    assert is_login_page(url) is expected
+
+
+def test_is_login_page_by_login_form():
+    login_form = [{"tag_name": "input", "type": "text", "name": "user"},
+                  {"tag_name": "input", "type": "password", "name": "pwd"}]
+    change_password = login_form + [{"tag_name": "input", "type": "password", "name": "new_pwd"}]
+    assert is_login_page("https://example.com/portal", login_form) is True
+    assert is_login_page("https://example.com/account", change_password) is False
+    assert is_login_page("https://example.com/account", []) is False
+
+
+def test_needs_login_ignores_precondition_wording():
+    meta = {"url": "https://example.com/orders", "preconditions": ["用户未处于登录状态"]}
+    assert needs_login(meta) is True
+    assert needs_login({"url": "https://example.com/login", "preconditions": ["用户已登录"]}) is False
+    assert needs_login({"preconditions": ["用户已登录"]}) is False
+
+
+def test_needs_login_explicit_flag_wins():
+    assert needs_login({"url": "https://example.com/orders", "requires_login": False}) is False
+    assert needs_login({"url": "https://example.com/login", "requires_login": True}) is True
+
+
+def test_needs_login_uses_cached_login_form():
+    url = "https://example.com/portal"
+    assert needs_login({"url": url}) is True
+    selector_cache.store(url, [{"tag_name": "input", "type": "password", "name": "pwd"}])
+    assert needs_login({"url": url}) is False
+
+
+class _Item:
+    def __init__(self, path):
+        self.fspath = path
+        self.markers = []
+
+    def get_closest_marker(self, name):
+        return next((m for m in self.markers if m.name == name), None)
+
+    def add_marker(self, marker):
+        self.markers.append(marker.mark)
+
+
+def test_collection_marks_only_cases_that_need_login(tmp_path, pytestconfig):
+    browser_fixtures.pytest_configure(pytestconfig)
+    pages = {"test_orders": "https://example.com/orders", "test_login": "https://example.com/login"}
+    items = []
+    for name, url in pages.items():
+        (tmp_path / f"{name}.meta.json").write_text(json.dumps({"url": url}), encoding="utf-8")
+        items.append(_Item(str(tmp_path / f"{name}.py")))
+    browser_fixtures.pytest_collection_modifyitems(None, items)
+    marked = [item.get_closest_marker("storage_state") for item in items]
+    assert marked[0].args == (browser_fixtures.AUTH_STORAGE_STATE,)
+    assert marked[1] is None
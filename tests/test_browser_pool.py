@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+from gen_test_code_agent import browser_pool
+from gen_test_code_agent.browser_pool import BrowserPool
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+
+    async def close(self):
+        self.context.pages.remove(self)
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+        self.closed = False
+
+    async def new_page(self):
+        page = FakePage(self)
+        self.pages.append(page)
+        return page
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **options):
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.connected = False
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.browsers = []
+        self.chromium = self
+        self.stopped = False
+
+    async def start(self):
+        return self
+
+    async def launch(self, headless=True):
+        browser = FakeBrowser()
+        self.browsers.append(browser)
+        return browser
+
+    async def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+    fake = FakePlaywright()
+    monkeypatch.setattr(browser_pool, "async_playwright", lambda: fake)
+    return fake
+
+
+def test_leases_wait_for_a_free_context(playwright):
+    async def main():
+        pool = BrowserPool(browsers=1, contexts_per_browser=2, recycle_pages=10)
+        active = peak = 0
+
+        async def job():
+            nonlocal active, peak
+            async with pool.lease() as context:
+                active += 1
+                peak = max(peak, active)
+                await context.new_page()
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*[job() for _ in range(6)])
+        await pool.close()
+        return pool, peak
+
+    pool, peak = asyncio.run(main())
+    assert peak == 2
+    assert pool.stats["leases"] == 6 and pool.stats["contexts_created"] == 2
+    assert len(playwright.browsers) == 1 and playwright.stopped
+
+
+def test_contexts_are_recycled_and_pages_closed(playwright):
+    async def main():
+        async with BrowserPool(browsers=1, contexts_per_browser=1, recycle_pages=2) as pool:
+            contexts = []
+            for _ in range(5):
+                async with pool.lease() as context:
+                    await context.new_page()
+                    contexts.append(context)
+            assert not contexts[0].pages
+            return pool, contexts
+
+    pool, contexts = asyncio.run(main())
+    assert [id(c) for c in contexts[:2]] == [id(contexts[0])] * 2
+    assert contexts[2] is not contexts[0] and contexts[0].closed
+    assert pool.stats["contexts_recycled"] == 2
+
+
+def test_failed_lease_drops_the_context(playwright):
+    async def main():
+        async with BrowserPool(browsers=1, contexts_per_browser=1) as pool:
+            with pytest.raises(RuntimeError):
+                async with pool.lease() as first:
+                    raise RuntimeError("page crashed")
+            async with pool.lease() as second:
+                pass
+            return first, second
+
+    first, second = asyncio.run(main())
+    assert first.closed and second is not first
+
+
+def test_disconnected_browser_is_relaunched(playwright):
+    async def main():
+        async with BrowserPool(browsers=1, contexts_per_browser=1) as pool:
+            async with pool.lease() as first:
+                pass
+            playwright.browsers[0].connected = False
+            async with pool.lease() as second:
+                pass
+            return pool, first, second
+
+    pool, first, second = asyncio.run(main())
+    assert len(playwright.browsers) == 2 and pool.stats["browsers_relaunched"] == 1
+    assert second is not first and second in playwright.browsers[1].contexts
+
+
+def test_shared_pool_per_loop_and_sync_entry(playwright):
+    async def use_pool():
+        pool = browser_pool.get_browser_pool()
+        assert browser_pool.get_browser_pool() is pool
+        async with pool.lease():
+            pass
+        return pool
+
+    first = browser_pool.run_sync(use_pool())
+    # 同步入口多次调用复用后台 loop 上的同一个浏览器池
+    assert browser_pool.run_sync(use_pool()) is first
+    assert len(playwright.browsers) == 1
+    browser_pool.close_sync_browser_pool()
+    assert playwright.stopped and browser_pool.run_sync(use_pool()) is not first
+    browser_pool.close_sync_browser_pool()
@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("langchain_openai")
+
+from gen_test_case_agent.agent import case_id, merge, slice_trm
+
+TRM = {
+    "features": [{"id": "F1", "name": "登录"}, {"id": "F2", "name": "注册"}],
+    "flows": [{"flow_id": f"FLOW_{i}", "feature_id": "F1", "source_section": "s1", "section_hash": "h"}
+              for i in range(5)],
+    "api": [{"method": "post", "url": "/api/login", "feature_id": "F1"}],
+    "rules": [{"rule_id": "RULE_1", "feature_id": "F2"}],
+    "exceptions": [{"exception_id": "EXC_1", "feature_id": "F3"}],
+}
+
+
+def _results(slices, cases_for):
+    return [{"slice_index": index, "feature_id": s["feature_id"], "trm_refs": s["trm_refs"],
+             "cases": cases_for(s)} for index, s in enumerate(slices)]
+
+
+def test_slice_trm_groups_items_per_feature():
+    slices = slice_trm(TRM, slice_size=4)
+    assert [(s["feature_id"], s["trm_refs"]) for s in slices] == [
+        ("F1", ["FLOW_0", "FLOW_1", "FLOW_2", "FLOW_3"]),
+        ("F1", ["FLOW_4", "POST /api/login"]),
+        ("F2", ["RULE_1"]),
+        ("F3", ["EXC_1"]),
+    ]
+    first = slices[0]["trm_slice"]
+    assert first["features"] == [{"id": "F1", "name": "登录"}]
+    assert "source_section" not in first["flows"][0] and first["api"] == []
+    # 只有 feature 没有条目时也生成一个分片
+    assert slice_trm({"features": [{"id": "F9"}]}) == [
+        {"feature_id": "F9", "trm_slice": {"features": [{"id": "F9"}], "flows": [], "api": [], "rules": [],
+                                           "exceptions": []}, "trm_refs": []}]
+
+
+def test_case_id_ignores_ref_order_and_title_formatting():
+    assert case_id("123", ["B", "A"], "用户 登录-成功") == case_id("123", ["A", "B"], "用户登录成功")
+    assert case_id("123", ["A"], "登录") != case_id("123", ["A", "B"], "登录")
+    assert case_id("123", [], "登录", "F1") != case_id("123", [], "登录", "F2")
+    assert case_id("123", ["A"], "登录").startswith("TC-123-")
+
+
+@pytest.mark.parametrize("slice_size", [1, 2, 6])
+def test_case_ids_do_not_depend_on_slice_size(slice_size):
+    def cases_for(s):
+        cases = [{"title": f"覆盖 {ref}", "trm_refs": [ref, "UNKNOWN"]} for ref in s["trm_refs"]]
+        # LLM 没有返回 trm_refs 的用例
+        return cases + [{"title": f"{s['feature_id']} 通用检查"}]
+
+    def ids(size):
+        state = {"feature_id": "123", "slice_results": _results(slice_trm(TRM, size), cases_for)}
+        cases = merge(state)["test_case_result"]
+        return {c["title"]: (c["case_id"], tuple(c["trm_refs"])) for c in cases if "通用" not in c["title"]}, \
+            {c["case_id"] for c in cases if "通用" in c["title"] and c["case_id"].count("-") == 2}
+
+    assert ids(slice_size) == ids(3)
+
+
+def test_merge_numbers_duplicates_and_keeps_empty_refs():
+    slices = slice_trm(TRM, 6)
+    state = {"feature_id": "123", "slice_results": _results(
+        slices, lambda s: [{"title": "登录", "trm_refs": ["FLOW_0"]}, {"title": "登录", "trm_refs": ["FLOW_0"]},
+                           {"title": "通用", "trm_refs": ["RULE_1"]}] if s["feature_id"] == "F1" else [])}
+    cases = merge(state)["test_case_result"]
+    assert cases[1]["case_id"] == cases[0]["case_id"] + "-2"
+    # 不属于该分片的引用被丢弃，case_id 按 feature 和标题计算
+    assert cases[2]["trm_refs"] == [] and cases[2]["feature_id"] == "F1"
+    assert cases[2]["case_id"] == case_id("123", [], "通用", "F1")
@@ -0,0 +1,106 @@
+from requirement_analyzer_agent.chunker import parse_sections, plan_reuse, section_hash, split_markdown
+
+DOC = """# 用户中心
+
+概述
+
+## 登录
+
+登录说明
+
+```
+# 代码块中的注释
+```
+
+## 登录
+
+重复的标题
+
+## 注册
+
+注册说明
+"""
+
+
+def test_parse_sections_ignores_headings_in_code_fence():
+    root = parse_sections(DOC)
+    assert [c.title for c in root.children] == ["用户中心"]
+    assert [c.title for c in root.children[0].children] == ["登录", "登录", "注册"]
+    assert "# 代码块中的注释" in root.children[0].children[0].body()
+
+
+def test_small_document_is_one_chunk():
+    chunks = list(split_markdown(DOC, max_tokens=1000))
+    assert len(chunks) == 1
+    assert chunks[0]["text"].startswith("# 用户中心")
+    assert chunks[0]["section_hash"] == section_hash(chunks[0]["text"])
+
+
+def test_sections_split_with_breadcrumb_and_unique_names():
+    doc = "# 根\n\n" + "\n\n".join(f"## 页面\n\n{'内容' * 20}{i}" for i in range(3))
+    chunks = list(split_markdown(doc, max_tokens=50, overlap_tokens=0))
+    assert [c["section"] for c in chunks] == ["根 > 页面", "根 > 页面 ~2", "根 > 页面 ~3"]
+    for i, chunk in enumerate(chunks):
+        assert chunk["text"].startswith("# 根\n\n## 页面")
+        assert chunk["text"].endswith(f"{i}")
+
+
+def test_long_body_split_with_overlap():
+    doc = "# A\n\n" + "\n\n".join(f"p{i} " + "x" * 30 for i in range(8))
+    chunks = list(split_markdown(doc, max_tokens=40, overlap_tokens=12))
+    assert [c["section"] for c in chunks] == ["A > #1", "A > #2", "A > #3"]
+    paragraphs = [c["text"].split("\n\n")[1:] for c in chunks]
+    # 相邻分片首尾重叠一个段落，全部段落都被覆盖
+    assert paragraphs[0][-1] == paragraphs[1][0]
+    assert paragraphs[1][-1] == paragraphs[2][0]
+    covered = {p.split()[0] for part in paragraphs for p in part}
+    assert covered == {f"p{i}" for i in range(8)}
+
+
+def test_section_hash_tracks_content():
+    before = {c["section"]: c["section_hash"] for c in split_markdown(DOC, max_tokens=12)}
+    after = {c["section"]: c["section_hash"]
+             for c in split_markdown(DOC.replace("注册说明", "注册说明（新）"), max_tokens=12)}
+    assert before.keys() == after.keys()
+    changed = {name for name in before if before[name] != after[name]}
+    assert changed == {"用户中心 > 注册"}
+
+
+def _doc(b="乙" * 10, extra=""):
+    return f"# 根\n\n## A\n\n{'甲' * 10}\n\n## B\n\n{b}\n\n## C\n\n{'丙' * 10}\n\n## D\n\n{'丁' * 10}{extra}\n"
+
+
+def _chunks(doc):
+    return list(split_markdown(doc, max_tokens=30, overlap_tokens=0))
+
+
+def _sections(chunks):
+    return {c["section"]: c["section_hashes"] for c in chunks}
+
+
+def test_packed_chunk_records_a_hash_per_section():
+    chunks = _chunks(_doc())
+    assert [c["section"] for c in chunks] == ["根 > A | 根 > B", "根 > C | 根 > D"]
+    assert list(chunks[0]["section_hashes"]) == ["根 > A", "根 > B"]
+    assert chunks[0]["section_hashes"]["根 > A"] == section_hash("## A\n\n" + "甲" * 10)
+    # 重复的章节名追加序号
+    doc = "# R\n\n正文" + "字" * 20 + "\n\n## X\n\n甲\n\n## X\n\n乙\n"
+    chunk = list(split_markdown(doc, max_tokens=20, overlap_tokens=0))[-1]
+    assert list(chunk["section_hashes"]) == ["R > X", "R > X ~2"]
+
+
+def test_plan_reuse_skips_chunks_whose_sections_are_unchanged():
+    previous = _sections(_chunks(_doc()))
+    assert plan_reuse(_chunks(_doc()), previous) == (set(previous), set(previous))
+    # 新增章节只影响它所在的分片
+    assert plan_reuse(_chunks(_doc(extra="\n\n## E\n\n戊戊")), previous) == ({"根 > A | 根 > B"}, {"根 > A | 根 > B"})
+    # 旧格式（分片级哈希字符串）全部重新抽取
+    assert plan_reuse(_chunks(_doc()), {name: "hash" for name in previous}) == (set(), set())
+
+
+def test_plan_reuse_reextracts_sections_whose_old_chunk_changed():
+    previous = _sections(_chunks(_doc()))
+    chunks = _chunks(_doc("乙" * 30))
+    assert [c["section"] for c in chunks] == ["根 > A", "根 > B", "根 > C | 根 > D"]
+    # A 未变化，但它的旧条目和变化的 B 在同一个旧分片中，不能单独保留
+    assert plan_reuse(chunks, previous) == ({"根 > C | 根 > D"}, {"根 > C | 根 > D"})
@@ -0,0 +1,77 @@
+from gen_test_code_agent.code_renderer import build_plan, render_plan, resolve_element, syntax_error, unresolved_items
+
+URL = "http://localhost:5173/login"
+ELEMENTS = [
+    {"element_type": "text", "tag_name": "input", "placeholder": "请输入账号", "name": "username"},
+    {"element_type": "password", "tag_name": "input", "placeholder": "请输入密码", "name": "pwd"},
+    {"element_type": "button", "tag_name": "button", "text": "登录", "id": "loginBtn"},
+    {"element_type": "link", "tag_name": "a", "text": "忘记密码"},
+    {"element_type": "select", "tag_name": "select", "name": "region"},
+]
+
+CASE = {
+    "case_id": "TC-123-abc",
+    "title": "正确账号密码登录成功",
+    "steps": [
+        {"action": "input", "target": "账号输入框", "value": "13800000000"},
+        {"action": "input", "target": "密码输入框", "value": "abc12345"},
+        {"action": "select", "target": "地区", "value": "cn"},
+        {"action": "click", "target": "登录按钮"},
+        {"action": "click", "target": "不存在的按钮"},
+    ],
+    "assertions": [{"type": "page", "expected": "跳转到 /home 页面"},
+                   {"type": "element", "expected": "提示“登录成功”"}],
+}
+
+
+def test_resolve_element_filters_by_action_type():
+    assert resolve_element("密码", ELEMENTS, "input")["name"] == "pwd"
+    assert resolve_element("忘记密码", ELEMENTS, "click")["text"] == "忘记密码"
+    assert resolve_element("密码", ELEMENTS, "select")["name"] == "region"
+    assert resolve_element("头像", ELEMENTS, "upload") is None
+
+
+def test_build_plan_resolves_steps_and_assertions():
+    plan = build_plan(CASE, URL, ELEMENTS)
+    lines = [block["lines"] for block in plan]
+    assert lines[0] == [f"page.goto({URL!r})"]
+    assert lines[1] == ["page.locator('input[name=\"username\"]').first.fill('13800000000')"]
+    assert lines[3] == ["page.locator('select[name=\"region\"]').first.select_option('cn')"]
+    assert lines[4] == ["page.locator('#loginBtn').first.click()"]
+    assert lines[5] is None
+    assert lines[6] == ["expect(page).to_have_url(re.compile('/home'))"]
+    assert lines[7] == ["expect(page.get_by_text('登录成功').first).to_be_visible()"]
+    assert unresolved_items(plan) == [CASE["steps"][4]]
+    assert build_plan({"steps": []}, URL, ELEMENTS) is None
+
+
+def test_goto_and_wait_steps():
+    plan = build_plan({"steps": [{"action": "goto", "target": "注册页 /register"},
+                                 {"action": "wait", "value": "500"},
+                                 {"action": "wait", "target": "登录按钮"},
+                                 {"action": "wait"}]}, URL, ELEMENTS)
+    assert [block["lines"] for block in plan] == [
+        ["page.goto('http://localhost:5173/register')"],
+        ["page.wait_for_timeout(500)"],
+        ["page.locator('#loginBtn').first.wait_for()"],
+        ['page.wait_for_load_state("networkidle")'],
+    ]
+
+
+def test_render_plan_fills_unresolved_blocks_and_compiles():
+    plan = build_plan(CASE, URL, ELEMENTS)
+    code = render_plan(CASE, plan, ["```python\n    page.get_by_role('button').click()\n```"])
+    assert "def test_tc_123_abc(page: Page):" in code
+    assert '    """正确账号密码登录成功"""' in code
+    assert "    page.get_by_role('button').click()" in code
+    assert "    # click 不存在的按钮" in code
+    assert syntax_error(code) is None
+
+
+def test_render_plan_skips_missing_or_broken_snippets():
+    plan = build_plan(CASE, URL, ELEMENTS)
+    for fills in ([], ["if True:\npage.click("]):
+        code = render_plan(CASE, plan, fills)
+        assert "    pytest.skip('无法生成步骤代码: click 不存在的按钮')" in code
+        assert syntax_error(code) is None
+    assert syntax_error("def f(:\n") is not None
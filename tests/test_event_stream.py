@@ -0,0 +1,161 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from gen_test_report_agent import diagnose, live
+from gen_test_report_agent.diagnose import diagnose_events, finished_report, follow_events
+from gen_test_report_agent.history_store import HistoryStore
+from run_test_code_agent import event_plugin
+from run_test_code_agent.event_plugin import append_event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    monkeypatch.setattr(diagnose, "history_store", store)
+    return store
+
+
+def _test_event(run_id, nodeid, outcome="passed"):
+    event = {"event": "test", "run_id": run_id, "nodeid": nodeid, "outcome": outcome,
+             "call": {"duration": 0.1, "outcome": outcome}}
+    if outcome == "failed":
+        event["call"]["crash"] = {"message": "AssertionError: assert 1 == 2"}
+    return event
+
+
+def _write_report(path, tests):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"tests": tests}, f)
+
+
+@pytest.mark.parametrize("stages, expected", [
+    ({"setup": {"outcome": "passed"}, "call": {"outcome": "passed"}, "teardown": {"outcome": "passed"}}, "passed"),
+    ({"setup": {"outcome": "failed"}, "teardown": {"outcome": "passed"}}, "error"),
+    ({"setup": {"outcome": "skipped"}, "teardown": {"outcome": "passed"}}, "skipped"),
+    ({"setup": {"outcome": "passed"}, "call": {"outcome": "failed"}, "teardown": {"outcome": "passed"}}, "failed"),
+    ({"setup": {"outcome": "passed"}, "call": {"outcome": "passed"}, "teardown": {"outcome": "failed"}}, "error"),
+])
+def test_outcome_follows_json_report_rules(stages, expected):
+    assert event_plugin.test_outcome(stages) == expected
+
+
+def test_plugin_writes_collected_and_test_events(tmp_path):
+    (tmp_path / "test_sample.py").write_text(
+        "def test_ok():\n    pass\n\n\ndef test_bad():\n    assert 1 == 2\n", encoding="utf-8")
+    events_path = tmp_path / "events.jsonl"
+    env = {**os.environ, "PYTHONPATH": ROOT, event_plugin.EVENTS_FILE_ENV: str(events_path),
+           event_plugin.RUN_ID_ENV: "r1", event_plugin.SHARD_ENV: "0"}
+    subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "run_test_code_agent.event_plugin",
+                    "-p", "no:cacheprovider", "test_sample.py"], cwd=tmp_path, env=env, capture_output=True)
+    events = [json.loads(line) for line in events_path.read_text(encoding="utf-8").splitlines()]
+    assert [e["event"] for e in events] == ["collected", "test", "test"]
+    assert events[0]["nodeids"] == ["test_sample.py::test_ok", "test_sample.py::test_bad"]
+    assert all(e["run_id"] == "r1" and e["shard"] == "0" for e in events)
+    ok, bad = events[1:]
+    assert (ok["nodeid"], ok["outcome"]) == ("test_sample.py::test_ok", "passed")
+    assert bad["outcome"] == "failed" and "assert 1 == 2" in bad["call"]["crash"]["message"]
+    assert set(bad) >= {"setup", "call", "teardown"}
+
+
+def test_follow_events_reads_only_the_requested_run(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    for run_id in ("a", "b"):
+        append_event(path, {"event": "run_started", "run_id": run_id})
+        append_event(path, _test_event(run_id, f"t_{run_id}"))
+        append_event(path, {"event": "run_finished", "run_id": run_id, "report_path": f"{run_id}.json"})
+    assert [e.get("nodeid") for e in follow_events(path, run_id="a")] == [None, "t_a", None]
+    # 不指定 run_id 时从最后一次执行开始
+    assert [e.get("nodeid") for e in follow_events(path)] == [None, "t_b", None]
+    assert finished_report(path, "a") == "a.json"
+    assert finished_report(path) == "b.json"
+    assert finished_report(str(tmp_path / "missing.jsonl")) is None
+
+
+def test_follow_events_waits_for_complete_lines_and_times_out(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    append_event(path, {"event": "run_started", "run_id": "r"})
+    line = json.dumps(_test_event("r", "t")) + "\n"
+
+    def writer():
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line[:10])
+            f.flush()
+            time.sleep(0.1)
+            f.write(line[10:])
+    thread = threading.Thread(target=writer)
+    thread.start()
+    events = list(follow_events(path, poll_interval=0.02, idle_timeout=0.5, run_id="r"))
+    thread.join()
+    assert [e.get("nodeid") for e in events] == [None, "t"]
+
+
+def test_diagnose_events_ingests_the_finished_report(tmp_path, store):
+    path = str(tmp_path / "events.jsonl")
+    report = str(tmp_path / "report_F1_20260101000000.json")
+    tests = [_test_event("r", "a.py::ok"), _test_event("r", "a.py::bad", "failed")]
+    _write_report(report, tests)
+    append_event(path, {"event": "run_started", "run_id": "r"})
+    for test in tests:
+        append_event(path, test)
+    append_event(path, {"event": "run_finished", "run_id": "r", "report_path": report})
+
+    diagnostics = list(diagnose_events(path, run_id="r", idle_timeout=1))
+    assert [d["nodeid"] for d in diagnostics] == ["a.py::ok", "a.py::bad"]
+    assert diagnostics[1]["diagnosis"]["category"]
+    row = store.results("a.py::bad")[0]
+    assert row["category"] == diagnostics[1]["diagnosis"]["category"]
+
+
+def test_run_and_diagnose_consumes_events_while_the_run_is_in_progress(tmp_path, store, monkeypatch):
+    events_path = str(tmp_path / "events.jsonl")
+    report = str(tmp_path / "report_F1_20260101000000.json")
+    consumed = threading.Event()
+    calls = {}
+
+    def fake_run_sharded(files, feature_id, first=None, events_path=None, run_id=None):
+        calls["run"] = (files, feature_id, first, run_id)
+        append_event(events_path, {"event": "run_started", "run_id": run_id})
+        append_event(events_path, _test_event(run_id, "a.py::bad", "failed"))
+        # 第一条诊断在执行结束前就已经产出
+        calls["concurrent"] = consumed.wait(5)
+        _write_report(report, [_test_event(run_id, "a.py::bad", "failed")])
+        append_event(events_path, {"event": "run_finished", "run_id": run_id, "report_path": report})
+        return report
+
+    monkeypatch.setattr(live, "new_run", lambda feature_id: ("r1", events_path))
+    monkeypatch.setattr(live, "select_tests", lambda files, feature_id, mode: (files, {"a.py"}))
+    monkeypatch.setattr(live, "record_baseline", lambda *args: calls.setdefault("baseline", args))
+    monkeypatch.setattr(live, "run_sharded", fake_run_sharded)
+
+    report_path, run_id, diagnostics = live.run_and_diagnose(
+        ["a.py"], "F1", idle_timeout=5, on_diagnosis=lambda item: consumed.set())
+    assert (report_path, run_id) == (report, "r1")
+    assert calls["run"] == (["a.py"], "F1", {"a.py"}, "r1")
+    assert calls["concurrent"] is True
+    assert [d["nodeid"] for d in diagnostics] == ["a.py::bad"]
+    assert calls["baseline"] == ("F1", ["a.py"], report)
+    assert store.run_id(report) is not None
+
+
+def test_run_and_diagnose_stops_waiting_when_the_runner_fails(tmp_path, store, monkeypatch):
+    events_path = str(tmp_path / "events.jsonl")
+
+    def failing_run_sharded(files, feature_id, first=None, events_path=None, run_id=None):
+        append_event(events_path, {"event": "run_started", "run_id": run_id})
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(live, "new_run", lambda feature_id: ("r1", events_path))
+    monkeypatch.setattr(live, "select_tests", lambda files, feature_id, mode: (files, set()))
+    monkeypatch.setattr(live, "run_sharded", failing_run_sharded)
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        live.run_and_diagnose(["a.py"], "F1", idle_timeout=30)
+    assert time.monotonic() - start < 5
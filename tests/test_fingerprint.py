@@ -0,0 +1,62 @@
+from gen_test_report_agent.fingerprint import FailureClusters, failure_text, fingerprint, normalize
+
+TIMEOUT = '''tests/test_a.py:12: in test_login
+    page.click("#btn")
+E   TimeoutError: Timeout 30000ms exceeded waiting for locator("#login-btn") at 0x7f3a2b
+File "/home/ci/run_123/output/codes/test_login_20260101.py", line 40, in test_login'''
+
+ASSERTION = "\n".join([
+    "E   AssertionError: order list mismatch for view {}",
+    "E   assert left == right",
+    "E   where left is computed from the cart service response body fields",
+    "E   and right is the expected fixture loaded from the case file",
+    "E   full diff shows missing items in the summary table",
+])
+
+
+def test_normalize_keeps_relevant_lines_and_masks_volatile_parts():
+    assert normalize(TIMEOUT).splitlines() == [
+        "test_*.py:<n>: in test_*",
+        "E TimeoutError: Timeout <n>ms exceeded waiting for locator(<str>) at <hex>",
+        "File <str>, line <n>, in test_*",
+    ]
+    assert normalize("") == ""
+
+
+def test_fingerprint_ignores_numbers_paths_and_quoted_values():
+    other = TIMEOUT.replace("12", "57").replace("30000", "5000").replace("0x7f3a2b", "0xdead") \
+        .replace("run_123", "run_9").replace("#login-btn", "#other")
+    assert fingerprint(TIMEOUT) == fingerprint(other)
+    assert fingerprint(TIMEOUT) != fingerprint("E   KeyError: missing")
+    assert fingerprint("") == ""
+
+
+def test_failure_text_uses_failed_stages_only():
+    test = {"setup": {"outcome": "passed", "crash": {"message": "ignored"}},
+            "call": {"outcome": "failed", "crash": {"message": "m", "traceback": "t"}, "longrepr": "L"}}
+    assert failure_text(test) == "m\nt\nL"
+
+
+def test_clusters_merge_exact_and_similar_failures():
+    clusters = FailureClusters()
+    fp_a = clusters.add(TIMEOUT, key="a")
+    clusters.add(TIMEOUT.replace("12", "99"), key="b")
+    clusters.add(ASSERTION.format("user"), key="c")
+    clusters.add(ASSERTION.format("admin"), key="d")
+    clusters.add("E   KeyError: missing", key="e")
+    assert clusters.add("", key="f") == ""
+
+    assert clusters.cluster(fp_a) == (f"C-{fp_a}", 2)
+    # 只差一个词的长失败信息指纹不同，但通过 MinHash 归为同一类，聚类 id 取最早的指纹
+    assert clusters.keys["c"] != clusters.keys["d"]
+    assert clusters.cluster(clusters.keys["d"]) == (f"C-{clusters.keys['c']}", 2)
+    assert clusters.cluster(clusters.keys["e"])[1] == 1
+    assert clusters.cluster("") == ("", 0)
+    assert [c["size"] for c in clusters.summary()] == [2, 2, 1]
+
+
+def test_clusters_similarity_threshold():
+    clusters = FailureClusters(similarity=1.01)
+    clusters.add(ASSERTION.format("user"), key="c")
+    clusters.add(ASSERTION.format("admin"), key="d")
+    assert [c["size"] for c in clusters.summary()] == [1, 1]
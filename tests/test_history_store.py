@@ -0,0 +1,112 @@
+import json
+import sqlite3
+
+import pytest
+
+from gen_test_report_agent.history_store import HistoryStore, history_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.sqlite3"), window=20)
+
+
+def _ingest(store, outcomes):
+    """每个元素是一次执行：{nodeid: outcome}"""
+    return [store.ingest_tests([{"nodeid": n, "outcome": o, "call": {"duration": 1.0}}
+                                for n, o in run.items()]) for run in outcomes]
+
+
+def test_ingest_report_is_idempotent_and_reads_feature_id(store, tmp_path):
+    path = tmp_path / "report_F1_20260101120000.json"
+    path.write_text(json.dumps({"tests": [
+        {"nodeid": "a.py::t", "outcome": "failed", "call": {"duration": 2.5, "crash": {"message": "E   boom"}}},
+        {"nodeid": "a.py::s", "outcome": "skipped"},
+    ]}), encoding="utf-8")
+    run_id = store.ingest(str(path), categories={"a.py::t": "ASSERTION_ERROR"})
+    assert store.ingest(str(path)) == run_id
+    assert store.run_id(str(path)) == run_id
+    assert store.recent_runs(10, feature_id="F1") == [run_id]
+    assert store.recent_runs(10, feature_id="other") == []
+    row = store.results("a.py::t")[0]
+    assert (row["outcome"], row["duration"], row["category"]) == ("failed", 2.5, "ASSERTION_ERROR")
+    assert row["crash_hash"]
+    assert store.results("a.py::s")[0]["crash_hash"] == ""
+
+
+def test_pass_rate_and_flip_rate_ignore_skipped(store):
+    _ingest(store, [{"t": "passed"}, {"t": "skipped"}, {"t": "failed"}, {"t": "passed"}])
+    assert store.pass_rate("t") == pytest.approx(2 / 3)
+    assert store.flip_rate("t") == (1.0, 3)
+    assert store.pass_rate("unknown") is None
+    assert store.flip_rate("unknown") is None
+
+
+def test_regression_is_not_flaky_history(store):
+    _ingest(store, [{"reg": "passed"}] * 18 + [{"reg": "failed"}] * 2)
+    rate, runs = store.flip_rate("reg")
+    assert runs == 20 and rate == pytest.approx(1 / 19)
+
+
+def test_history_before_run_and_first_failing_run(store):
+    run_ids = _ingest(store, [{"t": "failed"}, {"t": "passed"}, {"t": "failed"}, {"t": "error"}, {"t": "passed"}])
+    assert store.last_outcome("t") == "passed"
+    assert store.first_failing_run("t") is None
+    # 第 5 次执行之前：最后一次通过之后从第 3 次开始连续失败
+    history = store.history("t", before_run=run_ids[4])
+    assert history["last_outcome"] == "error"
+    assert history["first_failing_run"]["run_id"] == run_ids[2]
+    assert history["pass_rate"] == pytest.approx(0.25)
+    assert history["runs"] == 4
+
+
+def test_results_and_batches(store):
+    run_ids = _ingest(store, [{"a": "passed", "b": "failed"}, {"a": "failed"}])
+    assert [(r["run_id"], r["outcome"]) for r in store.results("a")] == [(run_ids[0], "passed"), (run_ids[1], "failed")]
+    assert [r["nodeid"] for r in store.results(limit=1)] == ["a"]
+    rows = sorted(row for batch in store.result_batches(run_ids, batch_size=1) for row in batch)
+    assert [(r[0], r[1], r[2]) for r in rows] == [("a", run_ids[0], "passed"), ("a", run_ids[1], "failed"),
+                                                  ("b", run_ids[0], "failed")]
+
+
+def test_history_key_drops_directory_and_generation_timestamp():
+    assert history_key("output/codes/test_TC-1_20260101000000.py::test_login[a]") == "test_TC-1::test_login[a]"
+    assert history_key("test_TC-1.py::test_login") == "test_TC-1::test_login"
+
+
+def test_regenerated_files_share_history(store):
+    old = "output/codes/test_TC-1_20260101000000.py::test_login"
+    new = "output/codes/test_TC-1_20260102000000.py::test_login"
+    run_ids = _ingest(store, [{old: "passed"}, {old: "passed"}, {new: "failed"}])
+    history = store.history(new)
+    assert history["runs"] == 3 and history["pass_rate"] == pytest.approx(2 / 3)
+    assert history["last_outcome"] == "failed"
+    assert history["first_failing_run"]["run_id"] == run_ids[2]
+    assert [r["nodeid"] for r in store.results(new)] == [old, old, new]
+
+
+def test_failure_wins_when_old_and_new_files_run_together(store):
+    old = "test_TC-1_20260101000000.py::test_login"
+    new = "test_TC-1_20260102000000.py::test_login"
+    run_ids = _ingest(store, [{old: "passed"}, {old: "passed", new: "failed"}])
+    assert store.flip_rate(new) == (1.0, 2)
+    assert store.last_outcome(new) == "failed"
+    assert store.first_failing_run(new)["run_id"] == run_ids[1]
+
+
+def test_migrates_history_keyed_by_nodeid(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE runs (run_id INTEGER PRIMARY KEY AUTOINCREMENT, report_path TEXT UNIQUE, "
+                 "feature_id TEXT, created_at REAL NOT NULL)")
+    conn.execute("CREATE TABLE results (nodeid TEXT NOT NULL, run_id INTEGER NOT NULL, outcome TEXT NOT NULL, "
+                 "duration REAL NOT NULL, crash_hash TEXT NOT NULL DEFAULT '', category TEXT, "
+                 "PRIMARY KEY (nodeid, run_id)) WITHOUT ROWID")
+    conn.execute("INSERT INTO runs(created_at) VALUES (1)")
+    conn.execute("INSERT INTO results VALUES ('test_TC-1_20260101000000.py::test_login', 1, 'passed', 1, '', NULL)")
+    conn.commit()
+    conn.close()
+
+    store = HistoryStore(path)
+    store.ingest_tests([{"nodeid": "test_TC-1_20260102000000.py::test_login", "outcome": "failed"}])
+    assert store.flip_rate("test_TC-1_20260102000000.py::test_login") == (1.0, 2)
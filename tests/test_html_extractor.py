@@ -0,0 +1,53 @@
+from gen_test_code_agent.html_extractor import parse_elements
+
+HTML = """<html><head><base href="/app/"></head><body>
+<div id="wrap" class="c"><span class="s">x</span>
+<a href="next.html" class="lnk">下一页</a>
+<button>提交</button>
+<input name="user" placeholder="用户名">
+<textarea id="t">
+hello</textarea>
+<select name="city"><option value="bj">北京<option selected>上海</select>
+<div role="button" data-testid="fake">伪按钮</div>
+<p id="para">段落</p>
+<img id="logo" src="a.png">
+<input type="checkbox" name="agree"><input type="weird" name="w">
+</div></body></html>"""
+
+
+def _elements():
+    return parse_elements(HTML, "http://host/base/index.html")
+
+
+def test_order_follows_selector_priority_and_skips_excluded_tags():
+    assert [(e["tagName"], e["name"] or e["id"]) for e in _elements()] == [
+        ("input", "user"), ("input", "agree"), ("input", "w"),
+        ("textarea", "t"), ("button", None), ("select", "city"), ("a", None), ("img", "logo")]
+
+
+def test_field_values_match_dom_semantics():
+    by_tag = {}
+    for e in _elements():
+        by_tag.setdefault(e["tagName"], []).append(e)
+    user, agree, weird = by_tag["input"]
+    assert (user["placeholder"], user["type"], user["value"]) == ("用户名", "text", None)
+    assert (agree["type"], agree["value"]) == ("checkbox", "on")
+    assert weird["type"] == "text"
+    # textarea 开始标签后的第一个换行被忽略
+    assert by_tag["textarea"][0]["value"] == "hello"
+    assert by_tag["button"][0]["type"] == "submit"
+    # 没有 value 的 option 取其文字，隐式闭合的 option 不会嵌套
+    assert by_tag["select"][0]["value"] == "上海"
+    assert by_tag["select"][0]["type"] == "select-one"
+    link = by_tag["a"][0]
+    assert link["href"] == "http://host/app/next.html"
+    assert link["classList"] == ["lnk"]
+    assert link["text"] == "下一页"
+
+
+def test_data_attributes_and_roles():
+    # span / li 等排除的标签即使带 role 或 data-* 也不收集
+    html = '<span data-qa="qa-id">a</span><li role="link">b</li><nav role="link">n</nav><section data-testid="t" data-cy="c">c</section>'
+    elements = parse_elements(html)
+    assert [(e["tagName"], e["role"], e["dataTestid"]) for e in elements] == [
+        ("nav", "link", None), ("section", None, "t")]
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from utils.llm_cache import LLMCache, make_cache_key
+
+MESSAGES = [{"role": "system", "content": "s"}, {"role": "user", "content": "u"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMCache(str(tmp_path / "cache.sqlite3"), ttl=60, max_bytes=0)
+
+
+def test_cache_key_covers_model_temperature_prompt_and_format():
+    key = make_cache_key("gpt", 0.0, MESSAGES, "json")
+    assert key == make_cache_key("gpt", 0.0, [dict(m) for m in MESSAGES], "json")
+    assert key != make_cache_key("gpt-2", 0.0, MESSAGES, "json")
+    assert key != make_cache_key("gpt", 0.5, MESSAGES, "json")
+    assert key != make_cache_key("gpt", 0.0, MESSAGES[:1], "json")
+    assert key != make_cache_key("gpt", 0.0, MESSAGES, "")
+
+
+def test_set_get_and_clear(cache):
+    assert cache.get("k") is None
+    cache.set("k", {"value": ["中文", 1]})
+    assert cache.get("k") == {"value": ["中文", 1]}
+    cache.set("k", {"value": "new"})
+    assert cache.get("k") == {"value": "new"}
+    cache.clear()
+    assert cache.get("k") is None
+
+
+def test_expired_entries_are_dropped(cache, monkeypatch):
+    cache.set("k", 1)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("k") is None
+    assert cache._connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 0
+
+
+def test_evicts_least_recently_used_entries_over_max_bytes(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), ttl=0, max_bytes=25)
+    cache.EVICT_EVERY = 1
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    cache.set("a", "x" * 8)
+    cache.set("b", "y" * 8)
+    # 读取 a 之后 b 成为最久未访问的条目
+    assert cache.get("a") == "x" * 8
+    cache.set("c", "z" * 8)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 8 and cache.get("c") == "z" * 8
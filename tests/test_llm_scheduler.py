@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from utils.llm_client import LLMScheduler, TokenBucket
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: str = None):
+        super().__init__("rate limited")
+        self.response = type("Resp", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+
+def test_token_bucket_refill_and_wait():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0.0
+    bucket.consume(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 0.5) == pytest.approx(0.5)
+    # 超过容量的请求按容量计算，不会永远等待
+    assert bucket.wait_time(1000, now + 61) == 0.0
+    assert TokenBucket(0).wait_time(10 ** 6, now) == 0.0
+
+
+def test_run_retries_retryable_errors_and_counts():
+    scheduler = LLMScheduler(max_in_flight=2, rpm=0, tpm=0, max_retries=2, base_delay=0.001)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _RateLimited()
+        return "ok"
+
+    assert scheduler.run(flaky, prompt_tokens=10, count_tokens=len) == "ok"
+    metrics = scheduler.metrics()
+    assert (metrics["requests"], metrics["retries"], metrics["rate_limited"]) == (1, 2, 2)
+    assert (metrics["prompt_tokens"], metrics["completion_tokens"], metrics["in_flight"]) == (10, 2, 0)
+
+
+def test_run_gives_up_on_non_retryable_errors():
+    scheduler = LLMScheduler(max_in_flight=1, rpm=0, tpm=0, max_retries=3)
+    with pytest.raises(ValueError):
+        scheduler.run(lambda: (_ for _ in ()).throw(ValueError("bad request")))
+    assert scheduler.metrics()["failures"] == 1
+    assert scheduler.metrics()["in_flight"] == 0
+
+
+def test_retry_after_header_is_honoured():
+    scheduler = LLMScheduler(max_retries=1, base_delay=0.001)
+    assert scheduler._retry_delay(_RateLimited("2"), 0) >= 2.0
+    assert scheduler._retry_delay(_RateLimited("2"), 1) is None
+
+
+def test_max_in_flight_is_respected_across_threads():
+    scheduler = LLMScheduler(max_in_flight=3, rpm=0, tpm=0)
+    lock = threading.Lock()
+    state = {"now": 0, "peak": 0}
+
+    def work():
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.01)
+        with lock:
+            state["now"] -= 1
+
+    threads = [threading.Thread(target=scheduler.run, args=(work,)) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state["peak"] == 3
+    metrics = scheduler.metrics()
+    assert (metrics["requests"], metrics["in_flight"], metrics["queue_depth"]) == (12, 0, 0)
+    assert metrics["max_queue_depth"] >= 1
+
+
+def test_rpm_limit_delays_async_calls():
+    scheduler = LLMScheduler(max_in_flight=10, rpm=600, tpm=0)
+    scheduler.rpm.tokens = 0
+
+    async def main():
+        start = time.monotonic()
+        await asyncio.gather(*[scheduler.arun(lambda: asyncio.sleep(0)) for _ in range(3)])
+        return time.monotonic() - start
+
+    # 600 rpm 即每 0.1 秒一个令牌
+    assert asyncio.run(main()) == pytest.approx(0.3, abs=0.1)
+
+
+def _block(scheduler):
+    """占满唯一的并发槽位，返回放行用的 Event"""
+    gate = threading.Event()
+    thread = threading.Thread(target=scheduler.run, args=(gate.wait,))
+    thread.start()
+    while scheduler.metrics()["in_flight"] == 0:
+        time.sleep(0.001)
+    return gate, thread
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    scheduler = LLMScheduler(max_in_flight=1, rpm=0, tpm=0)
+    gate, blocker = _block(scheduler)
+    order = []
+    threads = []
+    for index, priority in enumerate([5, 1, 3, 1, 0]):
+        thread = threading.Thread(target=scheduler.run,
+                                  args=(lambda i=index: order.append(i),), kwargs={"priority": priority})
+        thread.start()
+        threads.append(thread)
+        while scheduler.metrics()["queue_depth"] < index + 1:
+            time.sleep(0.001)
+    gate.set()
+    for thread in threads + [blocker]:
+        thread.join()
+    assert order == [4, 1, 3, 2, 0]
+
+
+def test_async_waiters_share_the_queue_and_cancelled_waiters_leave_it():
+    scheduler = LLMScheduler(max_in_flight=1, rpm=0, tpm=0)
+
+    async def main():
+        release = asyncio.Event()
+        order = []
+
+        async def job(name):
+            order.append(name)
+
+        holder = asyncio.create_task(scheduler.arun(release.wait))
+        await asyncio.sleep(0.01)
+        low = asyncio.create_task(scheduler.arun(lambda: job("low"), priority=9))
+        cancelled = asyncio.create_task(scheduler.arun(lambda: job("cancelled"), priority=0))
+        high = asyncio.create_task(scheduler.arun(lambda: job("high"), priority=1))
+        await asyncio.sleep(0.01)
+        assert scheduler.metrics()["queue_depth"] == 3
+        cancelled.cancel()
+        await asyncio.sleep(0.01)
+        assert scheduler.metrics()["queue_depth"] == 2
+        release.set()
+        await asyncio.gather(holder, low, high)
+        return order
+
+    assert asyncio.run(main()) == ["high", "low"]
+    assert scheduler.metrics()["in_flight"] == 0
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("dotenv")
+pytest.importorskip("playwright.async_api")
+
+from gen_test_code_agent import get_selector_from_html
+from gen_test_code_agent.agent import _case_page, match_page_url
+
+DEFAULT = "http://localhost:5173/home"
+PAGE_URLS = {
+    "登录页": "http://localhost:5173/login",
+    "用户注册": "http://localhost:5173/register",
+    "Order List": "http://localhost:5173/orders",
+}
+
+
+def test_match_page_url_by_name_path_containment_and_similarity():
+    assert match_page_url("登录页面", PAGE_URLS, DEFAULT) == PAGE_URLS["登录页"]
+    assert match_page_url("order_list", PAGE_URLS, DEFAULT) == PAGE_URLS["Order List"]
+    # 也可以直接写 url 路径
+    assert match_page_url("/register", PAGE_URLS, DEFAULT) == PAGE_URLS["用户注册"]
+    assert match_page_url("注册", PAGE_URLS, DEFAULT) == PAGE_URLS["用户注册"]
+    assert match_page_url("Ordr List", PAGE_URLS, DEFAULT) == PAGE_URLS["Order List"]
+
+
+def test_match_page_url_falls_back_to_default():
+    assert match_page_url("", PAGE_URLS, DEFAULT) == DEFAULT
+    assert match_page_url("个人中心", PAGE_URLS, DEFAULT) == DEFAULT
+    assert match_page_url("登录", None, DEFAULT) == DEFAULT
+
+
+def test_case_page_prefers_structured_page_and_picks_its_selectors():
+    case_info = {
+        "test_case": {"page": "注册页"},
+        "url": DEFAULT,
+        "page_urls": PAGE_URLS,
+        "page_selectors": {PAGE_URLS["登录页"]: [{"id": "loginBtn"}], DEFAULT: [{"id": "nav"}]},
+    }
+    assert _case_page(case_info, {"page": "登录页"}) == (PAGE_URLS["登录页"], [{"id": "loginBtn"}])
+    # 结构化用例没有 page 时使用原始用例的 page，该页面没有提取结果时为空列表
+    assert _case_page(case_info, None) == (PAGE_URLS["用户注册"], [])
+    case_info["test_case"] = {}
+    assert _case_page(case_info, {}) == (DEFAULT, [{"id": "nav"}])
+
+
+def test_arun_pages_dedupes_urls_and_empties_failures(monkeypatch):
+    calls = []
+
+    async def fake_arun(url, write_to_json=False, pool=None, ready_selector=None):
+        calls.append(url)
+        return None if url.endswith("broken") else [{"url": url}]
+
+    monkeypatch.setattr(get_selector_from_html, "arun", fake_arun)
+    pages = asyncio.run(get_selector_from_html.arun_pages([DEFAULT, "", "http://x/broken", DEFAULT]))
+    assert calls == [DEFAULT, "http://x/broken"]
+    assert pages == {DEFAULT: [{"url": DEFAULT}], "http://x/broken": []}
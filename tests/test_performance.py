@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from gen_test_report_agent import performance
+from gen_test_report_agent.performance import analyze_report, render_section
+
+
+def _test(nodeid, setup=0.0, call=0.0, outcome="passed", message=None):
+    test = {"nodeid": nodeid, "outcome": outcome,
+            "setup": {"duration": setup}, "call": {"duration": call}, "teardown": {"duration": 0.0}}
+    if message:
+        test["call"]["crash"] = {"message": message}
+    return test
+
+
+@pytest.fixture
+def report(tmp_path, monkeypatch):
+    monkeypatch.setattr(performance, "RUNNER_TEST_TIMEOUT", 10)
+    codes = tmp_path / "codes"
+    codes.mkdir()
+    (codes / "test_login.meta.json").write_text(json.dumps({"page": "login", "feature_id": "F1"}))
+    (codes / "test_cart.meta.json").write_text(json.dumps({"url": "/cart", "feature_id": "F2"}))
+    path = tmp_path / "report.json"
+    path.write_text(json.dumps({"tests": [
+        _test("codes/test_login.py::test_a", setup=3.0, call=1.0),
+        _test("codes/test_login.py::test_b", setup=0.1, call=9.0),
+        _test("codes/test_cart.py::test_c", call=10.0, outcome="failed", message="Failed: Timeout >10.0s"),
+        _test("codes/test_other.py::test_d", call=0.5),
+    ]}))
+    return str(path), str(tmp_path)
+
+
+def test_analyze_report(report):
+    path, root = report
+    perf = analyze_report(path, root=root, top_n=2)
+    assert perf["tests"] == 4
+    assert perf["total"] == pytest.approx(23.6)
+    assert perf["setup"] == pytest.approx(3.1)
+    assert perf["counts"] == {"setup_dominated": 1, "timeouts": 1, "near_timeout": 1}
+    assert [r["nodeid"] for r in perf["slowest"]] == ["codes/test_cart.py::test_c", "codes/test_login.py::test_b"]
+    assert perf["setup_dominated"][0]["setup_ratio"] == 0.75
+    assert perf["timeouts"][0]["message"] == "Failed: Timeout >10.0s"
+    assert perf["near_timeout"][0]["nodeid"] == "codes/test_login.py::test_b"
+    assert [(r["name"], r["tests"]) for r in perf["by_page"]] == [("login", 2), ("/cart", 1), ("(unknown)", 1)]
+    assert [r["name"] for r in perf["by_feature"]] == ["F1", "F2", "(unknown)"]
+    assert sum(r["share"] for r in perf["by_feature"]) == pytest.approx(1.0, abs=0.01)
+
+
+def test_render_section_uses_analytics_regressions(report):
+    path, root = report
+    analytics = {"duration_regression_count": 1,
+                 "duration_regressions": [{"test_key": "test_login::test_b", "duration": 9.1,
+                                           "baseline": 2.0, "z": 4.2}]}
+    section = render_section(analyze_report(path, root=root), analytics)
+    assert "耗时回归: 1" in section
+    assert "| test_login::test_b | 9.1 | 2.0 | 4.2 |" in section
+    assert "### 超时" in section
+    assert "### 耗时回归" not in render_section(analyze_report(path, root=root))
+
+
+def test_render_section_without_tests():
+    assert render_section(None) == "## 执行耗时\n\n没有可统计的用例"
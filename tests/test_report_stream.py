@@ -0,0 +1,68 @@
+import io
+import json
+
+import pytest
+
+from gen_test_report_agent import report_stream
+from gen_test_report_agent.report_stream import _scan_items, iter_report_tests
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1 << 20]
+
+REPORTS = {
+    "plain": {"created": 1.5, "tests": [{"nodeid": "a.py::t1", "outcome": "passed"},
+                                        {"nodeid": "a.py::t2", "outcome": "failed"}]},
+    "nested_tests_keys": {
+        "summary": {"tests": [{"nodeid": "fake"}], "total": 2},
+        "environment": {"x": [{"tests": []}, "tests"]},
+        "note": "tests",
+        "tests": [{"nodeid": "b.py::t", "outcome": "passed", "tests": ["inner"]}],
+        "after": {"tests": [1, 2]},
+    },
+    "escaped_strings": {
+        "keys\"tests": [0],
+        "tests": [{"nodeid": "c.py::t[\"]\"]", "outcome": "failed",
+                   "call": {"longrepr": "E  assert '[{' == '}]'\n\\\"tests\\\": [", "crash": {"message": "中文 ]},"}}},
+                  {"nodeid": "c.py::t[\\]", "outcome": "passed"}],
+    },
+    "empty_tests": {"tests": [], "summary": {"total": 0}},
+    "missing_tests": {"summary": {"total": 0}, "collectors": [{"tests": [1]}]},
+    "null_tests": {"tests": None},
+    "scalars": {"tests": [1, "two", None, True, 2.5, [], {}]},
+    "numbers": {"tests": [12345, -0.5e10, 3.14159, 0, 1e-7]},
+}
+
+
+def _expected(report):
+    tests = report.get("tests")
+    return tests if isinstance(tests, list) else []
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("name", sorted(REPORTS))
+def test_scan_items_matches_json_load(name, chunk_size, indent):
+    text = json.dumps(REPORTS[name], ensure_ascii=False, indent=indent)
+    assert list(_scan_items(io.StringIO(text), "tests", chunk_size)) == _expected(json.loads(text))
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_scan_items_item_larger_than_chunk(chunk_size):
+    report = {"tests": [{"nodeid": "big", "longrepr": "x" * 5000}, {"nodeid": "small"}]}
+    assert list(_scan_items(io.StringIO(json.dumps(report)), "tests", chunk_size)) == report["tests"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 20])
+def test_scan_items_truncated_report(chunk_size):
+    text = '{"tests": [{"nodeid": "a"}, {"nodeid": "b"'
+    items = _scan_items(io.StringIO(text), "tests", chunk_size)
+    assert next(items) == {"nodeid": "a"}
+    with pytest.raises(ValueError):
+        list(items)
+
+
+def test_iter_report_tests_without_ijson(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_stream, "ijson", None)
+    report = REPORTS["escaped_strings"]
+    path = tmp_path / "report.json"
+    path.write_text(json.dumps(report, ensure_ascii=False), encoding="utf-8")
+    assert list(iter_report_tests(str(path), chunk_size=4)) == report["tests"]
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("langchain_openai")
+
+from requirement_analyzer_agent.agent import _split_combined, collect_result_node, fan_out_chunks
+from requirement_analyzer_agent.chunker import split_markdown
+
+SECTION = {"section": "1. 用户登录", "section_hash": "h1", "section_hashes": {"1. 用户登录": "h1"}}
+FEATURES = [{"feature": "用户登录", "description": "手机号登录", "exceptions": ["密码错误"]},
+            {"feature": "账号锁定", "description": "锁定策略", "exceptions": []}]
+
+
+def _source(chunk):
+    return {"source_section": chunk["section"], "section_hash": chunk["section_hash"]}
+
+
+def _exceptions(trm):
+    names = {f["id"]: f["name"] for f in trm["features"]}
+    return sorted((names[e["feature_id"]], e["text"], e["source_section"]) for e in trm["exceptions"])
+
+
+def _collect(ext_features, ext_exceptions=(), previous=None, chunks=None):
+    return collect_result_node({"feature_id": "123", "ext_features": ext_features,
+                                "ext_exceptions": list(ext_exceptions), "previous_trm": previous,
+                                "chunks": chunks or [SECTION]})["trm_result"]
+
+
+def test_combined_exceptions_are_attached_to_their_feature():
+    result = {"features": FEATURES, "exceptions": ["账号锁定后 10 分钟内无法登录", "密码错误", "网络超时"]}
+    split = _split_combined(result, {"fragment": "", **SECTION})
+    assert split["ext_exceptions"] == []
+    assert [f["exceptions"] for f in split["ext_features"]] == [
+        ["密码错误", "网络超时"], ["账号锁定后 10 分钟内无法登录"]]
+    # 输入不被修改
+    assert FEATURES[1]["exceptions"] == []
+
+    combined = _collect(split["ext_features"])
+    # 与 split 模式（feature 抽取结果自带 exceptions）得到相同的 exceptions
+    split_mode = _collect([{**f, **SECTION} for f in split["ext_features"]])
+    assert _exceptions(combined) == _exceptions(split_mode) == [
+        ("用户登录", "密码错误", "1. 用户登录"), ("用户登录", "网络超时", "1. 用户登录"),
+        ("账号锁定", "账号锁定后 10 分钟内无法登录", "1. 用户登录")]
+
+
+def test_combined_exceptions_without_features_are_kept():
+    split = _split_combined({"features": [], "exceptions": ["网络超时"]}, {"fragment": "", **SECTION})
+    assert [e["text"] for e in split["ext_exceptions"]] == ["网络超时"]
+
+
+def test_combined_exceptions_of_unchanged_sections_are_kept_with_their_ids():
+    first = _collect(_split_combined({"features": FEATURES[:1], "exceptions": ["网络超时"]},
+                                     {"fragment": "", **SECTION})["ext_features"])
+    other = {"section": "2. 注册", "section_hash": "h2", "section_hashes": {"2. 注册": "h2"}}
+    second = _collect(_split_combined({"features": [{"feature": "注册", "exceptions": []}],
+                                       "exceptions": ["手机号已注册"]}, {"fragment": "", **other})["ext_features"],
+                      previous=first, chunks=[SECTION, other])
+    kept = {e["text"]: e for e in second["exceptions"]}
+    assert set(kept) == {"密码错误", "网络超时", "手机号已注册"}
+    assert kept["网络超时"]["exception_id"] == {e["text"]: e for e in first["exceptions"]}["网络超时"]["exception_id"]
+
+
+def test_incremental_run_reextracts_only_chunks_with_changed_sections():
+    def doc(b):
+        return f"# 根\n\n## A\n\n{'甲' * 10}\n\n## B\n\n{b}\n\n## C\n\n{'丙' * 10}\n\n## D\n\n{'丁' * 10}\n"
+
+    old_chunks = list(split_markdown(doc("乙" * 10), max_tokens=30, overlap_tokens=0))
+    first = _collect([{"feature": "甲功能", **_source(old_chunks[0])}, {"feature": "丙功能", **_source(old_chunks[1])}],
+                     chunks=old_chunks)
+    assert first["sections"] == {c["section"]: c["section_hashes"] for c in old_chunks}
+
+    chunks = list(split_markdown(doc("乙" * 11), max_tokens=30, overlap_tokens=0))
+    sends = fan_out_chunks({"feature_id": "123", "chunks": chunks, "previous_trm": first}, ["ext_feature_task"])
+    assert [send.arg["section"] for send in sends] == ["根 > A | 根 > B"]
+
+    second = _collect([{"feature": "乙功能", **_source(chunks[0])}], previous=first, chunks=chunks)
+    assert sorted(f["name"] for f in second["features"]) == ["丙功能", "乙功能"]
+    assert second["sections"] == {c["section"]: c["section_hashes"] for c in chunks}
@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+from gen_test_code_agent import selector_cache
+from run_test_code_agent import selection
+from run_test_code_agent.case_meta import load_meta, meta_path
+from run_test_code_agent.selection import last_outcomes, record_baseline, select_tests
+
+URL = "http://localhost:5173/login"
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    # 报告、基线和 selector 缓存都在当前目录的 output 下
+    monkeypatch.chdir(tmp_path)
+    reports = tmp_path / "output" / "reporters"
+    reports.mkdir(parents=True)
+    trm = {"flows": [{"flow_id": "FLOW_1", "steps": ["a"], "source_section": "s", "section_hash": "h"}],
+           "rules": [{"rule_id": "RULE_1", "text": "r"}]}
+    monkeypatch.setattr(selection, "load_latest_trm", lambda feature_id: trm)
+    monkeypatch.setattr(selector_cache, "SELECTOR_CACHE_ENABLED", True)
+    codes = tmp_path / "codes"
+    codes.mkdir()
+    files = {}
+    for name, refs in (("a", ["FLOW_1"]), ("b", ["RULE_1"]), ("c", [])):
+        path = codes / f"test_TC-1-{name}_20240101120000.py"
+        path.write_text(f"def test_{name}():\n    pass\n")
+        with open(meta_path(path), "w", encoding="utf-8") as f:
+            json.dump({"url": URL, "trm_refs": refs}, f)
+        files[name] = str(path)
+    return {"reports": reports, "trm": trm, "files": files}
+
+
+def _report(env, name, outcomes):
+    tests = [{"nodeid": f"{os.path.basename(env['files'][key])}::test_{key}{i}", "outcome": outcome}
+             for key, results in outcomes.items() for i, outcome in enumerate(results)]
+    path = env["reports"] / f"report_1_{name}.json"
+    path.write_text(json.dumps({"tests": tests}))
+    return str(path)
+
+
+def test_case_meta_load_and_missing(tmp_path):
+    assert meta_path("codes/test_x_20240101120000.py") == os.path.join("codes", "test_x_20240101120000.meta.json")
+    assert load_meta(str(tmp_path / "test_missing.py")) == {}
+    (tmp_path / "test_bad.meta.json").write_text("{")
+    assert load_meta(str(tmp_path / "test_bad.py")) == {}
+
+
+def test_last_outcomes_any_failure_fails_the_file_and_newer_reports_win(env):
+    _report(env, "20240101000000", {"a": ["failed"], "b": ["passed", "error"]})
+    _report(env, "20240102000000", {"a": ["passed", "passed"]})
+    assert last_outcomes("1", str(env["reports"])) == {"test_TC-1-a": "passed", "test_TC-1-b": "failed"}
+    assert last_outcomes("1", str(env["reports"]), limit=1) == {"test_TC-1-a": "passed"}
+
+
+def test_full_and_failed_first_modes(env):
+    files = list(env["files"].values())
+    _report(env, "20240101000000", {"a": ["passed"], "b": ["failed"]})
+    assert select_tests(files, "1", "full") == (files, set())
+    assert select_tests(files, "1", "unknown") == (files, set())
+    assert select_tests(files, "1", "failed_first") == (files, {env["files"]["b"]})
+
+
+def test_impacted_selects_failed_new_and_changed_files(env):
+    files = env["files"]
+    all_files = list(files.values())
+    selector_cache.store(URL, [{"id": "loginBtn"}], fingerprint="f1")
+    report = _report(env, "20240101000000", {"a": ["passed"], "b": ["failed"]})
+    record_baseline("1", all_files, report)
+    # 上次失败的 b 和没有执行过的 c 没有基线
+    assert select_tests(all_files, "1", "impacted") == ([files["b"], files["c"]], {files["b"]})
+
+    report = _report(env, "20240102000000", {"a": ["passed"], "b": ["passed"], "c": ["passed"]})
+    record_baseline("1", all_files, report)
+    assert select_tests(all_files, "1", "impacted") == ([], set())
+
+    # TRM 条目内容变化只影响引用它的用例，来源字段变化不算
+    env["trm"]["flows"][0]["section_hash"] = "h2"
+    assert select_tests(all_files, "1", "impacted")[0] == []
+    env["trm"]["rules"][0]["text"] = "r2"
+    assert select_tests(all_files, "1", "impacted")[0] == [files["b"]]
+    env["trm"]["rules"][0]["text"] = "r"
+
+    with open(files["c"], "a", encoding="utf-8") as f:
+        f.write("# changed\n")
+    assert select_tests(all_files, "1", "impacted")[0] == [files["c"]]
+
+    # 页面 selector 变化影响该页面的全部用例
+    selector_cache.store(URL, [{"id": "submit"}], fingerprint="f2")
+    assert select_tests(all_files, "1", "impacted")[0] == all_files
+
+
+def test_record_baseline_ignores_missing_report(env):
+    record_baseline("1", list(env["files"].values()), None)
+    assert selection.load_baseline("1") == {}
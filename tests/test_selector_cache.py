@@ -0,0 +1,58 @@
+import pytest
+
+from gen_test_code_agent import selector_cache
+
+URL = "http://localhost:5173/login"
+OLD = [{"tag_name": "button", "id": "loginBtn", "text": "登录"},
+       {"tag_name": "input", "name": "username", "placeholder": "账号"},
+       {"tag_name": "span", "class_list": ["hint"]}]
+NEW = [{"tag_name": "button", "id": "loginBtn", "text": "立即登录"},
+       {"tag_name": "input", "name": "username", "placeholder": "账号"},
+       {"tag_name": "input", "name": "code"}]
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(selector_cache, "SELECTOR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(selector_cache, "SELECTOR_CACHE_ENABLED", True)
+    monkeypatch.setattr(selector_cache, "SELECTOR_CACHE_HISTORY", 3)
+    return tmp_path
+
+
+def test_lookup_by_build_hash_or_fingerprint():
+    assert selector_cache.lookup(URL, build_hash="b1") is None
+    assert selector_cache.store(URL, OLD, fingerprint="f1", build_hash="b1") is None
+    selector_cache.store(URL, NEW, fingerprint="f2")
+    assert selector_cache.lookup(URL, build_hash="b1") == OLD
+    assert selector_cache.lookup(URL, fingerprint="f2") == NEW
+    # 前端回滚到旧版本时命中旧快照
+    assert selector_cache.lookup(URL, fingerprint="f1") == OLD
+    assert selector_cache.lookup(URL, build_hash="b2", fingerprint="f3") is None
+    assert selector_cache.lookup(URL) is None
+    assert selector_cache.lookup("http://localhost:5173/other", fingerprint="f1") is None
+
+
+def test_store_returns_diff_and_keeps_limited_history():
+    selector_cache.store(URL, OLD, fingerprint="f1")
+    diff = selector_cache.store(URL, NEW, fingerprint="f2")
+    assert diff == {
+        "added": ['input[name="code"]'],
+        "removed": ["span.hint"],
+        "changed": [{"locator": "#loginBtn", "field": "text", "old": "登录", "new": "立即登录"}],
+    }
+    assert selector_cache.diff_history(URL) == diff
+    for i in range(3):
+        selector_cache.store(URL, NEW, fingerprint=f"g{i}")
+    snapshots = selector_cache.load_history(URL)["snapshots"]
+    assert [s["fingerprint"] for s in snapshots] == ["g0", "g1", "g2"]
+    assert selector_cache.lookup(URL, fingerprint="f1") is None
+
+
+def test_disabled_or_unreadable_cache(cache_dir, monkeypatch):
+    assert selector_cache.diff_history(URL) is None
+    with open(selector_cache._cache_file(URL), "w", encoding="utf-8") as f:
+        f.write("{broken")
+    assert selector_cache.load_history(URL) == {"url": URL, "snapshots": []}
+    monkeypatch.setattr(selector_cache, "SELECTOR_CACHE_ENABLED", False)
+    assert selector_cache.store(URL, OLD, fingerprint="f1") is None
+    assert selector_cache.lookup(URL, fingerprint="f1") is None
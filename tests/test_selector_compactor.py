@@ -0,0 +1,52 @@
+from gen_test_code_agent.selector_compactor import best_locator, compact_selectors, to_table, token_report
+
+
+def test_best_locator_priority():
+    el = {"tag_name": "input", "data_testid": "user", "id": "u", "name": "username",
+          "aria_label": "用户名", "placeholder": "请输入用户名", "text": "x"}
+    assert best_locator(el) == '[data-testid="user"]'
+    del el["data_testid"]
+    assert best_locator(el) == "#u"
+    assert best_locator({**el, "id": "1bad id"}) == '[id="1bad id"]'
+    del el["id"]
+    assert best_locator(el) == 'input[name="username"]'
+    del el["name"]
+    assert best_locator(el) == 'input[aria-label="用户名"]'
+    del el["aria_label"]
+    assert best_locator(el) == 'input[placeholder="请输入用户名"]'
+    assert best_locator({"tag_name": "div", "role": "button", "text": "  确  定 "}) == 'role=button[name="确 定"]'
+    assert best_locator({"tag_name": "a", "text": 'say "hi"'}) == 'a:has-text("say \\"hi\\"")'
+    assert best_locator({"tag_name": "div"}) is None
+
+
+def test_compact_selectors_drops_hidden_duplicates_and_redundant_labels():
+    elements = [
+        {"tag_name": "input", "type": "hidden", "name": "csrf"},
+        {"tag_name": "input", "element_type": "input", "name": "user", "placeholder": "用户名"},
+        {"tag_name": "input", "element_type": "input", "name": "user", "placeholder": "重复"},
+        {"tag_name": "button", "element_type": "button", "text": "登录"},
+        {"tag_name": "span"},
+    ]
+    assert compact_selectors(elements) == [
+        {"locator": 'input[name="user"]', "kind": "input", "label": "用户名"},
+        {"locator": 'button:has-text("登录")', "kind": "button"},
+    ]
+
+
+def test_to_table_and_token_report():
+    rows = [{"locator": "#u", "kind": "input", "label": "用户名"}, {"locator": "#b", "kind": "button"}]
+    table = to_table(rows)
+    assert table.splitlines() == ["locator | kind | label", "#u | input | 用户名", "#b | button"]
+    report = token_report([{"tag_name": "input", "id": "u", "placeholder": "用户名", "class_name": "x" * 200}], table)
+    assert report["compact_tokens"] < report["raw_tokens"]
+    assert 0 < report["saved_ratio"] < 1
+
+
+def test_to_table_escapes_pipes_and_newlines():
+    rows = [{"locator": 'a:has-text("end|")', "kind": "a"},
+            {"locator": "#x", "kind": "button", "label": "a|b\n  c"},
+            {"locator": "#y", "kind": "", "label": "only label"}]
+    lines = to_table(rows).splitlines()
+    assert lines[1:] == ['a:has-text("end\\|") | a', "#x | button | a\\|b c", "#y |  | only label"]
+    # 转义后每行的分隔符数量不变
+    assert all(line.replace("\\|", "").count("|") <= 2 for line in lines)
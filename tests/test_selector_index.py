@@ -0,0 +1,39 @@
+from gen_test_code_agent.selector_index import SelectorIndex, get_index, relevant_elements, tokenize
+
+ELEMENTS = [
+    {"element_type": "input", "placeholder": "请输入账号", "name": "username"},
+    {"element_type": "input", "placeholder": "请输入密码", "name": "pwd"},
+    {"element_type": "button", "text": "登录", "id": "loginBtn"},
+    {"element_type": "link", "text": "忘记密码"},
+]
+
+
+def test_tokenize_synonyms_camel_case_and_stopwords():
+    assert tokenize("用户名输入框", strip_stopwords=True) == tokenize("username") == tokenize("user_name")
+    assert tokenize("loginButton") == tokenize("登录") + ["button"]
+    assert tokenize("请输入账号") == tokenize("账号") + ["请输", "输入"]
+    assert tokenize("密") == ["密"]
+    assert tokenize("") == []
+
+
+def test_search_matches_synonyms_and_filters_kinds():
+    index = SelectorIndex(ELEMENTS)
+    assert [e["name"] for _, e in index.search("用户名输入框")] == ["username"]
+    assert [e.get("placeholder") or e["text"] for _, e in index.search("密码")] == ["请输入密码", "忘记密码"]
+    assert [e["name"] for _, e in index.search("密码", kinds=["input"])] == ["pwd"]
+    assert index.search("不存在的东西") == []
+    coverage, element = index.search("点击登录按钮")[0]
+    assert element["id"] == "loginBtn" and 0 < coverage <= 1
+
+
+def test_relevant_elements_keeps_page_order_and_falls_back():
+    case = {"steps": [{"target": "忘记密码链接"}], "assertions": {"expected": "登录"}}
+    picked = relevant_elements(case, ELEMENTS)
+    assert picked == [ELEMENTS[1], ELEMENTS[2], ELEMENTS[3]]
+    assert relevant_elements({"steps": [{"target": "xyz"}]}, ELEMENTS) is ELEMENTS
+    assert relevant_elements(None, ELEMENTS) is ELEMENTS
+
+
+def test_get_index_is_cached_per_list():
+    assert get_index(ELEMENTS) is get_index(ELEMENTS)
+    assert get_index(list(ELEMENTS)) is not get_index(ELEMENTS)
@@ -0,0 +1,131 @@
+import json
+import os
+
+import pytest
+
+from run_test_code_agent import sharded_runner
+from run_test_code_agent.event_plugin import append_event
+from run_test_code_agent.sharded_runner import (
+    CONFTEST_CONTENT, _recover_report, ensure_conftest, events_path_for, file_key, load_durations,
+    merge_reports, plan_shards,
+)
+
+
+def _test(nodeid, outcome="passed", duration=1.0):
+    return {"nodeid": nodeid, "outcome": outcome, "setup": {"duration": 0.0},
+            "call": {"duration": duration}, "teardown": {"duration": 0.0}}
+
+
+def test_file_key_drops_directory_timestamp_and_test_name():
+    assert file_key("output/codes/test_TC-1-ab_20240101120000.py") == "test_TC-1-ab"
+    assert file_key("output/codes/test_TC-1-ab_20240102120000.py::test_tc_1_ab[x]") == "test_TC-1-ab"
+    assert file_key("tests/test_login.py") == "test_login"
+
+
+def test_plan_shards_balances_by_history():
+    durations = {"test_a": 9, "test_b": 5, "test_c": 4, "test_d": 1}
+    files = [f"codes/{name}_20240101120000.py" for name in ("test_d", "test_c", "test_b", "test_a")]
+    shards = plan_shards(files, 2, durations)
+    assert [[file_key(f) for f in shard] for shard in shards] == [["test_a", "test_d"], ["test_b", "test_c"]]
+    assert plan_shards(files[:1], 4) == [files[:1]]
+
+
+def test_load_durations_uses_latest_reports(tmp_path):
+    for index, duration in enumerate((3.0, 5.0)):
+        path = tmp_path / f"report_1_{index}.json"
+        path.write_text(json.dumps({"tests": [_test("test_a_20240101120000.py::test_a", duration=duration),
+                                              _test("test_a_20240101120000.py::test_a2", duration=1.0)]}))
+        os.utime(path, (index, index))
+    (tmp_path / "report_broken.json").write_text("{")
+    assert load_durations(str(tmp_path), limit=5) == {"test_a": 6.0}
+    assert load_durations(str(tmp_path), limit=1) == {}
+
+
+def test_ensure_conftest_does_not_overwrite_user_conftest(tmp_path):
+    generated, own = tmp_path / "generated", tmp_path / "own"
+    generated.mkdir()
+    own.mkdir()
+    (own / "conftest.py").write_text("import pytest\n")
+    (generated / "conftest.py").write_text(sharded_runner.CONFTEST_HEADER + "# old\n")
+    ensure_conftest([str(generated / "test_a.py"), str(own / "test_b.py::test_b")])
+    assert (generated / "conftest.py").read_text(encoding="utf-8") == CONFTEST_CONTENT
+    assert (own / "conftest.py").read_text() == "import pytest\n"
+
+
+def test_events_path_for_report():
+    assert events_path_for(os.path.join("out", "report_1_20240101120000.json")) == \
+        os.path.join("out", "events_1_20240101120000.jsonl")
+
+
+def test_recover_report_keeps_finished_tests(tmp_path):
+    events = str(tmp_path / "events.jsonl")
+    append_event(events, {"event": "collected", "shard": "s1", "nodeids": ["a.py::t1", "a.py::t2"]})
+    append_event(events, {"event": "collected", "shard": "s2", "nodeids": ["b.py::t1"]})
+    append_event(events, {"event": "test", "shard": "s1", "time": 1, "pid": 1, "run_id": "r",
+                          **_test("a.py::t1")})
+    report, failed = _recover_report(["a.py"], events, "s1", "Timeout", 3.0)
+    assert [(t["nodeid"], t["outcome"]) for t in report["tests"]] == [("a.py::t1", "passed"), ("a.py::t2", "failed")]
+    assert "shard" not in report["tests"][0] and "run_id" not in report["tests"][0]
+    assert report["summary"] == {"total": 2, "collected": 2, "passed": 1, "failed": 1}
+    assert [t["nodeid"] for t in failed["tests"]] == ["a.py::t2"]
+
+
+def test_recover_report_before_collection_fails_unfinished_files(tmp_path):
+    events = str(tmp_path / "events.jsonl")
+    append_event(events, {"event": "test", "shard": "s1", **_test("a_20240101120000.py::t1")})
+    report, failed = _recover_report(["a_20240101120000.py", "b.py"], events, "s1", "Crash", 1.0)
+    assert [t["nodeid"] for t in failed["tests"]] == ["b.py"]
+    assert report["summary"]["passed"] == 1 and report["exitcode"] == 1
+    # 事件文件不存在时所有文件记为失败
+    report, _ = _recover_report(["a.py"], str(tmp_path / "missing.jsonl"), "s1", "Crash", 1.0)
+    assert report["summary"] == {"total": 1, "collected": 1, "failed": 1}
+
+
+def test_merge_reports_sums_summaries():
+    merged = merge_reports([{"exitcode": 0, "tests": [_test("a")], "summary": {"passed": 1, "total": 1}},
+                            {"exitcode": 1, "tests": [_test("b", "failed")],
+                             "summary": {"failed": 1, "total": 1, "note": "x"}}], 2.5)
+    assert merged["exitcode"] == 1 and merged["duration"] == 2.5
+    assert [t["nodeid"] for t in merged["tests"]] == ["a", "b"]
+    assert merged["summary"] == {"passed": 1, "failed": 1, "total": 2}
+
+
+@pytest.fixture
+def report_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharded_runner, "REPORT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _events(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_run_sharded_merges_shards_and_brackets_events(report_dir, monkeypatch):
+    calls = []
+
+    def fake_run_shard(index, files, report_path, timeout, extra_args, events_path, run_id):
+        calls.append((files, events_path, run_id))
+        return {"exitcode": 0, "tests": [_test(f) for f in files], "summary": {"passed": len(files)}}
+
+    monkeypatch.setattr(sharded_runner, "run_shard", fake_run_shard)
+    monkeypatch.setattr(sharded_runner, "ensure_conftest", lambda files: None)
+    files = [str(report_dir / f"test_{name}.py") for name in ("a", "b", "c")]
+    run_id, events = sharded_runner.new_run("7")
+    report_path = sharded_runner.run_sharded(files, "7", workers=2, first={files[2]},
+                                             events_path=events, run_id=run_id)
+    with open(report_path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    assert sorted(t["nodeid"] for t in report["tests"]) == sorted(files)
+    assert {c[1:] for c in calls} == {(events, run_id)}
+    assert any(c[0][0] == files[2] for c in calls)
+    started, finished = _events(events)
+    assert (started["event"], started["run_id"], started["files"]) == ("run_started", run_id, 3)
+    assert (finished["event"], finished["report_path"]) == ("run_finished", report_path)
+    assert not os.path.exists(report_dir / "shards" / os.path.basename(report_path)[len("report_"):-5])
+
+
+def test_run_sharded_without_files_still_finishes_the_run(report_dir):
+    assert sharded_runner.run_sharded([], "7", run_id="r1") is None
+    events = [e for name in os.listdir(report_dir) for e in _events(report_dir / name)]
+    assert [(e["event"], e["run_id"]) for e in events] == [("run_started", "r1"), ("run_finished", "r1")]
@@ -0,0 +1,138 @@
+# app/utils/llm_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# 缓存模式
+CACHE_USE = "use"          # 命中则直接返回，未命中则调用并写入
+CACHE_REFRESH = "refresh"  # 不读缓存，强制调用并覆盖写入
+CACHE_BYPASS = "bypass"    # 完全不使用缓存
+
+DEFAULT_CACHE_PATH = "./output/cache/llm_cache.sqlite3"
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def make_cache_key(model_name: str, temperature: float, messages: list, format_instructions: str = "") -> str:
+    """
+    根据 (模型名, temperature, 渲染后的 system+user prompt, parser 格式说明) 生成内容哈希 key
+    """
+    payload = json.dumps({
+        "model": model_name or "",
+        "temperature": temperature,
+        "messages": messages,
+        "format_instructions": format_instructions or "",
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+        LLM 响应的持久化缓存（SQLite）
+        - ttl: 过期时间（秒），<=0 表示不过期
+        - max_bytes: 缓存总大小上限，超出时按最近访问时间淘汰
+    """
+
+    # 每写入多少次检查一次淘汰
+    EVICT_EVERY = 50
+
+    def __init__(self, path: str = None, ttl: int = None, max_bytes: int = None):
+        self.path = path or os.environ.get("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl = ttl if ttl is not None else int(
+            os.environ.get("LLM_CACHE_TTL", DEFAULT_TTL))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.environ.get("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+            conn.commit()
+            self._conn = conn
+            self._evict(conn)
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回 None"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            now = time.time()
+            if self.ttl > 0 and now - created_at > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: Any):
+        """写入缓存，value 必须可 JSON 序列化"""
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache(key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), now, now))
+            conn.commit()
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(conn)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        """按 TTL 删除过期项，再按最近访问时间淘汰到 max_bytes 以下"""
+        if self.ttl > 0:
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?",
+                         (time.time() - self.ttl,))
+        if self.max_bytes > 0:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute(
+                    "SELECT key, size FROM llm_cache ORDER BY accessed_at ASC").fetchall()
+                expired = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    expired.append((key,))
+                    total -= size
+                conn.executemany("DELETE FROM llm_cache WHERE key = ?", expired)
+        conn.commit()
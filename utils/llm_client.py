@@ -1,39 +1,478 @@
 # app/utils/llm_client.py
 import os
+import json
+import time
+import heapq
+import random
+import asyncio
+import threading
 import traceback
+from email.utils import parsedate_to_datetime
 from langchain_openai.chat_models import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains.llm import LLMChain
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.messages import AIMessage
 from dotenv import load_dotenv
+from utils.llm_cache import LLMCache, make_cache_key, CACHE_USE, CACHE_BYPASS
+from utils.tools import estimate_tokens
 load_dotenv()
 
 
+class TokenBucket:
+    """
+        令牌桶，rate_per_min <= 0 表示不限制
+    """
+
+    def __init__(self, rate_per_min: float):
+        self.rate = rate_per_min / 60.0
+        self.capacity = rate_per_min
+        self.tokens = rate_per_min
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens +
+                          (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """获取 amount 个令牌还需等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.rate > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+def _wake_future(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Waiter:
+    """排队中的一次调用，按 (priority, seq) 出队；线程用 Condition 等待，协程用 future 等待"""
+
+    __slots__ = ("priority", "seq", "tokens", "cond", "loop", "future", "granted", "cancelled")
+
+    def __init__(self, priority: int, seq: int, tokens: int, cond: threading.Condition = None,
+                 loop: asyncio.AbstractEventLoop = None):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.cond = cond
+        self.loop = loop
+        self.future = None
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def wake(self):
+        """唤醒等待者（调用方持有调度器的锁）"""
+        if self.cond is not None:
+            self.cond.notify()
+        elif self.future is not None:
+            self.loop.call_soon_threadsafe(_wake_future, self.future)
+
+
+class LLMScheduler:
+    """
+        LLM 调用调度器，所有 agent 共享：
+        - max_in_flight: 最大并发请求数
+        - rpm / tpm: 每分钟请求数 / token 数限制（令牌桶）
+        - 429 / 5xx / 连接错误按指数退避 + 抖动重试，优先遵循 Retry-After
+        同时支持线程（run）与协程（arun）调用，限流状态共享。
+        等待中的调用按 (priority, 到达顺序) 排队，priority 越小越先执行；
+        请求结束时直接放行队首，不轮询。
+    """
+
+    RETRYABLE_STATUS = {408, 409, 429}
+    RETRYABLE_ERRORS = {"RateLimitError", "APIConnectionError", "APITimeoutError",
+                        "InternalServerError", "TimeoutError", "ConnectionError"}
+
+    def __init__(self, max_in_flight: int = None, rpm: int = None, tpm: int = None,
+                 max_retries: int = None, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_in_flight = max_in_flight or int(
+            os.environ.get("LLM_MAX_IN_FLIGHT", 8))
+        self.rpm = TokenBucket(rpm if rpm is not None else int(
+            os.environ.get("LLM_RPM", 0)))
+        self.tpm = TokenBucket(tpm if tpm is not None else int(
+            os.environ.get("LLM_TPM", 0)))
+        self.max_retries = max_retries if max_retries is not None else int(
+            os.environ.get("LLM_MAX_RETRIES", 5))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # 等待队列：_Waiter 小顶堆
+        self._queue = []
+        self._seq = 0
+        # 已被告知需要定时重试的队首（令牌不足或被 429 暂停时）
+        self._armed = None
+        # 收到 429 后全局暂停到该时间点
+        self._blocked_until = 0.0
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        """重置统计信息"""
+        with self._lock:
+            self._waiting = 0
+            self._stats = {
+                "requests": 0,
+                "retries": 0,
+                "rate_limited": 0,
+                "failures": 0,
+                "max_queue_depth": 0,
+                "wait_time_total": 0.0,
+                "wait_time_max": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+            }
+
+    def metrics(self) -> dict:
+        """队列深度、等待时间、token 使用等统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = self._in_flight
+            stats["queue_depth"] = self._waiting
+        requests = stats["requests"] + stats["retries"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / \
+            requests if requests else 0.0
+        return stats
+
+    def _grant_wait(self, tokens: int, now: float):
+        """
+            队首还需等待的秒数：0 表示可以立即执行，None 表示并发已满（等其他请求结束时放行）
+            调用方持有 self._lock
+        """
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight >= self.max_in_flight:
+            return None
+        return max(self.rpm.wait_time(1, now), self.tpm.wait_time(tokens, now))
+
+    def _dispatch(self):
+        """
+            按 (priority, seq) 依次放行队首，直到队首不能执行；返回队首还需等待的秒数（同 _grant_wait）
+            队首因令牌 / 429 需要定时重试时唤醒它一次，由它按等待时间定时再次调度
+            调用方持有 self._lock
+        """
+        now = time.monotonic()
+        while self._queue:
+            head = self._queue[0]
+            if head.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            wait = self._grant_wait(head.tokens, now)
+            if wait is None or wait > 0:
+                if wait is not None and self._armed is not head:
+                    self._armed = head
+                    head.wake()
+                return wait
+            heapq.heappop(self._queue)
+            self.rpm.consume(1)
+            self.tpm.consume(head.tokens)
+            self._in_flight += 1
+            head.granted = True
+            head.wake()
+        return None
+
+    def _timeout(self, waiter: _Waiter, wait):
+        """等待者本次等待的超时：只有队首需要按令牌 / 429 的等待时间定时重试"""
+        return wait if self._queue and self._queue[0] is waiter else None
+
+    def _enqueue(self, waiter: _Waiter):
+        heapq.heappush(self._queue, waiter)
+        self._waiting += 1
+        self._stats["max_queue_depth"] = max(
+            self._stats["max_queue_depth"], self._waiting)
+
+    def _dequeue(self, waiter: _Waiter, waited: float):
+        """等待结束（调用方持有 self._lock）；没拿到槽位就退出时从队列中移除，拿到了则归还"""
+        if not waiter.granted:
+            waiter.cancelled = True
+        self._waiting -= 1
+        self._stats["wait_time_total"] += waited
+        self._stats["wait_time_max"] = max(
+            self._stats["wait_time_max"], waited)
+
+    def _new_waiter(self, tokens: int, priority: int, **kwargs) -> _Waiter:
+        self._seq += 1
+        waiter = _Waiter(priority, self._seq, tokens, **kwargs)
+        self._enqueue(waiter)
+        return waiter
+
+    def _release(self, prompt_tokens: int = 0, completion_tokens: int = 0, error: bool = False):
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+            if error:
+                return
+            self._stats["requests"] += 1
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["completion_tokens"] += completion_tokens
+
+    def _acquire(self, tokens: int, priority: int = 0):
+        start = time.monotonic()
+        with self._lock:
+            waiter = self._new_waiter(tokens, priority, cond=threading.Condition(self._lock))
+            try:
+                while True:
+                    wait = self._dispatch()
+                    if waiter.granted:
+                        return
+                    waiter.cond.wait(self._timeout(waiter, wait))
+            except BaseException:
+                if waiter.granted:
+                    self._in_flight -= 1
+                raise
+            finally:
+                self._dequeue(waiter, time.monotonic() - start)
+                self._dispatch()
+
+    async def _aacquire(self, tokens: int, priority: int = 0):
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            waiter = self._new_waiter(tokens, priority, loop=loop)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._dispatch()
+                    if waiter.granted:
+                        return
+                    timeout = self._timeout(waiter, wait)
+                    waiter.future = future = loop.create_future()
+                await asyncio.wait([future], timeout=timeout)
+        except BaseException:
+            with self._lock:
+                if waiter.granted:
+                    self._in_flight -= 1
+            raise
+        finally:
+            with self._lock:
+                self._dequeue(waiter, time.monotonic() - start)
+                self._dispatch()
+
+    @staticmethod
+    def _status_code(e: Exception):
+        status = getattr(e, "status_code", None)
+        if status is None:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+        return status
+
+    @staticmethod
+    def _retry_after(e: Exception):
+        """解析 Retry-After / retry-after-ms 响应头，返回秒数"""
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        if not headers:
+            return None
+        value = headers.get("retry-after-ms")
+        if value:
+            try:
+                return float(value) / 1000
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _retry_delay(self, e: Exception, attempt: int):
+        """计算重试等待时间，不可重试时返回 None"""
+        status = self._status_code(e)
+        retryable = type(e).__name__ in self.RETRYABLE_ERRORS
+        if status is not None:
+            retryable = retryable or status in self.RETRYABLE_STATUS or status >= 500
+        if not retryable or attempt >= self.max_retries:
+            return None
+        # full jitter 指数退避
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = self._retry_after(e)
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, self.base_delay))
+        with self._lock:
+            self._stats["retries"] += 1
+            if status == 429:
+                self._stats["rate_limited"] += 1
+                # 被限流时所有请求一起暂停，避免继续打满接口
+                self._blocked_until = max(
+                    self._blocked_until, time.monotonic() + delay)
+        return delay
+
+    def _fail(self):
+        with self._lock:
+            self._stats["failures"] += 1
+
+    def run(self, fn, prompt_tokens: int = 0, count_tokens=None, priority: int = 0):
+        """
+            在调度器中同步执行 fn()
+            count_tokens: 根据返回值估算输出 token 数
+            priority: 排队优先级，越小越先执行
+        """
+        attempt = 0
+        while True:
+            self._acquire(prompt_tokens, priority)
+            try:
+                resp = fn()
+            except Exception as e:
+                # 先记录 429 暂停，再归还槽位，避免放行的请求立即撞上限流
+                delay = self._retry_delay(e, attempt)
+                self._release(error=True)
+                if delay is None:
+                    self._fail()
+                    raise
+                print(f"LLM 调用失败，{delay:.1f} 秒后重试（第 {attempt + 1} 次）: {e}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._release(prompt_tokens,
+                          count_tokens(resp) if count_tokens else 0)
+            return resp
+
+    async def arun(self, fn, prompt_tokens: int = 0, count_tokens=None, priority: int = 0):
+        """
+            在调度器中异步执行 await fn()
+        """
+        attempt = 0
+        while True:
+            await self._aacquire(prompt_tokens, priority)
+            try:
+                resp = await fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                self._release(error=True)
+                if delay is None:
+                    self._fail()
+                    raise
+                print(f"LLM 调用失败，{delay:.1f} 秒后重试（第 {attempt + 1} 次）: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._release(prompt_tokens,
+                          count_tokens(resp) if count_tokens else 0)
+            return resp
+
+
+llm_scheduler = LLMScheduler()
+
+
 class LLMClient:
 
-    def __init__(self, model_name: str = None, base_url: str = None, temperature: float = 0.0):
+    def __init__(self, model_name: str = None, base_url: str = None, temperature: float = 0.0,
+                 scheduler: LLMScheduler = None):
         model_name = model_name or os.environ.get("OPENAI_MODEL_NAME")
         base_url = os.environ.get("OPENAI_API_URL")
+        self.model_name = model_name
         self.temperature = temperature
         self.client = ChatOpenAI(
-            model_name=model_name, base_url=base_url, temperature=temperature, streaming=True)
+            model_name=model_name, base_url=base_url, temperature=temperature, streaming=True,
+            max_retries=0)
+        # 重试与限流统一由调度器负责
+        self.scheduler = scheduler or llm_scheduler
+        # 缓存模式：use / refresh / bypass，非 0 temperature 的输出不确定，默认不缓存
+        self.cache_mode = os.environ.get("LLM_CACHE_MODE", CACHE_USE)
+        if temperature != 0.0:
+            self.cache_mode = CACHE_BYPASS
+        self.cache = LLMCache()
+
+    def _cache_key(self, messages: list, format_instructions: str) -> str:
+        """根据渲染后的 prompt 生成缓存 key"""
+        return make_cache_key(self.model_name, self.temperature, messages, format_instructions)
+
+    @staticmethod
+    def _count_tokens(resp) -> int:
+        """估算输出 token 数"""
+        content = getattr(resp, "content", resp)
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        return estimate_tokens(content)
 
-    def run_prompt(self, system_prompt: str, user_prompt: str, input: dict, parser: JsonOutputParser = None) -> str:
+    def _prepare(self, system_prompt: str, user_prompt: str, input: dict, parser: JsonOutputParser,
+                 cache_mode: str):
+        """构建 chain，并查询缓存。返回 (chain, cache_key, cached_resp, prompt_tokens)"""
+        prompt = ChatPromptTemplate.from_messages(
+            [system_prompt, user_prompt]
+        )
+        format_instructions = ""
+        if parser:
+            format_instructions = parser.get_format_instructions()
+            prompt = prompt.partial(
+                format_instructions=format_instructions)
+            chain = prompt | self.client | parser
+        else:
+            chain = prompt | self.client
+
+        messages = [(m.type, m.content) for m in prompt.format_messages(**input)]
+        prompt_tokens = sum(estimate_tokens(content) for _, content in messages)
+        key = None
+        if cache_mode != CACHE_BYPASS:
+            key = self._cache_key(messages, format_instructions)
+        if cache_mode == CACHE_USE:
+            cached = self.cache.get(key)
+            if cached is not None:
+                # 无 parser 时调用方使用 resp.content，这里还原成 AIMessage
+                cached = cached["value"] if parser else AIMessage(
+                    content=cached["value"])
+                return chain, key, cached, prompt_tokens
+        return chain, key, None, prompt_tokens
+
+    def _store(self, key: str, resp, parser: JsonOutputParser):
+        """写入缓存"""
+        if key is not None:
+            self.cache.set(key, {"value": resp if parser else resp.content})
+
+    def run_prompt(self, system_prompt: str, user_prompt: str, input: dict, parser: JsonOutputParser = None,
+                   cache_mode: str = None, priority: int = 0) -> str:
         """
         Run a structured prompt using LangChain LLMChain and PromptTemplate.
         Returns raw text.
+        cache_mode: use / refresh / bypass，默认使用 client 的 cache_mode
+        priority: 调度器排队优先级，越小越先执行
+        """
+        cache_mode = cache_mode or self.cache_mode
+        try:
+            chain, key, cached, prompt_tokens = self._prepare(
+                system_prompt, user_prompt, input, parser, cache_mode)
+            if cached is not None:
+                return cached
+            resp = self.scheduler.run(lambda: chain.invoke(input=input),
+                                      prompt_tokens, self._count_tokens, priority)
+            self._store(key, resp, parser)
+            return resp
+        except Exception as e:
+            print(traceback.format_exc())
+            print("LLM call failed: %s", e)
+            raise
+
+    async def arun_prompt(self, system_prompt: str, user_prompt: str, input: dict, parser: JsonOutputParser = None,
+                          cache_mode: str = None, priority: int = 0) -> str:
+        """
+        run_prompt 的异步版本，基于 chain.ainvoke，可在同一个 event loop 中并发大量请求
         """
+        cache_mode = cache_mode or self.cache_mode
         try:
-            prompt = ChatPromptTemplate.from_messages(
-                [system_prompt, user_prompt]
-            )
-            if parser:
-                prompt = prompt.partial(
-                    format_instructions=parser.get_format_instructions())
-                chain = prompt | self.client | parser
-            else:
-                chain = prompt | self.client
-            resp = chain.invoke(input=input)
+            chain, key, cached, prompt_tokens = self._prepare(
+                system_prompt, user_prompt, input, parser, cache_mode)
+            if cached is not None:
+                return cached
+            resp = await self.scheduler.arun(lambda: chain.ainvoke(input=input),
+                                             prompt_tokens, self._count_tokens, priority)
+            self._store(key, resp, parser)
             return resp
         except Exception as e:
             print(traceback.format_exc())
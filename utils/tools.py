@@ -1,12 +1,24 @@
+import re
 import uuid
 from typing import List, Any
 
+# 中日韩字符及全角标点
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
 
 def make_id(prefix: str):
     """create id"""
     return f"{prefix}_{uuid.uuid4().hex[:8]}"
 
 
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 个 token，其余字符按 4 个字符 1 个 token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
 def append_reducer(old_list: List[Any], new_items: Any) -> List[Any]:
     """list 方法"""
     if old_list is None:
@@ -0,0 +1,25 @@
+import glob
+import json
+from typing import Any, Dict, Optional
+
+# 生成用例时按这些字段切分 TRM 条目
+TRM_ITEM_KEYS = ("flows", "api", "rules", "exceptions")
+# TRM 条目上记录来源章节的字段，只用于增量分析，不放进用例生成的提示词、不参与内容哈希
+TRM_SOURCE_FIELDS = ("source_section", "section_hash")
+
+
+def trm_ref(key: str, item: Dict[str, Any]) -> str:
+    """TRM 条目的引用 id，用于追溯用例来源"""
+    if key == "api":
+        return f"{(item.get('method') or '').upper()} {item.get('url', '')}"
+    id_field = {"flows": "flow_id", "rules": "rule_id", "exceptions": "exception_id"}[key]
+    return item.get(id_field, "")
+
+
+def load_latest_trm(feature_id: str) -> Optional[Dict[str, Any]]:
+    """读取 output/trm_docs 下该 feature 最近一次生成的 TRM"""
+    files = sorted(glob.glob(f"./output/trm_docs/trm_{feature_id}_*.json"))
+    if not files:
+        return None
+    with open(files[-1], "r", encoding="utf-8") as f:
+        return json.load(f)